@@ -1,11 +1,17 @@
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings 
-from langchain_pinecone import PineconeVectorStore
-from langchain.schema import Document
 from langchain.prompts import PromptTemplate
+from appwrite.client import Client
+from appwrite.services.databases import Databases
 import json
 import os
+import sys
+from pathlib import Path
 from dotenv import load_dotenv
 
+# Add the parent directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+from fakes.factory import make_embeddings, make_vectorstore, make_chat_model, make_retriever
+from retrieval.router import QueryRouter, router_from_appwrite
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -16,7 +22,7 @@ os.environ["LANGSMITH_API_KEY"] = os.getenv("LANGCHAIN_API_KEY")
 os.environ["LANGSMITH_PROJECT"] = "chattie-testing"
 os.environ["LANGSMITH_TRACING_V2"] = os.getenv("LANGCHAIN_TRACING_V2")
 
-def classify_query(query: str, llm: ChatOpenAI) -> str:
+def classify_query(query: str, llm) -> str:
     # Create prompt template for classification
     classify_prompt = PromptTemplate(
         input_variables=["query"],
@@ -33,35 +39,56 @@ def classify_query(query: str, llm: ChatOpenAI) -> str:
     response = llm.invoke(classify_prompt.format(query=query))
     return response.content.strip().lower()
 
-def get_similar_documents(query: str):
+_router = None
+
+def get_router(llm) -> QueryRouter:
+    """Persona/channel router built once from Appwrite; the LLM only classifies what it can't resolve"""
+    global _router
+    if _router is None:
+        classifier = lambda query: classify_query(query, llm)
+        try:
+            client = Client()
+            client.set_endpoint(os.getenv('PUBLIC_APPWRITE_ENDPOINT'))
+            client.set_project(os.getenv('APPWRITE_PROJECT_ID'))
+            client.set_key(os.getenv('APPWRITE_API_KEY'))
+            _router = router_from_appwrite(Databases(client), os.getenv('WORKSPACE_ID'), classifier=classifier)
+        except Exception as e:
+            print(f"Could not load personas and channels, classifying with the LLM only: {e}")
+            _router = QueryRouter(classifier=classifier)
+    return _router
+
+def get_similar_documents(query: str, workspace_id: str = None):
+    # Vectors are stored per workspace, so every search is scoped to one
+    workspace_id = workspace_id or os.getenv('WORKSPACE_ID')
+    if not workspace_id:
+        raise ValueError("Set WORKSPACE_ID to the workspace to search")
+
     # Initialize embeddings and LLM
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+    embeddings = make_embeddings(model="text-embedding-3-large")
+    llm = make_chat_model(model_name="gpt-4o-mini", temperature=0)
 
-    # Get query classification
-    query_type = classify_query(query, llm)
+    # Route the query: persona/channel matches are resolved locally, ambiguous ones go to the LLM
+    route = get_router(llm).route(query)
+    filters = {**(route["filter"] or {}), "workspace_id": workspace_id}
+    print(f"Route: {route['type']} ({route['source']}) filter={filters}")
     
     # Create vector store
-    vector_store = PineconeVectorStore(
-        index_name="messages",
-        embedding=embeddings
-    )
-    
-    # Apply filters based on classification
-    filters = {}
-    if query_type == "person":
-        # Filter by sender name
-        filters["sender_name"] = query.strip()
-    elif query_type == "channel":
-        # Filter by channel ID
-        filters["channel_id"] = query.strip()
-    # No filters for theme-based queries
+    vector_store = make_vectorstore("messages", embeddings)
     
-    # Perform search with filters
-    similar_docs = vector_store.similarity_search_with_relevance_scores(
-        query, 
-        filter=filters if filters else None
-    )
+    # Hybrid search: BM25 catches names like "dynamo" that embeddings blur, vectors catch paraphrases
+    retriever = make_retriever(vector_store)
+    if hasattr(retriever, "lexical"):
+        # BM25 loads the workspace's messages from Appwrite on first use; wait for it in this one-off run
+        retriever.lexical.wait_until_ready(workspace_id, timeout=120)
+        hybrid = retriever.lexical_active_for(filters)
+        print(f"Search: {'hybrid' if hybrid else 'vector only (lexical index has no corpus)'}")
+    if hasattr(retriever, "search_with_scores"):
+        similar_docs = retriever.search_with_scores(query, k=4, filter=filters)
+    else:
+        similar_docs = vector_store.similarity_search_with_relevance_scores(
+            query,
+            filter=filters
+        )
     
     # Convert results to JSON-serializable format
     results = []
@@ -69,7 +96,7 @@ def get_similar_documents(query: str):
         results.append({
             "page_content": doc.page_content,
             "metadata": doc.metadata,
-            "relevance_score": score
+            "score": score
         })
     
     # Save results to JSON file
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger('adaptive_limiter')
+
+# HTTP statuses that mean "slow down / try again" rather than "your request is wrong"
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def get_status_code(error: Exception) -> Optional[int]:
+    """Extract an HTTP status code from OpenAI, ElevenLabs, aiohttp or botocore errors"""
+    for attr in ('status_code', 'status'):
+        status = getattr(error, attr, None)
+        if isinstance(status, int):
+            return status
+
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        # botocore ClientError
+        return response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+    status = getattr(response, 'status_code', None)
+    return status if isinstance(status, int) else None
+
+
+def get_headers(error: Exception) -> dict:
+    """Extract response headers from an API error, if it carries any"""
+    headers = getattr(error, 'headers', None)
+    if headers is None:
+        response = getattr(error, 'response', None)
+        if isinstance(response, dict):
+            headers = response.get('ResponseMetadata', {}).get('HTTPHeaders')
+        else:
+            headers = getattr(response, 'headers', None)
+    return dict(headers) if headers else {}
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Parse a Retry-After header (delta seconds or HTTP date) into seconds"""
+    headers = {key.lower(): value for key, value in get_headers(error).items()}
+    value = headers.get('retry-after')
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """True for rate limiting, throttling and transient server errors"""
+    if get_status_code(error) in RETRYABLE_STATUS_CODES:
+        return True
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        code = response.get('Error', {}).get('Code', '')
+        return code in ('ThrottlingException', 'TooManyRequestsException', 'ServiceUnavailableException')
+    return False
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency limiter for rate-limited APIs.
+
+    The number of in-flight calls grows by one after every `limit` successful
+    calls and is multiplied by `decrease_factor` whenever the upstream API
+    throttles us. A Retry-After hint pauses all new calls until it expires.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 10,
+        decrease_factor: float = 0.5,
+        name: str = 'api'
+    ):
+        self.limit = max(min_limit, min(initial_limit, max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.name = name
+        self.in_flight = 0
+        self._successes = 0
+        self._paused_until = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), timeout=pause)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                if self.in_flight < self.limit:
+                    self.in_flight += 1
+                    return
+                await self._condition.wait()
+
+    async def release(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
+
+    def on_success(self):
+        """Additive increase: one more slot per `limit` consecutive successes"""
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.max_limit:
+            self.limit += 1
+            self._successes = 0
+            logger.debug("%s limiter increased to %d", self.name, self.limit)
+
+    def on_throttle(self, retry_after: Optional[float] = None, fallback_delay: float = 1.0) -> float:
+        """Multiplicative decrease and a shared pause; returns the pause in seconds"""
+        self._successes = 0
+        now = time.monotonic()
+        # Throttles that land during an existing pause belong to the same burst: decrease once
+        if now >= self._paused_until:
+            self.limit = max(self.min_limit, int(self.limit * self.decrease_factor))
+        delay = retry_after if retry_after is not None else fallback_delay
+        self._paused_until = max(self._paused_until, now + delay)
+        logger.warning("%s throttled, limit now %d, pausing %.1fs", self.name, self.limit, delay)
+        return delay
+
+
+async def call_with_limiter(
+    limiter: Optional[AdaptiveConcurrencyLimiter],
+    func: Callable[..., Awaitable[Any]],
+    *args,
+    max_attempts: int = 4,
+    base_delay: float = 1.0,
+    **kwargs
+) -> Any:
+    """
+    Await `func(*args, **kwargs)` inside a limiter slot, retrying throttled calls.
+
+    Retries honour Retry-After when the error carries it, otherwise use
+    exponential backoff with jitter. Non-retryable errors are raised at once.
+    """
+    for attempt in range(max_attempts):
+        try:
+            if limiter is None:
+                return await func(*args, **kwargs)
+            async with limiter:
+                result = await func(*args, **kwargs)
+            limiter.on_success()
+            return result
+        except Exception as e:
+            if not is_retryable(e) or attempt == max_attempts - 1:
+                raise
+            fallback = base_delay * (2 ** attempt) * (1 + random.random())
+            retry_after = get_retry_after(e)
+            if limiter is not None:
+                delay = limiter.on_throttle(retry_after, fallback)
+            else:
+                delay = retry_after if retry_after is not None else fallback
+                await asyncio.sleep(delay)
+            logger.warning("Retryable error (status %s), attempt %d/%d, retrying in %.1fs",
+                           get_status_code(e), attempt + 1, max_attempts, delay)
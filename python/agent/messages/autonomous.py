@@ -1,12 +1,11 @@
 import logging
+import os
 import random
 from typing import Dict, Any, List
 from ..core.llm import generate_with_llm
 from .creator import create_message
 from ..embeddings import embed_message
-from langchain_openai import ChatOpenAI
-from langchain_pinecone import PineconeVectorStore
-from langchain_openai import OpenAIEmbeddings
+from fakes.factory import make_embeddings, make_vectorstore
 
 logger = logging.getLogger('chattie_agent')
 
@@ -59,14 +58,13 @@ async def generate_response(
     api_key: str
 ) -> Dict[str, Any]:
     """Generate a response to a message"""
-    # Get context from vector store
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
-    vectorstore = PineconeVectorStore(
+    # Get context from vector store; the process-wide store serves channel-scoped queries from its local tier
+    vectorstore = make_vectorstore(
         index_name=os.getenv("PINECONE_INDEX"),
-        embedding=embeddings
+        embedding=make_embeddings(model="text-embedding-3-large")
     )
     
-    # Get relevant message history
+    # Get relevant message history; the workspace_id filter selects the workspace's namespace
     context_docs = vectorstore.similarity_search(
         message['content'],
         k=5,
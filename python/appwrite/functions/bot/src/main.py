@@ -7,14 +7,15 @@ from appwrite.id import ID
 from appwrite.exception import AppwriteException
 import os
 import json
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import logging
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_pinecone import PineconeVectorStore
-from langchain.prompts import PromptTemplate
+from langchain_core.messages import HumanMessage, SystemMessage
 from langchain.schema import Document
 import re
-from bs4 import BeautifulSoup
+from html import unescape
+from html.parser import HTMLParser
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -36,23 +37,147 @@ document_vectorstore = PineconeVectorStore(
 retriever = document_vectorstore.as_retriever()
 llm = ChatOpenAI(temperature=0.7, model_name="gpt-4-turbo-preview")
 
+# Vectors live in one Pinecone namespace per workspace, as routed by retrieval/namespaces.py in the
+# bots; this function is deployed on its own, so the naming is repeated here
+NAMESPACE_PREFIX = 'ws-'
+
+
+def workspace_namespace(workspace_id: str):
+    """Pinecone namespace holding a workspace's vectors; None (the default namespace) unless VECTOR_NAMESPACES=workspace"""
+    if not workspace_id:
+        raise ValueError("Vectors are stored per workspace; a workspace_id is required")
+    if os.getenv('VECTOR_NAMESPACES', 'shared').lower() != 'workspace':
+        return None
+    return f'{NAMESPACE_PREFIX}{workspace_id}'
+
+# Static instructions and persona profiles are sent first, as a system message, so the provider caches
+# them as a shared prefix; the same split as prompts/compiler.py in the bots
+SUMMARIZE_SYSTEM = "Please provide a concise summary of the following conversation, highlighting key points and decisions:"
+ANALYZE_SYSTEM = """Please analyze this conversation and provide insights on:
+1. Main topics discussed
+2. Key participants and their viewpoints
+3. Areas of agreement and disagreement
+4. Overall tone and engagement level
+5. Any notable patterns or trends"""
+PERSONA_SYSTEM = """You are {name}, {role}. Your personality is: {personality}
+Your conversation style is: {conversation_style}
+Your knowledge areas are: {knowledge_base}
+Your opinions are: {opinions}
+You disagree with: {disagreements}"""
+PERSONA_REQUEST = """Recent conversation context:
+{channel_context}
+
+Your own recent messages:
+{own_messages}
+
+You are responding to {sender_name} ({sender_id}).
+Please respond to their following message in your unique voice and style briefly, maintaining your personality and viewpoints:
+{prompt}"""
+ASSISTANT_SYSTEM = """You are Chattie Bot, a helpful AI assistant.
+
+When responding:
+- Directly address the user you are responding to
+- Reference relevant points from their conversation history
+- Provide clear, helpful information
+- Stay focused on their specific question
+- Be friendly and professional
+- If the context shows previous interactions with the user, maintain continuity"""
+ASSISTANT_REQUEST = """You are responding to {sender_name} (ID: {sender_id}).
+
+Recent Thread Context:
+{channel_context}
+
+{sender_name}'s Current Query: {query}"""
+
+# Rendered persona blocks by (persona id, $updatedAt), for warm function instances
+_persona_prefixes = {}
+
+
+def persona_prefix(persona: dict) -> str:
+    key = (persona['$id'], persona.get('$updatedAt'))
+    prefix = _persona_prefixes.get(key)
+    if prefix is None:
+        prefix = _persona_prefixes[key] = PERSONA_SYSTEM.format(
+            name=persona['name'],
+            role=persona['role'],
+            personality=persona['personality'],
+            conversation_style=persona['conversation_style'],
+            knowledge_base=", ".join(persona['knowledge_base']),
+            opinions=", ".join(persona.get('opinions', [])),
+            disagreements=", ".join(persona.get('disagreements', []))
+        )
+    return prefix
+
+# Same parser as messages/sanitize.py in the bots; functions are deployed without the shared packages
+_WHITESPACE = re.compile(r'\s+')
+VOID_ELEMENTS = frozenset((
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem', 'meta', 'param',
+    'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex', 'nextid', 'spacer',
+))
+HIDDEN_ELEMENTS = frozenset(('script', 'style', 'template', 'rt', 'rp'))
+
+
+class MessageHTMLParser(HTMLParser):
+    """Single-pass text and mention extraction; a mention's contents are replaced by @name"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.mentions = []
+        self._open = []
+        self._mention_depth = 0
+        self._hidden_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        attributes = {name: '' if value is None else value for name, value in attrs}
+        is_mention = tag == 'span' and attributes.get('data-mention') == 'true'
+        if is_mention:
+            self.mentions.append({
+                'id': attributes['data-mention-id'],
+                'name': attributes['data-mention-name']
+            })
+            if not self._mention_depth:
+                self.parts.append(f"@{attributes['data-mention-name']}")
+        if tag in VOID_ELEMENTS:
+            return
+        hides = tag in HIDDEN_ELEMENTS
+        self._open.append((tag, is_mention, hides))
+        self._mention_depth += is_mention
+        self._hidden_depth += hides
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        for position in range(len(self._open) - 1, -1, -1):
+            if self._open[position][0] == tag:
+                for _, is_mention, hides in self._open[position:]:
+                    self._mention_depth -= is_mention
+                    self._hidden_depth -= hides
+                del self._open[position:]
+                return
+
+    def handle_data(self, data):
+        if not self._mention_depth and not self._hidden_depth:
+            self.parts.append(data)
+
+    def unknown_decl(self, data):
+        if data.startswith('CDATA[') and not self._mention_depth:
+            self.parts.append(data[len('CDATA['):])
+
+
 def sanitize_html_content(content: str) -> tuple[str, list[dict]]:
     """Sanitize HTML content and extract mentions."""
-    soup = BeautifulSoup(content, 'html.parser')
-    mentions = []
-    
-    # Extract mentions
-    for mention in soup.find_all('span', {'data-mention': 'true'}):
-        mentions.append({
-            'id': mention['data-mention-id'],
-            'name': mention['data-mention-name']
-        })
-        mention.replace_with(f"@{mention['data-mention-name']}")
-    
-    text = soup.get_text()
-    text = re.sub(r'\s+', ' ', text).strip()
-    
-    return text, mentions
+    if '<' not in content:
+        text = unescape(content) if '&' in content else content
+        return _WHITESPACE.sub(' ', text).strip(), []
+
+    parser = MessageHTMLParser()
+    parser.feed(content)
+    parser.close()
+    return _WHITESPACE.sub(' ', ''.join(parser.parts)).strip(), parser.mentions
 
 async def get_persona(database: Databases, persona_id: str) -> dict:
     """Get persona information from Appwrite database"""
@@ -67,7 +192,7 @@ async def get_persona(database: Databases, persona_id: str) -> dict:
         logger.error(f"Error getting persona {persona_id}: {str(e)}")
         return None
 
-async def get_persona_context(database: Databases, mention_id: str, channel_id: str) -> dict:
+async def get_persona_context(database: Databases, mention_id: str, channel_id: str, workspace_id: str) -> dict:
     """Get persona information and relevant context for a mentioned persona"""
     try:
         persona = await get_persona(database, mention_id)
@@ -80,9 +205,11 @@ async def get_persona_context(database: Databases, mention_id: str, channel_id:
             k=5,
             filter={
                 "channel_id": channel_id,
+                "workspace_id": workspace_id,
                 "sender_id": mention_id,
                 "sender_name": persona["name"]
-            }
+            },
+            namespace=workspace_namespace(workspace_id)
         )
         
         validated_messages = []
@@ -101,13 +228,14 @@ async def get_persona_context(database: Databases, mention_id: str, channel_id:
         logger.error(f"Error getting persona context for {mention_id}: {str(e)}")
         return None
 
-async def handle_summarize_command(channel_id: str) -> str:
+async def handle_summarize_command(channel_id: str, workspace_id: str) -> str:
     """Handle /summarize command"""
     try:
         channel_docs = document_vectorstore.similarity_search(
             query="",
             k=100,
-            filter={"channel_id": channel_id}
+            filter={"channel_id": channel_id, "workspace_id": workspace_id},
+            namespace=workspace_namespace(workspace_id)
         )
         
         messages_text = "\n".join([
@@ -115,31 +243,24 @@ async def handle_summarize_command(channel_id: str) -> str:
             for doc in sorted(channel_docs, key=lambda x: x.metadata['timestamp'])
         ])
         
-        summary_prompt = PromptTemplate(
-            template="""Please provide a concise summary of the following conversation, highlighting key points and decisions:
-
-{messages}
-
-Summary:""",
-            input_variables=["messages"]
-        )
-        
-        summary_response = await llm.ainvoke(
-            summary_prompt.format(messages=messages_text)
-        )
+        summary_response = await llm.ainvoke([
+            SystemMessage(content=SUMMARIZE_SYSTEM),
+            HumanMessage(content=f"{messages_text}\n\nSummary:")
+        ])
         
         return summary_response.content
     except Exception as e:
         logger.error(f"Error in summarize command: {str(e)}")
         return "Sorry, I encountered an error while trying to summarize the conversation."
 
-async def handle_analyze_command(channel_id: str) -> str:
+async def handle_analyze_command(channel_id: str, workspace_id: str) -> str:
     """Handle /analyze command"""
     try:
         channel_docs = document_vectorstore.similarity_search(
             query="",
             k=100,
-            filter={"channel_id": channel_id}
+            filter={"channel_id": channel_id, "workspace_id": workspace_id},
+            namespace=workspace_namespace(workspace_id)
         )
         
         messages_text = "\n".join([
@@ -147,31 +268,18 @@ async def handle_analyze_command(channel_id: str) -> str:
             for doc in sorted(channel_docs, key=lambda x: x.metadata['timestamp'])
         ])
         
-        analysis_prompt = PromptTemplate(
-            template="""Please analyze this conversation and provide insights on:
-1. Main topics discussed
-2. Key participants and their viewpoints
-3. Areas of agreement and disagreement
-4. Overall tone and engagement level
-5. Any notable patterns or trends
-
-Conversation:
-{messages}
-
-Analysis:""",
-            input_variables=["messages"]
-        )
-        
-        analysis_response = await llm.ainvoke(
-            analysis_prompt.format(messages=messages_text)
-        )
+        analysis_response = await llm.ainvoke([
+            SystemMessage(content=ANALYZE_SYSTEM),
+            HumanMessage(content=f"Conversation:\n{messages_text}\n\nAnalysis:")
+        ])
         
         return analysis_response.content
     except Exception as e:
         logger.error(f"Error in analyze command: {str(e)}")
         return "Sorry, I encountered an error while trying to analyze the conversation."
 
-async def get_persona_response(prompt: str, persona_context: dict, channel_id: str, sender_name: str, sender_id: str) -> str:
+async def get_persona_response(prompt: str, persona_context: dict, channel_id: str, workspace_id: str,
+                               sender_name: str, sender_id: str) -> str:
     """Generate a response from a specific persona"""
     try:
         combined_context = retriever.get_relevant_documents(
@@ -179,10 +287,12 @@ async def get_persona_response(prompt: str, persona_context: dict, channel_id: s
             k=5,
             filter={
                 "channel_id": channel_id,
+                "workspace_id": workspace_id,
                 "$or": [
                     {"sender_id": persona_context['persona']['$id']}
                 ]
-            }
+            },
+            namespace=workspace_namespace(workspace_id)
         )
         
         own_messages = []
@@ -193,43 +303,18 @@ async def get_persona_response(prompt: str, persona_context: dict, channel_id: s
             else:
                 other_messages.append(doc)
         
-        template = PromptTemplate(
-            template="""You are {name}, {role}. Your personality is: {personality}
-Your conversation style is: {conversation_style}
-Your knowledge areas are: {knowledge_base}
-Your opinions are: {opinions}
-You disagree with: {disagreements}
-
-Recent conversation context:
-{channel_context}
-
-Your own recent messages:
-{own_messages}
-
-You are responding to {sender_name} ({sender_id}).
-Please respond to their following message in your unique voice and style briefly, maintaining your personality and viewpoints:
-{prompt}""",
-            input_variables=["name", "role", "personality", "conversation_style", "knowledge_base", 
-                           "opinions", "disagreements", "channel_context", "own_messages", 
-                           "sender_name", "sender_id", "prompt"]
-        )
-
-        prompt_with_context = template.format(
-            name=persona_context['persona']['name'],
-            role=persona_context['persona']['role'],
-            personality=persona_context['persona']['personality'],
-            conversation_style=persona_context['persona']['conversation_style'],
-            knowledge_base=", ".join(persona_context['persona']['knowledge_base']),
-            opinions=", ".join(persona_context['persona'].get('opinions', [])),
-            disagreements=", ".join(persona_context['persona'].get('disagreements', [])),
-            channel_context="\n".join([f"{doc.metadata.get('sender_name', 'Unknown User')}: {doc.page_content}" 
-                                     for doc in other_messages[-3:]]),
-            own_messages="\n".join([f"You: {doc.page_content}" 
-                                  for doc in own_messages[-2:]]),
-            sender_name=sender_name,
-            sender_id=sender_id,
-            prompt=prompt
-        )
+        prompt_with_context = [
+            SystemMessage(content=persona_prefix(persona_context['persona'])),
+            HumanMessage(content=PERSONA_REQUEST.format(
+                channel_context="\n".join([f"{doc.metadata.get('sender_name', 'Unknown User')}: {doc.page_content}"
+                                         for doc in other_messages[-3:]]),
+                own_messages="\n".join([f"You: {doc.page_content}"
+                                      for doc in own_messages[-2:]]),
+                sender_name=sender_name,
+                sender_id=sender_id,
+                prompt=prompt
+            ))
+        ]
 
         response = await llm.ainvoke(prompt_with_context)
         return response.content
@@ -251,36 +336,22 @@ async def get_gpt4_response(prompt: str, workspace_id: str, sender_name: str, se
                 "$or": [
                     {"sender_id": sender_id}
                 ]
-            }
+            },
+            namespace=workspace_namespace(workspace_id)
         )
 
-        template = PromptTemplate(
-            template="""You are Chattie Bot, a helpful AI assistant. You are responding to {sender_name} (ID: {sender_id}).
-
-Recent Thread Context:
-{channel_context}
-
-{sender_name}'s Current Query: {query}
-
-When responding:
-- Directly address {sender_name}
-- Reference relevant points from their conversation history
-- Provide clear, helpful information
-- Stay focused on their specific question
-- Be friendly and professional
-- If the context shows previous interactions with {sender_name}, maintain continuity""",
-            input_variables=["query", "channel_context", "sender_name", "sender_id"]
-        )
-
-        prompt_with_context = template.format(
-            query=prompt,
-            channel_context="\n".join([
-                f"[{doc.metadata.get('timestamp', 'Unknown Time')}] {doc.metadata.get('sender_name', 'Unknown User')}: {doc.page_content}" 
-                for doc in sorted(channel_context, key=lambda x: x.metadata.get('timestamp', ''))
-            ]),
-            sender_name=sender_name,
-            sender_id=sender_id
-        )
+        prompt_with_context = [
+            SystemMessage(content=ASSISTANT_SYSTEM),
+            HumanMessage(content=ASSISTANT_REQUEST.format(
+                query=prompt,
+                channel_context="\n".join([
+                    f"[{doc.metadata.get('timestamp', 'Unknown Time')}] {doc.metadata.get('sender_name', 'Unknown User')}: {doc.page_content}"
+                    for doc in sorted(channel_context, key=lambda x: x.metadata.get('timestamp', ''))
+                ]),
+                sender_name=sender_name,
+                sender_id=sender_id
+            ))
+        ]
 
         response = await llm.ainvoke(prompt_with_context, temperature=0.8)
         return response.content
@@ -339,10 +410,10 @@ async def main(context):
             
             if command == '/summarize':
                 logger.info(f"Processing summarize command for channel {data['channel_id']}")
-                response_content = await handle_summarize_command(data['channel_id'])
+                response_content = await handle_summarize_command(data['channel_id'], data['workspace_id'])
             elif command == '/analyze':
                 logger.info(f"Processing analyze command for channel {data['channel_id']}")
-                response_content = await handle_analyze_command(data['channel_id'])
+                response_content = await handle_analyze_command(data['channel_id'], data['workspace_id'])
             
             if response_content:
                 logger.info(f"Command response: {response_content}")
@@ -371,6 +442,7 @@ async def main(context):
         
         # Skip embedding if message is from bot
         if data.get('sender_id') != 'bot':
+            now = datetime.now(timezone.utc)
             message_document = Document(
                 page_content=clean_content,
                 metadata={
@@ -378,10 +450,12 @@ async def main(context):
                     'workspace_id': data['workspace_id'],
                     'sender_id': data['sender_id'],
                     'sender_name': data['sender_name'],
-                    'timestamp': datetime.now().isoformat()
+                    'timestamp': now.isoformat(),
+                    'ts': now.timestamp()
                 }
             )
-            document_vectorstore.add_documents([message_document])
+            document_vectorstore.add_documents([message_document],
+                                               namespace=workspace_namespace(data['workspace_id']))
             logger.info("Message embedded in vector store")
         
         # Process mentions
@@ -402,7 +476,8 @@ async def main(context):
                 persona_context = await get_persona_context(
                     database,
                     mention['id'],
-                    data['channel_id']
+                    data['channel_id'],
+                    data['workspace_id']
                 )
                 if persona_context:
                     mention_contexts = [persona_context]
@@ -410,6 +485,7 @@ async def main(context):
                         clean_content,
                         persona_context,
                         data['channel_id'],
+                        data['workspace_id'],
                         data['sender_name'],
                         data['sender_id']
                     )
@@ -418,6 +494,7 @@ async def main(context):
                 logger.info(f"Bot response: {response_content}")
                 
                 # Store response in Pinecone
+                now = datetime.now(timezone.utc)
                 bot_message_document = Document(
                     page_content=response_content,
                     metadata={
@@ -425,10 +502,12 @@ async def main(context):
                         'workspace_id': data['workspace_id'],
                         'sender_id': mention['id'],
                         'sender_name': mention['name'],
-                        'timestamp': datetime.now().isoformat()
+                        'timestamp': now.isoformat(),
+                        'ts': now.timestamp()
                     }
                 )
-                document_vectorstore.add_documents([bot_message_document])
+                document_vectorstore.add_documents([bot_message_document],
+                                                   namespace=workspace_namespace(data['workspace_id']))
                 
                 # Convert context to JSON serializable format and stringify
                 json_contexts = convert_context_to_json(mention_contexts)
@@ -8,8 +8,7 @@ from appwrite.services.databases import Databases
 from appwrite.permission import Permission
 from appwrite.role import Role
 from appwrite.id import ID
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
+from langchain_openai import ChatOpenAI
 from langchain.schema import Document
 from langchain.prompts import PromptTemplate
 import logging
@@ -18,6 +17,8 @@ import random
 import multiprocessing
 from functools import partial
 
+from fakes.factory import make_embeddings, make_vectorstore
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -39,8 +40,8 @@ client.set_key(os.getenv('APPWRITE_API_KEY'))
 database = Databases(client)
 
 # Initialize LangChain components
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
-document_vectorstore = PineconeVectorStore(
+embeddings = make_embeddings(model="text-embedding-3-large")
+document_vectorstore = make_vectorstore(
     index_name='messages',
     embedding=embeddings
 )
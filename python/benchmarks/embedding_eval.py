@@ -0,0 +1,159 @@
+"""
+Offline recall@k of reduced-dimension and quantized embedding profiles.
+
+Exported messages are embedded once at full size; every profile is then
+derived from those vectors (text-embedding-3 outputs can be shortened by
+truncating and renormalizing) and scored the way the hot tier's brute-force
+partitions score them. Recall@k is measured against the exact top-k of the
+full-size float32 vectors, using a sample of the messages themselves as
+queries.
+
+    python -m benchmarks.embedding_eval --input db/messages.csv --cache /tmp/messages.npz
+"""
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import re
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from dotenv import load_dotenv
+
+# Add the parent directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from fakes.factory import make_embeddings
+from retrieval.quantization import bytes_per_vector, get_codec, shorten
+
+logger = logging.getLogger('embedding_eval')
+
+DEFAULT_INPUT = Path(__file__).parent.parent / 'db' / 'workspace_messages.jsonl'
+_TAG = re.compile(r'<[^>]+>')
+
+
+def load_messages(path: Path) -> List[str]:
+    """Distinct message texts from a .jsonl or .csv export, tags stripped"""
+    if path.suffix == '.jsonl':
+        with open(path, encoding='utf-8') as f:
+            contents = [json.loads(line).get('content') or '' for line in f if line.strip()]
+    else:
+        with open(path, newline='', encoding='utf-8') as f:
+            contents = [row.get('content') or '' for row in csv.DictReader(f)]
+    texts = (' '.join(_TAG.sub(' ', content).split()) for content in contents)
+    # Reposted messages would tie with each other and make the ground truth arbitrary
+    return list(dict.fromkeys(text for text in texts if text))
+
+
+def embed(texts: List[str], model: str, batch_size: int, cache: str = None) -> np.ndarray:
+    """Full-size unit vectors for `texts`, reused from `cache` when it was built from the same texts"""
+    digest = hashlib.sha256('\x00'.join([model, *texts]).encode('utf-8')).hexdigest()
+    if cache and Path(cache).exists():
+        saved = np.load(cache)
+        if str(saved['digest']) == digest:
+            logger.info(f"Loaded {len(saved['vectors'])} vectors from {cache}")
+            return saved['vectors']
+
+    embeddings = make_embeddings(model=model, dimensions=None)
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(embeddings.embed_documents(texts[start:start + batch_size]))
+        logger.info(f"Embedded {min(start + batch_size, len(texts))}/{len(texts)}")
+    vectors = shorten(vectors, None)
+    if cache:
+        np.savez(cache, vectors=vectors, digest=digest)
+    return vectors
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+def evaluate(vectors: np.ndarray, queries: np.ndarray, k: int, dimensions: List[int],
+             quantizations: List[str]) -> List[dict]:
+    """recall@k, bytes per vector and scan time of every dimensions x quantization profile"""
+    k = min(k, len(vectors) - 1)
+    full = vectors @ vectors[queries].T
+    full[queries, np.arange(len(queries))] = -np.inf
+    truth = [set(top_k(full[:, column], k)) for column in range(len(queries))]
+
+    results = []
+    for size in dimensions:
+        size = min(size, vectors.shape[1])
+        reduced = shorten(vectors, size)
+        for quantization in quantizations:
+            codec = get_codec(quantization)
+            rows, scales = codec.encode(reduced)
+            hits, elapsed = 0, 0.0
+            for column, query in enumerate(queries):
+                started = time.perf_counter()
+                scores = codec.scores(rows, scales, reduced[query]).astype(np.float32)
+                elapsed += time.perf_counter() - started
+                scores[query] = -np.inf
+                hits += len(truth[column].intersection(top_k(scores, k)))
+            results.append({
+                'dimensions': size,
+                'quantization': codec.name,
+                'recall': hits / (k * len(queries)),
+                'bytes_per_vector': bytes_per_vector(size, codec.name),
+                'index_bytes': bytes_per_vector(size, codec.name) * len(vectors),
+                'us_per_query': elapsed / len(queries) * 1e6,
+            })
+    return results
+
+
+def print_report(report: dict):
+    print(f"\n{report['messages']} messages, {report['queries']} queries, recall@{report['k']} "
+          f"against {report['full_dimensions']}-d float32")
+    print(f"\n{'dimensions':>10}  {'quantization':<14}{'recall':>8}{'bytes/vec':>11}{'index KiB':>11}{'us/query':>10}")
+    for row in report['profiles']:
+        print(f"{row['dimensions']:>10}  {row['quantization']:<14}{row['recall']:>8.3f}{row['bytes_per_vector']:>11}"
+              f"{row['index_bytes'] / 1024:>11.0f}{row['us_per_query']:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k of shortened and quantized embedding profiles")
+    parser.add_argument('--input', default=str(DEFAULT_INPUT), help="Exported messages (.jsonl or .csv)")
+    parser.add_argument('--model', default="text-embedding-3-large")
+    parser.add_argument('--cache', help="Save/reuse the full-size vectors in this .npz file")
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--dimensions', default='3072,1536,1024,512,256')
+    parser.add_argument('--quantization', default='none,int8,binary')
+    parser.add_argument('--queries', type=int, default=200, help="Messages sampled as queries")
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="Write the JSON report here")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    load_dotenv()
+
+    texts = load_messages(Path(args.input))
+    if len(texts) < 2:
+        parser.error(f"{args.input} has fewer than two distinct messages")
+    vectors = embed(texts, args.model, args.batch_size, args.cache)
+    rng = np.random.default_rng(args.seed)
+    queries = rng.choice(len(texts), size=min(args.queries, len(texts)), replace=False)
+
+    report = {
+        'input': args.input,
+        'messages': len(texts),
+        'queries': len(queries),
+        'k': min(args.k, len(texts) - 1),
+        'full_dimensions': int(vectors.shape[1]),
+        'profiles': evaluate(vectors, queries, args.k, [int(d) for d in args.dimensions.split(',')],
+                             args.quantization.split(',')),
+    }
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Microbenchmark of the embedding ingest path (server/embeddings.embed_message).
+
+Replays exported messages, plus optional synthetic long messages, through
+the chunking stage alone (the previous always-split RecursiveCharacterTextSplitter
+against retrieval.chunking) and then through embed_message end to end on
+the offline stand-ins.
+
+    python -m benchmarks.ingest --input db/messages.csv --long-fraction 0.05
+"""
+import argparse
+import csv
+import importlib
+import json
+import logging
+import os
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+# Add the parent directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from monitoring.histogram import LatencyHistogram
+
+logger = logging.getLogger('ingest_bench')
+
+DEFAULT_INPUT = Path(__file__).parent.parent / 'db' / 'workspace_messages.jsonl'
+
+
+def load_messages(path: Path) -> List[dict]:
+    """Message dicts with the fields embed_message reads, from a .jsonl or .csv export"""
+    if path.suffix == '.jsonl':
+        with open(path, encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    else:
+        with open(path, newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+    return [
+        {
+            '$id': f'bench-{position}',
+            'content': row.get('content') or '',
+            'channel_id': row.get('channel_id') or 'bench-channel',
+            'workspace_id': row.get('workspace_id') or 'bench-workspace',
+            'sender_id': row.get('sender_id') or row.get('sender_name') or 'bench-sender',
+            'edited_at': row.get('edited_at') or row.get('$createdAt'),
+        }
+        for position, row in enumerate(rows)
+    ]
+
+
+def add_long_messages(messages: List[dict], fraction: float, rng: random.Random) -> List[dict]:
+    """Replace `fraction` of the messages with pastes of 2,000-8,000 characters built from the others"""
+    pool = [message['content'] for message in messages]
+    for message in rng.sample(messages, int(len(messages) * fraction)):
+        target = rng.randint(2000, 8000)
+        parts = []
+        while sum(len(part) + 1 for part in parts) < target:
+            parts.append(rng.choice(pool))
+        message['content'] = ' '.join(parts)[:target]
+    return messages
+
+
+def _time(histogram: LatencyHistogram, function: Callable, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    histogram.record(time.perf_counter() - started)
+    return result
+
+
+def bench_split(messages: List[dict]) -> dict:
+    """Per-message cost and chunk counts of the old and new chunking stages"""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    from retrieval.chunking import chunk_message
+
+    def legacy(message):
+        # What embed_message did before: a new splitter for every message
+        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+        return splitter.create_documents([message['content']], metadatas=[{}])
+
+    results = {}
+    for name, function in (('always_split', legacy),
+                           ('length_gated', lambda message: chunk_message(message['content'], {}, message['$id'])[0])):
+        histogram = LatencyHistogram(min_value=1e-7)
+        chunks = sum(len(_time(histogram, function, message)) for message in messages)
+        results[name] = {**histogram.summary(), 'chunks': chunks}
+    return results
+
+
+def bench_embed(messages: List[dict]) -> dict:
+    """embed_message end to end on the offline embeddings and vector store"""
+    os.environ['FAKE_SERVICES'] = '1'
+    for key, value in (('FAKE_EMBEDDING_LATENCY', '0'), ('FAKE_VECTOR_LATENCY', '0'), ('PINECONE_INDEX', 'bench'),
+                       ('PINECONE_API_KEY', 'offline'), ('LANGCHAIN_API_KEY', 'offline'),
+                       ('LANGCHAIN_TRACING_V2', 'false'), ('LANGCHAIN_PROJECT', 'bench')):
+        os.environ.setdefault(key, value)
+    embeddings = importlib.import_module('server.embeddings')
+    embeddings.logger.setLevel(logging.WARNING)
+
+    histogram = LatencyHistogram(min_value=1e-7)
+    for message in messages:
+        _time(histogram, embeddings.embed_message, message)
+    return histogram.summary()
+
+
+def print_report(report: dict):
+    long_count = report['long_messages']
+    print(f"\n{report['messages']} messages ({long_count} long)")
+    print(f"\n{'stage':<28}{'chunks':>8}{'avg us':>10}{'p50 us':>10}{'p99 us':>10}{'max us':>10}")
+    rows = [(name, stats) for name, stats in report['split'].items()]
+    if report.get('embed_message'):
+        rows.append(('embed_message', report['embed_message']))
+    for name, stats in rows:
+        chunks = stats.get('chunks', '')
+        print(f"{name:<28}{chunks:>8}{stats['avg'] * 1e6:>10.1f}{stats['p50'] * 1e6:>10.1f}"
+              f"{stats['p99'] * 1e6:>10.1f}{stats['max'] * 1e6:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark of message chunking and embedding ingest")
+    parser.add_argument('--input', default=str(DEFAULT_INPUT), help="Exported messages (.jsonl or .csv)")
+    parser.add_argument('--long-fraction', type=float, default=0.0,
+                        help="Share of messages replaced by long pastes, to exercise the splitting path")
+    parser.add_argument('--repeat', type=int, default=1, help="Replay the messages this many times")
+    parser.add_argument('--skip-embed', action='store_true', help="Only time the chunking stage")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="Write the JSON report here")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    rng = random.Random(args.seed)
+    messages = add_long_messages(load_messages(Path(args.input)), args.long_fraction, rng) * args.repeat
+
+    from retrieval.chunking import needs_split
+    report = {
+        'input': args.input,
+        'messages': len(messages),
+        'long_messages': sum(needs_split(message['content']) for message in messages),
+        'split': bench_split(messages),
+        'embed_message': None if args.skip_embed else bench_embed(messages),
+    }
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,429 @@
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import aiohttp
+
+# Add the parent directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from monitoring.histogram import LatencyHistogram
+from monitoring.sink import MetricsTailReader
+
+logger = logging.getLogger('loadgen')
+
+BASELINE_DIR = Path(__file__).parent / 'baselines'
+DEFAULT_MENTION_MIX = {'none': 0.6, 'persona': 0.3, 'bot': 0.1}
+DEFAULT_COMMAND_MIX = {'none': 0.9, 'summarize': 0.05, 'analyze': 0.05}
+SAMPLE_MESSAGES = [
+    "Has anyone looked at the deploy numbers from yesterday?",
+    "I think we should revisit the onboarding flow before the next release.",
+    "Dogs are clearly better than cats, change my mind.",
+    "Can someone summarize what we decided about the pricing page?",
+    "The new search feels a lot faster, nice work everyone.",
+    "What do you all think about moving standup to the afternoon?",
+]
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """Parse 'none=0.6,persona=0.3,bot=0.1' into normalized weights"""
+    weights = {}
+    for part in text.split(','):
+        key, _, value = part.partition('=')
+        weights[key.strip()] = float(value)
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError(f"Mix has no positive weights: {text}")
+    return {key: value / total for key, value in weights.items()}
+
+
+def _choose(rng: random.Random, mix: Dict[str, float]) -> str:
+    return rng.choices(list(mix), weights=list(mix.values()))[0]
+
+
+def mention_html(mention_id: str, name: str) -> str:
+    return (f'<span data-mention="true" data-mention-id="{mention_id}" '
+            f'data-mention-name="{name}">@{name}</span>')
+
+
+def make_personas(count: int) -> List[dict]:
+    """Synthetic ai_personas documents with every field the bot's prompts read"""
+    return [
+        {
+            '$id': f'persona_{i}',
+            'name': f'Persona {i}',
+            'role': 'team member',
+            'personality': 'curious and direct',
+            'conversation_style': 'short and friendly',
+            'knowledge_base': ['product', 'engineering'],
+            'opinions': ['ship small changes often'],
+            'disagreements': ['long meetings']
+        }
+        for i in range(count)
+    ]
+
+
+class Workload:
+    """Generates webhook payloads with the configured mention and command mix"""
+
+    def __init__(self, mention_mix: Dict[str, float], command_mix: Dict[str, float], personas: List[dict],
+                 workspace_id: str = 'bench_workspace', channels: int = 4, seed: Optional[int] = None):
+        self.mention_mix = mention_mix
+        self.command_mix = command_mix
+        self.personas = personas
+        self.workspace_id = workspace_id
+        self.channels = [f'bench_channel_{i}' for i in range(channels)]
+        self.rng = random.Random(seed)
+
+    def next_payload(self):
+        """Returns (kind, payload)"""
+        rng = self.rng
+        channel_id = rng.choice(self.channels)
+        sender = rng.randrange(50)
+        payload = {
+            'channel_id': channel_id,
+            'workspace_id': self.workspace_id,
+            'sender_id': f'bench_user_{sender}',
+            'sender_name': f'Bench User {sender}',
+            'sender_type': 'user',
+        }
+        command = _choose(rng, self.command_mix)
+        if command != 'none':
+            payload['content'] = f'/{command}'
+            return command, payload
+
+        text = rng.choice(SAMPLE_MESSAGES)
+        kind = _choose(rng, self.mention_mix)
+        if kind == 'persona' and self.personas:
+            persona = rng.choice(self.personas)
+            text = f"{mention_html(persona['$id'], persona['name'])} {text}"
+        elif kind == 'bot':
+            text = f"{mention_html('bot', 'Chattie Bot')} {text}"
+        else:
+            kind = 'none'
+        payload['content'] = f'<p>{text}</p>'
+        return kind, payload
+
+
+class StageCollector:
+    """
+    Per-stage latency histograms built from trace spans.
+
+    Acts as a tracer exporter for in-process runs, or ingests the records
+    a server writes to its trace file.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self._lock = threading.Lock()
+
+    def export(self, service: str, trace):
+        with self._lock:
+            for span in trace.spans:
+                self.stages[span.name].record(span.duration)
+
+    def add_record(self, record: dict):
+        with self._lock:
+            for span in record.get('spans', []):
+                self.stages[span['name']].record(span['duration'])
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {name: histogram.summary() for name, histogram in sorted(self.stages.items())}
+
+
+class LoadResult:
+    def __init__(self):
+        self.latencies: Dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self.statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.dropped = 0
+        self.started = 0.0
+        self.finished = 0.0
+
+    def record(self, kind: str, latency: float, status: Optional[int], error: Optional[str] = None):
+        self.latencies[kind].record(latency)
+        self.latencies['all'].record(latency)
+        if status is not None:
+            self.statuses[status] += 1
+        if error:
+            self.errors[error] += 1
+
+    def summary(self) -> dict:
+        elapsed = max(self.finished - self.started, 1e-9)
+        completed = self.latencies['all'].count if 'all' in self.latencies else 0
+        ok = sum(count for status, count in self.statuses.items() if 200 <= status < 300)
+        return {
+            'elapsed': elapsed,
+            'completed': completed,
+            'throughput': completed / elapsed,
+            'success_rate': ok / completed if completed else 0.0,
+            'dropped': self.dropped,
+            'statuses': {str(status): count for status, count in sorted(self.statuses.items())},
+            'errors': dict(self.errors),
+            'latency': {kind: histogram.summary() for kind, histogram in sorted(self.latencies.items())}
+        }
+
+
+async def send(session: aiohttp.ClientSession, url: str, kind: str, payload: dict, result: LoadResult,
+               scheduled: float):
+    # Latency is measured from the scheduled send time to avoid coordinated omission in open-loop runs
+    try:
+        async with session.post(url, json=payload) as response:
+            await response.read()
+            result.record(kind, time.perf_counter() - scheduled, response.status)
+    except Exception as e:
+        result.record(kind, time.perf_counter() - scheduled, None, type(e).__name__)
+
+
+async def run_closed_loop(url: str, workload: Workload, result: LoadResult, concurrency: int,
+                          duration: Optional[float], total: Optional[int], think_time: float = 0.0):
+    """`concurrency` virtual users, each sending its next request once the previous one completes"""
+    remaining = [total]
+    deadline = time.perf_counter() + duration if duration else None
+
+    async def user(session):
+        while True:
+            if deadline and time.perf_counter() >= deadline:
+                return
+            if remaining[0] is not None:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            kind, payload = workload.next_payload()
+            await send(session, url, kind, payload, result, time.perf_counter())
+            if think_time:
+                await asyncio.sleep(workload.rng.expovariate(1.0 / think_time))
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+        result.started = time.perf_counter()
+        await asyncio.gather(*(user(session) for _ in range(concurrency)))
+        result.finished = time.perf_counter()
+
+
+async def run_open_loop(url: str, workload: Workload, result: LoadResult, rate: float,
+                        duration: Optional[float], total: Optional[int], max_in_flight: int = 1000):
+    """Poisson arrivals at `rate` requests/second, independent of how fast the server responds"""
+    in_flight = set()
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=max_in_flight)) as session:
+        result.started = time.perf_counter()
+        next_arrival = result.started
+        sent = 0
+        while True:
+            if total is not None and sent >= total:
+                break
+            if duration and next_arrival - result.started >= duration:
+                break
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            kind, payload = workload.next_payload()
+            if len(in_flight) >= max_in_flight:
+                result.dropped += 1
+            else:
+                task = asyncio.create_task(send(session, url, kind, payload, result, next_arrival))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            sent += 1
+            next_arrival += workload.rng.expovariate(rate)
+        if in_flight:
+            await asyncio.gather(*in_flight)
+        result.finished = time.perf_counter()
+
+
+def _run_loop_in_thread(coro_factory):
+    """Start an event loop in a daemon thread, run `coro_factory()` on it and return (loop, result)"""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name='loadgen-server', daemon=True).start()
+    return loop, asyncio.run_coroutine_threadsafe(coro_factory(), loop).result()
+
+
+def start_in_process_bot(personas: List[dict], appwrite_latency: float = 0.0, port: int = 8765,
+                         module: str = 'bot.bot', seed: Optional[dict] = None) -> tuple:
+    """
+    Run the bot webhook against the offline stand-ins in background threads.
+
+    The fake Appwrite and the bot each get their own event loop, because the
+    bot calls the synchronous Appwrite SDK from its handlers. Returns
+    (url, stage collector). `seed` is extra fake Appwrite data in the
+    DocumentStore.load format.
+    """
+    from fakes.appwrite_server import DocumentStore, start_server
+    from fakes.latency import LatencyModel
+
+    store = DocumentStore()
+    store.load({'main': {'ai_personas': personas}})
+    if seed:
+        store.load(seed)
+    appwrite_port = port + 1
+    _run_loop_in_thread(lambda: start_server('127.0.0.1', appwrite_port, store, LatencyModel(appwrite_latency, 0.5)))
+
+    os.environ['FAKE_SERVICES'] = '1'
+    os.environ['PUBLIC_APPWRITE_ENDPOINT'] = f'http://127.0.0.1:{appwrite_port}/v1'
+    for key, value in (('APPWRITE_PROJECT_ID', 'bench'), ('APPWRITE_API_KEY', 'bench'), ('OPENAI_API_KEY', 'offline'),
+                       ('PINECONE_API_KEY', 'offline'), ('LANGCHAIN_API_KEY', 'offline'),
+                       ('LANGCHAIN_TRACING_V2', 'false'), ('LANGCHAIN_PROJECT', 'bench')):
+        os.environ.setdefault(key, value)
+    bot = importlib.import_module(module)
+
+    # Keep every trace, in memory, for per-stage percentiles
+    collector = StageCollector()
+    bot.tracer.exporter = collector
+    bot.tracer.sample_rate = 1.0
+
+    async def start_bot():
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_post('/', bot.handle_message)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', port).start()
+        return runner
+
+    _run_loop_in_thread(start_bot)
+    return f'http://127.0.0.1:{port}/', collector
+
+
+def compare_to_baseline(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Regressions beyond `tolerance` (relative) in throughput or request/stage p50/p99"""
+    regressions = []
+    base_throughput = baseline['load']['throughput']
+    throughput = report['load']['throughput']
+    if base_throughput and throughput < base_throughput * (1 - tolerance):
+        regressions.append(f"throughput {throughput:.2f}/s < baseline {base_throughput:.2f}/s")
+
+    def check(section: str, current: dict, base: dict):
+        for name, stats in base.items():
+            if name not in current:
+                continue
+            for key in ('p50', 'p99'):
+                if stats.get(key) and current[name][key] > stats[key] * (1 + tolerance):
+                    regressions.append(
+                        f"{section} {name} {key} {current[name][key] * 1000:.1f}ms > "
+                        f"baseline {stats[key] * 1000:.1f}ms"
+                    )
+
+    check('request', report['load']['latency'], baseline['load']['latency'])
+    check('stage', report.get('stages', {}), baseline.get('stages', {}))
+    return regressions
+
+
+def print_report(report: dict):
+    load = report['load']
+    print(f"\n{load['completed']} requests in {load['elapsed']:.1f}s -> {load['throughput']:.2f} req/s "
+          f"(success {load['success_rate'] * 100:.1f}%, dropped {load['dropped']})")
+    if load['errors']:
+        print(f"errors: {load['errors']}")
+    print(f"\n{'request kind':<28}{'count':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}")
+    for kind, stats in load['latency'].items():
+        print(f"{kind:<28}{stats['count']:>8}{stats['p50'] * 1000:>10.1f}{stats['p90'] * 1000:>10.1f}"
+              f"{stats['p99'] * 1000:>10.1f}")
+    if report.get('stages'):
+        print(f"\n{'stage':<28}{'count':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}")
+        for name, stats in report['stages'].items():
+            print(f"{name:<28}{stats['count']:>8}{stats['p50'] * 1000:>10.1f}{stats['p90'] * 1000:>10.1f}"
+                  f"{stats['p99'] * 1000:>10.1f}")
+
+
+async def run(args) -> dict:
+    personas = make_personas(args.personas)
+    workload = Workload(parse_mix(args.mention_mix), parse_mix(args.command_mix), personas,
+                        channels=args.channels, seed=args.seed)
+
+    trace_reader = None
+    if args.target:
+        url = args.target
+        collector = StageCollector()
+        if args.trace_file:
+            trace_reader = MetricsTailReader(args.trace_file)
+            trace_reader.read_new()  # skip traces from before this run
+    else:
+        url, collector = start_in_process_bot(personas, args.appwrite_latency, args.port)
+
+    result = LoadResult()
+    duration = args.duration if args.requests is None else None
+    if args.mode == 'open':
+        await run_open_loop(url, workload, result, args.rate, duration, args.requests, args.max_in_flight)
+    else:
+        await run_closed_loop(url, workload, result, args.concurrency, duration, args.requests, args.think_time)
+
+    if trace_reader is not None:
+        await asyncio.sleep(2)  # give the server's trace sink time to flush
+        for record in trace_reader.read_new():
+            collector.add_record(record)
+
+    return {
+        'config': {
+            key: value for key, value in vars(args).items()
+            if key not in ('save_baseline', 'compare', 'output')
+        },
+        'load': result.summary(),
+        'stages': collector.summary()
+    }
+
+
+def save_report(report: dict, args):
+    """Handle --output, --save-baseline and --compare; exits 1 on regression"""
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        path = BASELINE_DIR / f'{args.save_baseline}.json'
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved baseline {path}")
+    if args.compare:
+        with open(BASELINE_DIR / f'{args.compare}.json') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressions against baseline '{args.compare}':")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against baseline '{args.compare}' (tolerance {args.tolerance:.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the bot webhook")
+    parser.add_argument('--target', help="URL of a running bot; default runs bot.bot in-process on fake services")
+    parser.add_argument('--trace-file', help="Trace file written by the target (TRACE_SAMPLE_RATE=1) for stage stats")
+    parser.add_argument('--mode', choices=('closed', 'open'), default='closed')
+    parser.add_argument('--concurrency', type=int, default=10, help="Virtual users in closed-loop mode")
+    parser.add_argument('--think-time', type=float, default=0.0, help="Mean pause between a user's requests")
+    parser.add_argument('--rate', type=float, default=10.0, help="Arrivals per second in open-loop mode")
+    parser.add_argument('--max-in-flight', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--requests', type=int, help="Stop after this many requests instead of --duration")
+    parser.add_argument('--mention-mix', default=','.join(f'{k}={v}' for k, v in DEFAULT_MENTION_MIX.items()))
+    parser.add_argument('--command-mix', default=','.join(f'{k}={v}' for k, v in DEFAULT_COMMAND_MIX.items()))
+    parser.add_argument('--personas', type=int, default=5)
+    parser.add_argument('--channels', type=int, default=4)
+    parser.add_argument('--appwrite-latency', type=float, default=0.0, help="Mean fake Appwrite latency (in-process)")
+    parser.add_argument('--port', type=int, default=8765, help="Port for the in-process bot (fake Appwrite uses +1)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="Write the JSON report here")
+    parser.add_argument('--save-baseline', metavar='NAME', help="Save the report as benchmarks/baselines/NAME.json")
+    parser.add_argument('--compare', metavar='NAME', help="Compare against a saved baseline; exit 1 on regression")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    report = asyncio.run(run(args))
+    print_report(report)
+    save_report(report, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import argparse
+import asyncio
+import json
+import logging
+import re
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import aiohttp
+
+# Add the parent directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmarks.loadgen import (
+    LoadResult, StageCollector, print_report, save_report, send, start_in_process_bot
+)
+from monitoring.recording import load_recording
+from monitoring.sink import MetricsTailReader
+
+logger = logging.getLogger('replay')
+
+_MENTION = re.compile(r'data-mention-id="([^"]+)"(?:[^>]*?data-mention-name="([^"]*)")?')
+_TAG = re.compile(r'<[^>]+>')
+
+
+def classify(payload) -> str:
+    """Request kind, matching loadgen's labels: a command name, 'persona', 'bot', 'ai_persona' or 'none'"""
+    if not isinstance(payload, dict):
+        return 'invalid'
+    if payload.get('sender_type') == 'ai_persona':
+        return 'ai_persona'
+    content = payload.get('content') or ''
+    text = _TAG.sub('', content).strip()
+    if text.startswith('/'):
+        return text.split()[0][1:].lower() or 'none'
+    mention_ids = [match.group(1) for match in _MENTION.finditer(content)]
+    if 'bot' in mention_ids:
+        return 'bot'
+    return 'persona' if mention_ids else 'none'
+
+
+def seed_for(records: List[dict]) -> dict:
+    """Fake Appwrite documents for every persona and channel the recording refers to"""
+    names, channels = {}, {}
+    for record in records:
+        body = record['body']
+        if not isinstance(body, dict):
+            continue
+        for mention_id, name in _MENTION.findall(body.get('content') or ''):
+            if mention_id != 'bot':
+                names.setdefault(mention_id, name or mention_id)
+        if body.get('channel_id'):
+            channels.setdefault(body['channel_id'], body.get('workspace_id'))
+    personas = [
+        {
+            '$id': mention_id,
+            'name': name,
+            'role': 'team member',
+            'personality': 'curious and direct',
+            'conversation_style': 'short and friendly',
+            'knowledge_base': ['product', 'engineering'],
+            'opinions': ['ship small changes often'],
+            'disagreements': ['long meetings']
+        }
+        for mention_id, name in names.items()
+    ]
+    channel_documents = [
+        {'$id': channel_id, 'name': channel_id, 'workspace_id': workspace_id, 'last_message_at': None}
+        for channel_id, workspace_id in channels.items()
+    ]
+    return {'main': {'ai_personas': personas, 'channels': channel_documents}}
+
+
+def schedule(records: List[dict], speed: float, max_gap: Optional[float] = None) -> List[float]:
+    """Send offsets in seconds from the start, keeping recorded gaps divided by `speed`"""
+    offsets = []
+    offset = 0.0
+    for previous, record in zip([None] + records[:-1], records):
+        if previous is not None:
+            gap = record['t'] - previous['t']
+            if max_gap is not None:
+                gap = min(gap, max_gap)
+            offset += gap / speed
+        offsets.append(offset)
+    return offsets
+
+
+async def replay_timed(base_url: str, records: List[dict], result: LoadResult, speed: float,
+                       max_gap: Optional[float], max_in_flight: int):
+    """Send each request at its recorded offset divided by `speed`, independent of response times"""
+    in_flight = set()
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=max_in_flight)) as session:
+        result.started = time.perf_counter()
+        for record, offset in zip(records, schedule(records, speed, max_gap)):
+            scheduled = result.started + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(in_flight) >= max_in_flight:
+                result.dropped += 1
+                continue
+            task = asyncio.create_task(send(session, base_url + record['path'], classify(record['body']),
+                                            record['body'], result, scheduled))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        if in_flight:
+            await asyncio.gather(*in_flight)
+        result.finished = time.perf_counter()
+
+
+async def replay_max(base_url: str, records: List[dict], result: LoadResult, concurrency: int):
+    """Send the recorded requests in order as fast as `concurrency` connections allow"""
+    pending = iter(records)
+
+    async def worker(session):
+        for record in pending:
+            await send(session, base_url + record['path'], classify(record['body']), record['body'], result,
+                       time.perf_counter())
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+        result.started = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        result.finished = time.perf_counter()
+
+
+def parse_speed(text: str) -> Optional[float]:
+    """'1', '10', '10x' or 'max' (returned as None)"""
+    text = text.lower()
+    if text == 'max':
+        return None
+    speed = float(text[:-1] if text.endswith('x') else text)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive or 'max'")
+    return speed
+
+
+async def run(args) -> dict:
+    records = [record for record in load_recording(args.recording) if isinstance(record.get('path'), str)]
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        raise SystemExit(f"No recorded requests in {args.recording}")
+
+    trace_reader = None
+    if args.target:
+        base_url = args.target.rstrip('/')
+        collector = StageCollector()
+        if args.trace_file:
+            trace_reader = MetricsTailReader(args.trace_file)
+            trace_reader.read_new()  # skip traces from before this run
+    else:
+        seed = seed_for(records)
+        if args.seed_data:
+            with open(args.seed_data) as f:
+                extra = json.load(f)
+            # Recorded documents replace the synthetic ones with the same $id
+            for database_id, collections in extra.items():
+                for collection_id, documents in collections.items():
+                    ids = {document.get('$id') for document in documents}
+                    existing = seed.setdefault(database_id, {}).setdefault(collection_id, [])
+                    existing[:] = [doc for doc in existing if doc['$id'] not in ids] + documents
+        url, collector = start_in_process_bot([], args.appwrite_latency, args.port, module=args.module, seed=seed)
+        base_url = url.rstrip('/')
+
+    result = LoadResult()
+    if args.speed is None:
+        await replay_max(base_url, records, result, args.concurrency)
+    else:
+        await replay_timed(base_url, records, result, args.speed, args.max_gap, args.max_in_flight)
+
+    # Queue-based servers (botConvo) finish work after responding
+    await asyncio.sleep(args.drain)
+    if trace_reader is not None:
+        for record in trace_reader.read_new():
+            collector.add_record(record)
+
+    return {
+        'config': {
+            key: value for key, value in vars(args).items()
+            if key not in ('save_baseline', 'compare', 'output')
+        },
+        'recording': {
+            'requests': len(records),
+            'span': records[-1]['t'] - records[0]['t']
+        },
+        'load': result.summary(),
+        'stages': collector.summary()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded webhook traffic (WEBHOOK_RECORD_FILE)")
+    parser.add_argument('recording', help="Recording written by a bot with WEBHOOK_RECORD_FILE set")
+    parser.add_argument('--speed', type=parse_speed, default=1.0, help="Replay speed: 1, 10 or max")
+    parser.add_argument('--max-gap', type=float, help="Cap idle gaps in the recording to this many seconds")
+    parser.add_argument('--concurrency', type=int, default=20, help="Connections at --speed max")
+    parser.add_argument('--max-in-flight', type=int, default=1000)
+    parser.add_argument('--limit', type=int, help="Replay only the first N requests")
+    parser.add_argument('--target', help="URL of a running server; default runs --module in-process on fake services")
+    parser.add_argument('--trace-file', help="Trace file written by the target (TRACE_SAMPLE_RATE=1) for stage stats")
+    parser.add_argument('--module', default='bot.bot', help="Server module to run in-process, e.g. bot.bot or botConvo")
+    parser.add_argument('--seed-data', help="Extra fake Appwrite documents, {database_id: {collection_id: [docs]}}")
+    parser.add_argument('--appwrite-latency', type=float, default=0.0, help="Mean fake Appwrite latency (in-process)")
+    parser.add_argument('--port', type=int, default=8765, help="Port for the in-process server (fake Appwrite uses +1)")
+    parser.add_argument('--drain', type=float, default=2.0, help="Seconds to wait for background work after the run")
+    parser.add_argument('--output', help="Write the JSON report here")
+    parser.add_argument('--save-baseline', metavar='NAME', help="Save the report as benchmarks/baselines/NAME.json")
+    parser.add_argument('--compare', metavar='NAME', help="Compare against a saved baseline; exit 1 on regression")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    report = asyncio.run(run(args))
+    print(f"Replayed {report['recording']['requests']} requests recorded over {report['recording']['span']:.1f}s "
+          f"at {'max' if args.speed is None else f'{args.speed:g}x'} speed")
+    print_report(report)
+    save_report(report, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Microbenchmark and parity check of messages.sanitize.sanitize_html_content
+against the BeautifulSoup implementation it replaced. The copy inlined in
+the Appwrite bot function (deployed without the shared packages) is
+checked too, loaded from its source without importing the function's
+dependencies.
+
+Parity is checked on the exported messages and on randomly generated HTML:
+nested and unclosed tags, mentions (including nested ones and mentions
+inside hidden elements), void and self-closing tags, comments, CDATA,
+script/style/template bodies, entities and unusual whitespace. Any mismatch
+is printed and makes the run exit with status 1. Needs bs4 for the
+reference implementation.
+
+    python -m benchmarks.sanitize --input db/messages.csv --cases 20000
+"""
+import argparse
+import ast
+import csv
+import json
+import random
+import re
+import sys
+import time
+import warnings
+from html.entities import html5
+from pathlib import Path
+from typing import Callable, List
+
+# Add the parent directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from messages.sanitize import sanitize_html_content
+
+DEFAULT_INPUT = Path(__file__).parent.parent / 'db' / 'workspace_messages.jsonl'
+FUNCTION_SOURCE = Path(__file__).parent.parent / 'appwrite' / 'functions' / 'bot' / 'src' / 'main.py'
+TAGS = ['span', 'p', 'b', 'div', 'em', 'br', 'img', 'script', 'style', 'template', 'rt', 'title', 'hr']
+WORDS = ['hello', 'team', '/summarize', 'a&amp;b', '&lt;tag&gt;', '&#65;&#x42;', 'café', 'x\xa0y', '\u2028',
+         '\u200b', '\x1c', '\u3000', '\n\t', '  ', '@here', 'so < than', 'a > b', '5 & 6', 'emoji \U0001F600']
+
+
+def legacy_sanitize_html_content(content: str):
+    """The previous BeautifulSoup implementation, kept as the reference"""
+    from bs4 import BeautifulSoup, XMLParsedAsHTMLWarning
+
+    warnings.filterwarnings('ignore', category=XMLParsedAsHTMLWarning)
+    soup = BeautifulSoup(content, 'html.parser')
+    mentions = []
+    for mention in soup.find_all('span', {'data-mention': 'true'}):
+        mentions.append({
+            'id': mention['data-mention-id'],
+            'name': mention['data-mention-name']
+        })
+        mention.replace_with(f"@{mention['data-mention-name']}")
+    text = soup.get_text()
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text, mentions
+
+
+def _bound_names(node: ast.stmt) -> set:
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        return {node.name}
+    if isinstance(node, (ast.Import, ast.ImportFrom)):
+        return {(alias.asname or alias.name).split('.')[0] for alias in node.names}
+    if isinstance(node, (ast.Assign, ast.AnnAssign)):
+        targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+        return {name.id for target in targets for name in ast.walk(target) if isinstance(name, ast.Name)}
+    return set()
+
+
+def load_inline_sanitizer(path: Path = FUNCTION_SOURCE, name: str = 'sanitize_html_content') -> Callable:
+    """
+    `name` from a module's source, executed together with only the
+    top-level statements it depends on, so the module's other imports
+    need not be installed
+    """
+    tree = ast.parse(path.read_text(encoding='utf-8'))
+    definitions = {}
+    for node in tree.body:
+        for bound in _bound_names(node):
+            definitions[bound] = node
+    needed, pending = [], [name]
+    while pending:
+        node = definitions.get(pending.pop())
+        if node is None or node in needed:
+            continue
+        needed.append(node)
+        pending.extend(child.id for child in ast.walk(node) if isinstance(child, ast.Name))
+    # Keep source order so that definitions run after what they use
+    module = ast.Module(body=[node for node in tree.body if node in needed], type_ignores=[])
+    namespace = {'__name__': 'inline_sanitizer'}
+    exec(compile(module, str(path), 'exec'), namespace)
+    return namespace[name]
+
+
+def load_contents(path: Path) -> List[str]:
+    if path.suffix == '.jsonl':
+        with open(path, encoding='utf-8') as f:
+            return [json.loads(line).get('content') or '' for line in f if line.strip()]
+    with open(path, newline='', encoding='utf-8') as f:
+        return [row.get('content') or '' for row in csv.DictReader(f)]
+
+
+def mention_html(rng: random.Random, inner: str = None) -> str:
+    name = rng.choice(['Ada', 'Bob Smith', 'Zoë', 'a&amp;b', 'x  y'])
+    inner = f'@{name}' if inner is None else inner
+    return (f'<span data-mention="true" data-mention-id="id{rng.randint(0, 99)}" '
+            f'data-mention-name="{name}">{inner}</span>')
+
+
+def random_html(rng: random.Random, depth: int = 0) -> str:
+    parts = []
+    for _ in range(rng.randint(0, 6)):
+        choice = rng.random()
+        if choice < 0.35 or depth > 3:
+            parts.append(rng.choice(WORDS))
+        elif choice < 0.55:
+            inner = random_html(rng, depth + 1) if rng.random() < 0.3 else None
+            parts.append(mention_html(rng, inner))
+        elif choice < 0.8:
+            tag = rng.choice(TAGS)
+            attributes = rng.choice(['', ' class="x"', ' data-mention="false"', ' data-mention'])
+            closing = rng.choice([f'</{tag}>', f'</{tag}>', '', f'</{rng.choice(TAGS)}>'])
+            if rng.random() < 0.1:
+                parts.append(f'<{tag}{attributes}/>')
+            else:
+                parts.append(f'<{tag}{attributes}>{random_html(rng, depth + 1)}{closing}')
+        elif choice < 0.85:
+            parts.append(f'<!-- {rng.choice(WORDS)} -->')
+        elif choice < 0.9:
+            parts.append(f'<![CDATA[{rng.choice(WORDS)}]]>')
+        elif choice < 0.95:
+            parts.append(f'</{rng.choice(TAGS)}>')
+        else:
+            parts.append(rng.choice(['<!DOCTYPE html>', '<?xml x?>', '<', '&', '&amp', '&bogus;']))
+    return ''.join(parts)
+
+
+_REFERENCE = re.compile(r'&(#[0-9]+;|#[xX][0-9a-fA-F]+;|[A-Za-z][A-Za-z0-9]*;)?')
+
+
+def escape_malformed_references(content: str) -> str:
+    """Escape every & that does not start a complete, known character reference"""
+    def escape(match):
+        reference = match.group(1)
+        if reference and (reference.startswith('#') or reference in html5):
+            return match.group(0)
+        return '&amp;' + (reference or '')
+    return _REFERENCE.sub(escape, content)
+
+
+def check_parity(contents: List[str], sanitize: Callable = sanitize_html_content):
+    """
+    (mismatches, reference-only differences) of `sanitize` against the
+    BeautifulSoup reference. A difference counts as
+    reference-only when it disappears once malformed and unknown character
+    references are escaped: the old parser read "&amp" without its semicolon
+    as literal text and dropped the semicolon of "&bogus;", while the new one
+    follows the HTML5 rules.
+    """
+    mismatches, reference_only = [], 0
+    for content in contents:
+        actual = sanitize(content)
+        if actual == legacy_sanitize_html_content(content):
+            continue
+        escaped = escape_malformed_references(content)
+        if sanitize(escaped) == legacy_sanitize_html_content(escaped):
+            reference_only += 1
+        else:
+            expected = legacy_sanitize_html_content(content)
+            mismatches.append(f"{content!r}\n  expected {expected!r}\n  got      {actual!r}")
+    return mismatches, reference_only
+
+
+def bench(function: Callable, contents: List[str], repeat: int) -> float:
+    """Mean microseconds per message"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for content in contents:
+            function(content)
+    return (time.perf_counter() - started) / (repeat * len(contents)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and parity check of the message HTML sanitizer")
+    parser.add_argument('--input', default=str(DEFAULT_INPUT), help="Exported messages (.jsonl or .csv)")
+    parser.add_argument('--cases', type=int, default=5000, help="Randomly generated HTML documents to compare")
+    parser.add_argument('--repeat', type=int, default=5, help="Timing passes over the exported messages")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    exported = load_contents(Path(args.input))
+    generated = [random_html(rng) for _ in range(args.cases)]
+    with_mentions = [content for content in exported if 'data-mention' in content]
+    # The exports are mostly plain text; time the markup path on generated messages with mentions
+    markup = [f'<p>{mention_html(rng)} {content}</p>' for content in exported[:500]]
+
+    print(f"\n{'messages':<30}{'count':>8}{'bs4 us':>10}{'new us':>10}{'speedup':>9}")
+    for name, contents in (('exported', exported), ('exported with mentions', with_mentions),
+                           ('markup + mention', markup)):
+        if not contents:
+            continue
+        legacy = bench(legacy_sanitize_html_content, contents, args.repeat)
+        new = bench(sanitize_html_content, contents, args.repeat)
+        print(f"{name:<30}{len(contents):>8}{legacy:>10.1f}{new:>10.1f}{legacy / new:>8.1f}x")
+
+    cases = exported + markup + generated
+    failed = False
+    for name, sanitize in (('messages.sanitize', sanitize_html_content),
+                           ('appwrite function copy', load_inline_sanitizer())):
+        mismatches, reference_only = check_parity(cases, sanitize)
+        print(f"\n{name} parity over {len(cases)} messages: "
+              f"{len(cases) - reference_only - len(mismatches)} identical, "
+              f"{reference_only} differing only on malformed character references, {len(mismatches)} mismatches")
+        for failure in mismatches[:20]:
+            print(failure)
+        failed = failed or bool(mismatches)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
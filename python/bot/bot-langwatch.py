@@ -10,25 +10,20 @@ from datetime import datetime, timedelta
 import asyncio
 import logging
 import time
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
-from langchain.prompts import PromptTemplate
 from langchain.schema import Document
-import re
-from bs4 import BeautifulSoup
 import sys
 from pathlib import Path
 
 # Add the parent directory to Python path
 sys.path.append(str(Path(__file__).parent.parent))
 
-import langwatch
-from langwatch.types import RAGChunk
-# Configure LangWatch
-langwatch.api_key = 'sk-lw-uaPp8Dsi4vJnQmpiZyJrtYBYDQmvdTUceW3PN6DxCyykeN4v'
-langwatch.endpoint = "http://localhost:5560"
-
+from fakes.factory import make_embeddings, make_vectorstore, make_chat_model, make_retriever
 from monitoring.performance_logger import performance_metrics
+from monitoring.exposition import metrics_middleware_factory
+from monitoring.tracing import tracer_from_env, current_span
+from retrieval.timestamps import timestamp_metadata, with_time_window, message_time
+from messages.sanitize import sanitize_html_content
+from prompts.compiler import CompiledPrompt, PERSONA_SYSTEM, persona_fields, persona_key
 
 # Set up logging for application (not performance metrics)
 logging.basicConfig(
@@ -50,13 +45,62 @@ client.set_key(os.getenv('APPWRITE_API_KEY'))
 database = Databases(client)
 
 # Initialize LangChain components
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
-document_vectorstore = PineconeVectorStore(
+embeddings = make_embeddings(model="text-embedding-3-large")
+document_vectorstore = make_vectorstore(
     index_name='messages',
     embedding=embeddings
 )
-retriever = document_vectorstore.as_retriever()
-llm = ChatOpenAI(temperature=0.7, model_name="gpt-4o-mini")
+retriever = make_retriever(document_vectorstore)
+llm = make_chat_model(temperature=0.7, model_name="gpt-4o-mini")
+
+tracer = tracer_from_env('bot-langwatch')
+
+# /summarize and /analyze read the channel's last day, falling back to all of it when that is empty
+COMMAND_WINDOW = timedelta(days=1)
+
+# Static instructions and persona profiles go first so the provider caches them as a shared prefix
+SUMMARIZE_PROMPT = CompiledPrompt(
+    "Please provide a concise summary of the following conversation, highlighting key points and decisions:",
+    "{messages}\n\nSummary:"
+)
+ANALYZE_PROMPT = CompiledPrompt(
+    """Please analyze this conversation and provide insights on:
+1. Main topics discussed
+2. Key participants and their viewpoints
+3. Areas of agreement and disagreement
+4. Overall tone and engagement level
+5. Any notable patterns or trends""",
+    """Conversation:
+{messages}
+
+Analysis:"""
+)
+PERSONA_PROMPT = CompiledPrompt(
+    PERSONA_SYSTEM,
+    """Recent conversation context:
+{channel_context}
+
+Your own recent messages:
+{own_messages}
+
+Please respond to the following message in your unique voice and style briefly, maintaining your personality and viewpoints:
+{prompt}"""
+)
+REDDIT_PROMPT = CompiledPrompt(
+    """You are a cynical Reddit commenter. Your responses should be witty, sarcastic, and slightly condescending, while still being informative. You enjoy pointing out logical fallacies and making pop culture references. You start many sentences with "Actually..." and "Well, technically...". You occasionally use Reddit-style formatting like /s for sarcasm and FTFY (Fixed That For You).
+
+Remember to:
+- Be cynical but not outright mean
+- Include at least one snarky observation
+- Reference a meme or pop culture if relevant
+- Use typical Reddit phrases like "Source?" or "Username checks out"
+- Point out any obvious logical fallacies
+- Add /s if being particularly sarcastic""",
+    """Recent Thread Context:
+{channel_context}
+
+Respond to this comment in classic Reddit style: {query}"""
+)
 
 async def get_persona(persona_id: str) -> dict:
     """Get persona information from Appwrite database"""
@@ -71,56 +115,25 @@ async def get_persona(persona_id: str) -> dict:
         logger.error(f"Error getting persona {persona_id}: {str(e)}")
         return None
 
-def sanitize_html_content(content: str) -> tuple[str, list[dict]]:
-    """
-    Sanitize HTML content and extract mentions.
-    Returns (sanitized_text, mentions)
-    """
-    soup = BeautifulSoup(content, 'html.parser')
-    mentions = []
-    
-    # Extract mentions
-    for mention in soup.find_all('span', {'data-mention': 'true'}):
-        mentions.append({
-            'id': mention['data-mention-id'],
-            'name': mention['data-mention-name']
-        })
-        # Replace mention with a text marker
-        mention.replace_with(f"@{mention['data-mention-name']}")
-    
-    # Get plain text
-    text = soup.get_text()
-    
-    # Clean up extra whitespace
-    text = re.sub(r'\s+', ' ', text).strip()
-    
-    return text, mentions
-
-@langwatch.span(type="chain")
-async def get_channel_messages(channel_id, limit=100):
+@tracer.traced()
+async def get_channel_messages(channel_id, workspace_id, limit=100, window=None):
     try:
-        # Get all messages from the channel, sorted by timestamp
+        # Get the channel's messages from the last `window` (None for all), sorted by timestamp
+        channel_filter = {"channel_id": channel_id, "workspace_id": workspace_id}
         docs = document_vectorstore.similarity_search(
             query="",  # Empty query to bypass similarity search
             k=limit,
-            filter={
-                "channel_id": channel_id,
-            },
+            filter=with_time_window(channel_filter, last=window),
         )
+        if window is not None and not docs:
+            # Vectors without a numeric ts (not yet backfilled) never match a window
+            logger.info(f"No messages in channel {channel_id} within {window}, retrieving without a window")
+            docs = document_vectorstore.similarity_search(query="", k=limit, filter=channel_filter)
 
         # Sort by timestamp
-        docs.sort(key=lambda x: x.metadata['timestamp'])
+        docs.sort(key=lambda x: message_time(x.metadata))
         
-        # Update the span with RAG context
-        langwatch.get_current_span().update(
-            contexts=[
-                RAGChunk(
-                    document_id=doc.metadata.get('sender_id', 'unknown'),
-                    content=doc.page_content
-                )
-                for doc in docs
-            ]
-        )
+        current_span().set_attribute('documents', len(docs))
         
         return docs
     except Exception as e:
@@ -169,8 +182,8 @@ async def send_private_message(user_id: str, content: str, workspace_id: str, ch
         logger.error(f"Error sending private message to {user_id}: {str(e)}")
         raise
 
-@langwatch.span(type="chain")
-async def get_persona_context(mention_id: str, channel_id: str) -> dict:
+@tracer.traced()
+async def get_persona_context(mention_id: str, channel_id: str, workspace_id: str) -> dict:
     """Get persona information and relevant context for a mentioned persona"""
     try:
         # Get persona from database using the new function
@@ -184,20 +197,12 @@ async def get_persona_context(mention_id: str, channel_id: str) -> dict:
             k=5,
             filter={
                 "channel_id": channel_id,
+                "workspace_id": workspace_id,
                 "sender_id": mention_id
             }
         )
         
-        # Update the span with RAG context
-        langwatch.get_current_span().update(
-            contexts=[
-                RAGChunk(
-                    document_id=doc.metadata.get('sender_id', 'unknown'),
-                    content=doc.page_content
-                )
-                for doc in relevant_messages
-            ]
-        )
+        current_span().set_attribute('documents', len(relevant_messages))
         
         return {
             'persona': persona,
@@ -207,22 +212,14 @@ async def get_persona_context(mention_id: str, channel_id: str) -> dict:
         logger.error(f"Error getting persona context: {str(e)}")
         return None
 
-@langwatch.span(type="chain")
+@tracer.traced()
 async def handle_summarize_command(channel_id: str, user_id: str, workspace_id: str) -> str:
     """Handle /summarize command"""
     try:
-        # Get last 100 messages from the channel
-        with langwatch.get_current_span().span(type="rag") as rag_span:
-            channel_docs = await get_channel_messages(channel_id)
-            rag_span.update(
-                contexts=[
-                    RAGChunk(
-                        document_id=doc.metadata.get('sender_id', 'unknown'),
-                        content=doc.page_content
-                    )
-                    for doc in channel_docs
-                ]
-            )
+        # Get up to 100 of the channel's messages from the last day
+        with tracer.span('retrieval') as rag_span:
+            channel_docs = await get_channel_messages(channel_id, workspace_id, window=COMMAND_WINDOW)
+            rag_span.set_attribute('documents', len(channel_docs))
         
         # Format messages chronologically
         messages_text = "\n".join([
@@ -230,24 +227,9 @@ async def handle_summarize_command(channel_id: str, user_id: str, workspace_id:
             for doc in channel_docs
         ])
         
-        # Create summarization prompt
-        summary_prompt = PromptTemplate(
-            template="""Please provide a concise summary of the following conversation, highlighting key points and decisions:
-
-{messages}
-
-Summary:""",
-            input_variables=["messages"]
-        )
-        
-        with langwatch.get_current_span().span(type="llm") as llm_span:
+        with tracer.span('llm', model=llm.model_name):
             summary_response = await llm.ainvoke(
-                summary_prompt.format(messages=messages_text)
-            )
-            llm_span.update(
-                model="gpt-4o-mini",
-                input=messages_text,
-                output=summary_response.content
+                SUMMARIZE_PROMPT.render(messages=messages_text)
             )
         
         return summary_response.content
@@ -255,22 +237,14 @@ Summary:""",
         logger.error(f"Error in summarize command: {str(e)}")
         return "Sorry, I encountered an error while trying to summarize the conversation."
 
-@langwatch.span(type="chain")
+@tracer.traced()
 async def handle_analyze_command(channel_id: str, user_id: str, workspace_id: str) -> str:
     """Handle /analyze command"""
     try:
-        # Get last 100 messages from the channel
-        with langwatch.get_current_span().span(type="rag") as rag_span:
-            channel_docs = await get_channel_messages(channel_id)
-            rag_span.update(
-                contexts=[
-                    RAGChunk(
-                        document_id=doc.metadata.get('sender_id', 'unknown'),
-                        content=doc.page_content
-                    )
-                    for doc in channel_docs
-                ]
-            )
+        # Get up to 100 of the channel's messages from the last day
+        with tracer.span('retrieval') as rag_span:
+            channel_docs = await get_channel_messages(channel_id, workspace_id, window=COMMAND_WINDOW)
+            rag_span.set_attribute('documents', len(channel_docs))
         
         # Format messages chronologically
         messages_text = "\n".join([
@@ -278,30 +252,9 @@ async def handle_analyze_command(channel_id: str, user_id: str, workspace_id: st
             for doc in channel_docs
         ])
         
-        # Create analysis prompt
-        analysis_prompt = PromptTemplate(
-            template="""Please analyze this conversation and provide insights on:
-1. Main topics discussed
-2. Key participants and their viewpoints
-3. Areas of agreement and disagreement
-4. Overall tone and engagement level
-5. Any notable patterns or trends
-
-Conversation:
-{messages}
-
-Analysis:""",
-            input_variables=["messages"]
-        )
-        
-        with langwatch.get_current_span().span(type="llm") as llm_span:
+        with tracer.span('llm', model=llm.model_name):
             analysis_response = await llm.ainvoke(
-                analysis_prompt.format(messages=messages_text)
-            )
-            llm_span.update(
-                model="gpt-4o-mini",
-                input=messages_text,
-                output=analysis_response.content
+                ANALYZE_PROMPT.render(messages=messages_text)
             )
         
         # Convert markdown style formatting to HTML tags
@@ -312,72 +265,36 @@ Analysis:""",
         logger.error(f"Error in analyze command: {str(e)}")
         return "<strong><i>Sorry, I encountered an error while trying to analyze the conversation.</i></strong>"
 
-@langwatch.span(type="chain")
-async def get_gpt4_response(prompt, channel_id, sender_id):
+@tracer.traced()
+async def get_gpt4_response(prompt, channel_id, workspace_id, sender_id):
     try:
-        start_time = time.time()
-
         # Get relevant context only from current channel
-        with langwatch.get_current_span().span(type="rag") as rag_span:
+        with tracer.span('retrieval') as rag_span:
             channel_context = retriever.get_relevant_documents(
                 prompt,
                 k=5,
                 filter={
-                    "channel_id": channel_id
+                    "channel_id": channel_id,
+                    "workspace_id": workspace_id
                 }
             )
             
-            rag_span.update(
-                contexts=[
-                    RAGChunk(
-                        document_id=doc.metadata.get('sender_id', 'unknown'),
-                        content=doc.page_content
-                    )
-                    for doc in channel_context
-                ]
-            )
-
-        logger.info(f"Context retrieval took {time.time() - start_time:.2f}s")
-
-        # Create prompt template focusing on recent, relevant context with cynical Reddit-style tone
-        template = PromptTemplate(
-            template="""You are a cynical Reddit commenter. Your responses should be witty, sarcastic, and slightly condescending, while still being informative. You enjoy pointing out logical fallacies and making pop culture references. You start many sentences with "Actually..." and "Well, technically...". You occasionally use Reddit-style formatting like /s for sarcasm and FTFY (Fixed That For You).
-
-Recent Thread Context:
-{channel_context}
-
-Respond to this comment in classic Reddit style: {query}
-
-Remember to:
-- Be cynical but not outright mean
-- Include at least one snarky observation
-- Reference a meme or pop culture if relevant
-- Use typical Reddit phrases like "Source?" or "Username checks out"
-- Point out any obvious logical fallacies
-- Add /s if being particularly sarcastic""",
-            input_variables=["query", "channel_context"]
-        )
+            rag_span.set_attribute('documents', len(channel_context))
 
-        prompt_with_context = template.format(
-            query=prompt,
-            channel_context="\n".join([f"{doc.metadata.get('sender_name', 'Unknown User')}: {doc.page_content}" 
-                                     for doc in channel_context[-5:]])  # Only use last 5 messages
-        )
+        with tracer.span('prompt_build'):
+            prompt_with_context = REDDIT_PROMPT.render(
+                query=prompt,
+                channel_context="\n".join([f"{doc.metadata.get('sender_name', 'Unknown User')}: {doc.page_content}" 
+                                         for doc in channel_context[-5:]])  # Only use last 5 messages
+            )
 
         # Get response with higher temperature for more creative/snarky responses
-        with langwatch.get_current_span().span(type="llm") as llm_span:
-            llm_start = time.time()
+        with tracer.span('llm', model=llm.model_name):
             response = await llm.ainvoke(
                 prompt_with_context, 
                 temperature=0.8  # Increased temperature for more personality
             )
-            logger.info(f"LLM response took {time.time() - llm_start:.2f}s")
             
-            llm_span.update(
-                model="gpt-4o-mini",
-                input=prompt_with_context,
-                output=response.content
-            )
 
         return response.content
 
@@ -386,32 +303,25 @@ Remember to:
         logger.exception(e)
         raise
 
-@langwatch.span(type="chain")
-async def get_persona_response(prompt: str, persona_context: dict, channel_id: str) -> str:
+@tracer.traced()
+async def get_persona_response(prompt: str, persona_context: dict, channel_id: str, workspace_id: str) -> str:
     """Generate a response from a specific persona"""
     try:
         # Get relevant channel context - combine persona history and relevant messages in one search
-        with langwatch.get_current_span().span(type="rag") as rag_span:
+        with tracer.span('retrieval') as rag_span:
             combined_context = retriever.get_relevant_documents(
                 prompt,
                 k=5,
                 filter={
                     "channel_id": channel_id,
+                    "workspace_id": workspace_id,
                     "$or": [
                         {"sender_id": persona_context['persona']['$id']}  # Persona's own messages
                     ]
                 }
             )
             
-            rag_span.update(
-                contexts=[
-                    RAGChunk(
-                        document_id=doc.metadata.get('sender_id', 'unknown'),
-                        content=doc.page_content
-                    )
-                    for doc in combined_context
-                ]
-            )
+            rag_span.set_attribute('documents', len(combined_context))
         
         # Separate persona's own messages from other context
         own_messages = []
@@ -422,53 +332,23 @@ async def get_persona_response(prompt: str, persona_context: dict, channel_id: s
             else:
                 other_messages.append(doc)
         
-        # Create prompt template for persona response
-        template = PromptTemplate(
-            template="""You are {name}, {role}. Your personality is: {personality}
-Your conversation style is: {conversation_style}
-Your knowledge areas are: {knowledge_base}
-Your opinions are: {opinions}
-You disagree with: {disagreements}
-
-Recent conversation context:
-{channel_context}
-
-Your own recent messages:
-{own_messages}
-
-Please respond to the following message in your unique voice and style briefly, maintaining your personality and viewpoints:
-{prompt}""",
-            input_variables=["name", "role", "personality", "conversation_style", "knowledge_base", 
-                           "opinions", "disagreements", "channel_context", "own_messages", "prompt"]
-        )
-
-        # Format the prompt with persona information
-        prompt_with_context = template.format(
-            name=persona_context['persona']['name'],
-            role=persona_context['persona']['role'],
-            personality=persona_context['persona']['personality'],
-            conversation_style=persona_context['persona']['conversation_style'],
-            knowledge_base=", ".join(persona_context['persona']['knowledge_base']),
-            opinions=", ".join(persona_context['persona'].get('opinions', [])),
-            disagreements=", ".join(persona_context['persona'].get('disagreements', [])),
-            channel_context="\n".join([f"{doc.metadata.get('sender_name', 'Unknown User')}: {doc.page_content}" 
-                                     for doc in other_messages[-3:]]),  # Only use last 3 messages for context
-            own_messages="\n".join([f"You: {doc.page_content}" 
-                                  for doc in own_messages[-2:]]),  # Only use last 2 own messages
-            prompt=prompt
-        )
+        # The persona's profile is rendered once per persona version; only the context is formatted here
+        persona = persona_context['persona']
+        with tracer.span('prompt_build'):
+            prompt_with_context = PERSONA_PROMPT.render(
+                persona_key(persona),
+                lambda: persona_fields(persona),
+                channel_context="\n".join([f"{doc.metadata.get('sender_name', 'Unknown User')}: {doc.page_content}"
+                                         for doc in other_messages[-3:]]),  # Only use last 3 messages for context
+                own_messages="\n".join([f"You: {doc.page_content}"
+                                      for doc in own_messages[-2:]]),  # Only use last 2 own messages
+                prompt=prompt
+            )
 
         # Get response
-        with langwatch.get_current_span().span(type="llm") as llm_span:
-            llm_start = time.time()
+        with tracer.span('llm', model=llm.model_name):
             response = await llm.ainvoke(prompt_with_context)
-            logger.info(f"LLM response took {time.time() - llm_start:.2f}s")
             
-            llm_span.update(
-                model="gpt-4o-mini",
-                input=prompt_with_context,
-                output=response.content
-            )
 
         return response.content
 
@@ -496,22 +376,20 @@ async def handle_message(request):
         data = await request.json()
         logger.info(f"Received message data: {data}")
         
-        # Start tracking request with LangWatch
-        with langwatch.trace() as trace:
-            trace.update(
-                metadata={
-                    "user_id": data.get('sender_id'),
-                    "channel_id": data.get('channel_id'),
-                    "workspace_id": data.get('workspace_id')
-                }
-            )
-            
+        # Start tracing the request
+        with tracer.trace(
+            'handle_message',
+            user_id=data.get('sender_id'),
+            channel_id=data.get('channel_id'),
+            workspace_id=data.get('workspace_id')
+        ):
             # Start tracking request
             request_start = time.time()
             
             # Sanitize HTML content and extract mentions
             content = data.get('content', '')
-            clean_content, mentions = sanitize_html_content(content)
+            with tracer.span('sanitize'):
+                clean_content, mentions = sanitize_html_content(content)
             
             # Handle commands
             if clean_content.startswith('/'):
@@ -520,35 +398,33 @@ async def handle_message(request):
                 
                 command_start = time.time()
                 if command == '/summarize':
-                    with trace.span(type="chain") as span:
-                        response_content = await handle_summarize_command(
-                            data['channel_id'],
-                            data['sender_id'],
-                            data['workspace_id']
-                        )
-                        span.update(output=response_content)
+                    response_content = await handle_summarize_command(
+                        data['channel_id'],
+                        data['sender_id'],
+                        data['workspace_id']
+                    )
                 elif command == '/analyze':
-                    with trace.span(type="chain") as span:
-                        response_content = await handle_analyze_command(
-                            data['channel_id'],
-                            data['sender_id'],
-                            data['workspace_id']
-                        )
-                        span.update(output=response_content)
+                    response_content = await handle_analyze_command(
+                        data['channel_id'],
+                        data['sender_id'],
+                        data['workspace_id']
+                    )
                 
                 if response_content:
-                    await send_private_message(
-                        user_id=data['sender_id'],
-                        content=response_content,
-                        workspace_id=data['workspace_id'],
-                        channel_id=data['channel_id']
-                    )
-                    performance_metrics.add_operation_time('command_processing', time.time() - command_start)
+                    with tracer.span('appwrite.write'):
+                        await send_private_message(
+                            user_id=data['sender_id'],
+                            content=response_content,
+                            workspace_id=data['workspace_id'],
+                            channel_id=data['channel_id']
+                        )
+                    performance_metrics.add_operation_time('command_processing', time.time() - command_start,
+                                                           command=command, workspace_id=data['workspace_id'])
                     return web.Response(text='Command processed successfully', status=200)
             
             # Skip embedding if the message is from the bot
             if data.get('sender_id') != 'bot':
-                with trace.span(type="component") as span:
+                with tracer.span('vector_upsert'):
                     vector_start = time.time()
                     message_document = Document(
                         page_content=clean_content,
@@ -557,14 +433,14 @@ async def handle_message(request):
                             'workspace_id': data['workspace_id'],
                             'sender_id': data['sender_id'],
                             'sender_name': data['sender_name'],
-                            'timestamp': datetime.now().isoformat()
+                            **timestamp_metadata()
                         }
                     )
                     
                     # Add document with its embedding to Pinecone
                     document_vectorstore.add_documents([message_document])
-                    span.update(input=clean_content)
-                    performance_metrics.add_operation_time('vector_store', time.time() - vector_start)
+                    performance_metrics.add_operation_time('vector_store', time.time() - vector_start,
+                                                           workspace_id=data['workspace_id'])
             
             # Process mentions
             for mention in mentions:
@@ -578,36 +454,38 @@ async def handle_message(request):
                         if other_mention['id'] != 'bot':
                             context = await get_persona_context(
                                 other_mention['id'],
-                                data['channel_id']
+                                data['channel_id'],
+                                data['workspace_id']
                             )
                             if context:
                                 mention_contexts.append(context)
                     
                     # Get GPT-4 response with enhanced context
-                    with trace.span(type="llm", input=clean_content) as span:
-                        response_content = await get_gpt4_response(
-                            clean_content,
-                            data['channel_id'],
-                            data['sender_id']
-                        )
-                        span.update(output=response_content, model="gpt-4o-mini")
+                    response_content = await get_gpt4_response(
+                        clean_content,
+                        data['channel_id'],
+                        data['workspace_id'],
+                        data['sender_id']
+                    )
                 else:
                     # Handle direct persona mention
                     persona_context = await get_persona_context(
                         mention['id'],
-                        data['channel_id']
+                        data['channel_id'],
+                        data['workspace_id']
                     )
                     if persona_context:
                         mention_contexts = [persona_context]
-                        with trace.span(type="llm", input=clean_content) as span:
-                            response_content = await get_persona_response(
-                                clean_content,
-                                persona_context,
-                                data['channel_id']
-                            )
-                            span.update(output=response_content, model="gpt-4o-mini")
+                        response_content = await get_persona_response(
+                            clean_content,
+                            persona_context,
+                            data['channel_id'],
+                            data['workspace_id']
+                        )
                 
-                performance_metrics.add_operation_time('llm_processing', time.time() - llm_start)
+                performance_metrics.add_operation_time('llm_processing', time.time() - llm_start,
+                                                       workspace_id=data['workspace_id'],
+                                                       persona_id=mention['id'], model=llm.model_name)
                 
                 if response_content:
                     db_start = time.time()
@@ -619,10 +497,11 @@ async def handle_message(request):
                             'workspace_id': data['workspace_id'],
                             'sender_id': mention['id'],
                             'sender_name': mention['name'],
-                            'timestamp': datetime.now().isoformat()
+                            **timestamp_metadata()
                         }
                     )
-                    document_vectorstore.add_documents([bot_message_document])
+                    with tracer.span('vector_upsert'):
+                        document_vectorstore.add_documents([bot_message_document])
                     
                     # Convert context to JSON serializable format
                     json_contexts = convert_context_to_json(mention_contexts)
@@ -643,23 +522,25 @@ async def handle_message(request):
                     }
                     
                     # Store response in database
-                    response = database.create_document(
-                        database_id='main',
-                        collection_id='messages',
-                        document_id=ID.unique(),
-                        data=message,
-                        permissions=[
-                            Permission.read(Role.label(data['channel_id'])),
-                            Permission.write(Role.user(mention['id'])),
-                            Permission.delete(Role.user(mention['id']))
-                        ]
-                    )
-                    performance_metrics.add_operation_time('db_operations', time.time() - db_start)
+                    with tracer.span('appwrite.write'):
+                        response = database.create_document(
+                            database_id='main',
+                            collection_id='messages',
+                            document_id=ID.unique(),
+                            data=message,
+                            permissions=[
+                                Permission.read(Role.label(data['channel_id'])),
+                                Permission.write(Role.user(mention['id'])),
+                                Permission.delete(Role.user(mention['id']))
+                            ]
+                        )
+                    performance_metrics.add_operation_time('db_operations', time.time() - db_start,
+                                                           workspace_id=data['workspace_id'])
             
             # Track total request time
             total_time = time.time() - request_start
-            performance_metrics.add_request_time(total_time)
-            performance_metrics.add_operation_time('total_processing', total_time)
+            performance_metrics.add_request_time(total_time, workspace_id=data['workspace_id'])
+            performance_metrics.add_operation_time('total_processing', total_time, workspace_id=data['workspace_id'])
             
             return web.Response(text='Message processed successfully', status=200)
     
@@ -672,7 +553,7 @@ async def handle_message(request):
         return web.Response(text=str(e), status=500)
 
 async def main():
-    app = web.Application()
+    app = web.Application(middlewares=[metrics_middleware_factory()])
     app.router.add_post('/', handle_message)
 
     runner = web.AppRunner(app)
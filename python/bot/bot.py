@@ -10,12 +10,7 @@ from datetime import datetime, timedelta
 import asyncio
 import logging
 import time
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
-from langchain.prompts import PromptTemplate
 from langchain.schema import Document
-import re
-from bs4 import BeautifulSoup
 import sys
 from pathlib import Path
 from dotenv import load_dotenv
@@ -23,7 +18,16 @@ from dotenv import load_dotenv
 # Add the parent directory to Python path
 sys.path.append(str(Path(__file__).parent.parent))
 
+from fakes.factory import make_embeddings, make_vectorstore, make_chat_model, make_retriever
 from monitoring.performance_logger import performance_metrics
+from monitoring.exposition import metrics_handler, metrics_middleware_factory
+from monitoring.tracing import tracer_from_env, current_span
+from monitoring.profiling import profiler_from_env
+from monitoring.recording import recorder_from_env, recording_middleware_factory
+from retrieval.timestamps import timestamp_metadata, with_time_window, message_time
+from retrieval.rerank import fetch_candidates, rerank, OVERFETCH
+from messages.sanitize import sanitize_html_content
+from prompts.compiler import CompiledPrompt, PERSONA_SYSTEM, persona_fields, persona_key
 
 # Load environment variables
 load_dotenv()
@@ -55,55 +59,85 @@ client.set_key(os.getenv('APPWRITE_API_KEY'))
 database = Databases(client)
 
 # Initialize LangChain components
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
-document_vectorstore = PineconeVectorStore(
+embeddings = make_embeddings(model="text-embedding-3-large")
+document_vectorstore = make_vectorstore(
     index_name='messages',
     embedding=embeddings
 )
-retriever = document_vectorstore.as_retriever()
+retriever = make_retriever(document_vectorstore)
 
 
-llm = ChatOpenAI(temperature=0.7, model_name="gpt-4o-mini")
+llm = make_chat_model(temperature=0.7, model_name="gpt-4o-mini")
+
+tracer = tracer_from_env('bot')
+request_profiler = profiler_from_env()
+webhook_recorder = recorder_from_env()
+
+# /summarize and /analyze read the channel's last day, falling back to all of it when that is empty
+COMMAND_WINDOW = timedelta(days=1)
+
+# Static instructions and persona profiles go first so the provider caches them as a shared prefix
+SUMMARIZE_PROMPT = CompiledPrompt(
+    "Please provide a concise summary of the following conversation, highlighting key points and decisions:",
+    "{messages}\n\nSummary:"
+)
+ANALYZE_PROMPT = CompiledPrompt(
+    """Please analyze this conversation and provide insights on:
+1. Main topics discussed
+2. Key participants and their viewpoints
+3. Areas of agreement and disagreement
+4. Overall tone and engagement level
+5. Any notable patterns or trends""",
+    """Conversation:
+{messages}
+
+Analysis:"""
+)
+PERSONA_PROMPT = CompiledPrompt(
+    PERSONA_SYSTEM,
+    """Recent conversation context:
+{channel_context}
+
+Your own recent messages:
+{own_messages}
+
+You are responding to {sender_name} ({sender_id}).
+Please respond to their following message in your unique voice and style briefly, maintaining your personality and viewpoints:
+{prompt}"""
+)
+ASSISTANT_PROMPT = CompiledPrompt(
+    """You are Chattie Bot, a helpful AI assistant.
+
+When responding:
+- Directly address the user you are responding to
+- Reference relevant points from their conversation history
+- Provide clear, helpful information
+- Stay focused on their specific question
+- Be friendly and professional
+- If the context shows previous interactions with the user, maintain continuity""",
+    """You are responding to {sender_name} (ID: {sender_id}).
+
+Recent Thread Context:
+{channel_context}
+
+{sender_name}'s Current Query: {query}"""
+)
 
 async def get_persona(persona_id: str) -> dict:
     """Get persona information from Appwrite database"""
     try:
-        persona = database.get_document(
-            database_id='main',
-            collection_id='ai_personas',
-            document_id=persona_id
-        )
+        with tracer.span('appwrite.get_persona', persona_id=persona_id):
+            persona = database.get_document(
+                database_id='main',
+                collection_id='ai_personas',
+                document_id=persona_id
+            )
         return persona
     except Exception as e:
         logger.error(f"Error getting persona {persona_id}: {str(e)}")
         return None
 
-def sanitize_html_content(content: str) -> tuple[str, list[dict]]:
-    """
-    Sanitize HTML content and extract mentions.
-    Returns (sanitized_text, mentions)
-    """
-    soup = BeautifulSoup(content, 'html.parser')
-    mentions = []
-    
-    # Extract mentions
-    for mention in soup.find_all('span', {'data-mention': 'true'}):
-        mentions.append({
-            'id': mention['data-mention-id'],
-            'name': mention['data-mention-name']
-        })
-        # Replace mention with a text marker
-        mention.replace_with(f"@{mention['data-mention-name']}")
-    
-    # Get plain text
-    text = soup.get_text()
-    
-    # Clean up extra whitespace
-    text = re.sub(r'\s+', ' ', text).strip()
-    
-    return text, mentions
-
-async def get_persona_context(mention_id: str, channel_id: str) -> dict:
+async def get_persona_context(mention_id: str, channel_id: str, workspace_id: str) -> dict:
     """Get persona information and relevant context for a mentioned persona"""
     try:
         # Get persona from database using the new function
@@ -113,15 +147,18 @@ async def get_persona_context(mention_id: str, channel_id: str) -> dict:
             return None
         
         # Get recent messages from this persona in the channel
-        relevant_messages = document_vectorstore.similarity_search(
-            query="",
-            k=5,
-            filter={
-                "channel_id": channel_id,
-                "sender_id": mention_id,
-                "sender_name": persona["name"] # Ensure messages match persona name
-            }
-        )
+        with tracer.span('retrieval.persona_history', persona_id=mention_id) as span:
+            relevant_messages = document_vectorstore.similarity_search(
+                query="",
+                k=5,
+                filter={
+                    "channel_id": channel_id,
+                    "workspace_id": workspace_id,  # Selects the workspace's namespace
+                    "sender_id": mention_id,
+                    "sender_name": persona["name"] # Ensure messages match persona name
+                }
+            )
+            span.set_attribute('documents', len(relevant_messages))
         
         # Validate that retrieved messages match the persona
         validated_messages = []
@@ -143,8 +180,8 @@ async def get_persona_context(mention_id: str, channel_id: str) -> dict:
 async def handle_summarize_command(channel_id: str, user_id: str, workspace_id: str) -> str:
     """Handle /summarize command"""
     try:
-        # Get last 100 messages from the channel
-        channel_docs = await get_channel_messages(channel_id)
+        # Get up to 100 of the channel's messages from the last day
+        channel_docs = await get_channel_messages(channel_id, workspace_id, window=COMMAND_WINDOW)
         
         # Format messages chronologically
         messages_text = "\n".join([
@@ -152,19 +189,11 @@ async def handle_summarize_command(channel_id: str, user_id: str, workspace_id:
             for doc in channel_docs
         ])
         
-        # Create summarization prompt
-        summary_prompt = PromptTemplate(
-            template="""Please provide a concise summary of the following conversation, highlighting key points and decisions:
-
-{messages}
-
-Summary:""",
-            input_variables=["messages"]
-        )
-        
-        summary_response = await llm.ainvoke(
-            summary_prompt.format(messages=messages_text)
-        )
+        with tracer.span('llm', model=llm.model_name), \
+                performance_metrics.registry.track_in_flight('llm_calls_in_flight', model=llm.model_name):
+            summary_response = await llm.ainvoke(
+                SUMMARIZE_PROMPT.render(messages=messages_text)
+            )
         
         return summary_response.content
     except Exception as e:
@@ -174,8 +203,8 @@ Summary:""",
 async def handle_analyze_command(channel_id: str, user_id: str, workspace_id: str) -> str:
     """Handle /analyze command"""
     try:
-        # Get last 100 messages from the channel
-        channel_docs = await get_channel_messages(channel_id)
+        # Get up to 100 of the channel's messages from the last day
+        channel_docs = await get_channel_messages(channel_id, workspace_id, window=COMMAND_WINDOW)
         
         # Format messages chronologically
         messages_text = "\n".join([
@@ -183,27 +212,11 @@ async def handle_analyze_command(channel_id: str, user_id: str, workspace_id: st
             for doc in channel_docs
         ])
         
-        # Create analysis prompt
-        analysis_prompt = PromptTemplate(
-            template="""Please analyze this conversation and provide insights on:
-1. Main topics discussed
-2. Key participants and their viewpoints
-3. Areas of agreement and disagreement
-4. Overall tone and engagement level
-5. Any notable patterns or trends
-
-
-
-Conversation:
-{messages}
-
-Analysis:""",
-            input_variables=["messages"]
-        )
-        
-        analysis_response = await llm.ainvoke(
-            analysis_prompt.format(messages=messages_text)
-        )
+        with tracer.span('llm', model=llm.model_name), \
+                performance_metrics.registry.track_in_flight('llm_calls_in_flight', model=llm.model_name):
+            analysis_response = await llm.ainvoke(
+                ANALYZE_PROMPT.render(messages=messages_text)
+            )
         # Convert markdown style formatting to HTML tags
         content = analysis_response.content
         
@@ -212,78 +225,48 @@ Analysis:""",
         logger.error(f"Error in analyze command: {str(e)}")
         return "<strong><i>Sorry, I encountered an error while trying to analyze the conversation.</i></strong>"
 
-async def get_persona_response(prompt: str, persona_context: dict, channel_id: str, sender_name: str, sender_id: str) -> str:
+async def get_persona_response(prompt: str, persona_context: dict, channel_id: str, sender_name: str, sender_id: str,
+                               workspace_id: str, thread_id: str = None) -> str:
     """Generate a response from a specific persona"""
     try:
-        # Get relevant channel context - combine persona history and relevant messages in one search
-        context_start = time.time()
-        combined_context = retriever.get_relevant_documents(
-            prompt,
-            k=5,
-            filter={
-                "channel_id": channel_id,
-                "$or": [
-                    {"sender_id": persona_context['persona']['$id']}  # Persona's own messages
-                  # Recent messages
-                ]
-            }
-        )
-        
-        logger.info(f"Context retrieval took {time.time() - context_start:.2f}s")
-        
-        # Separate persona's own messages from other context
-        own_messages = []
-        other_messages = []
-        for doc in combined_context:
-            if doc.metadata['sender_id'] == persona_context['persona']['$id']:
-                own_messages.append(doc)
-            else:
-                other_messages.append(doc)
+        persona_id = persona_context['persona']['$id']
+        # Over-fetch the persona's own messages and everyone else's in the channel, then re-rank each
+        with tracer.span('retrieval.context') as span:
+            own_candidates, other_candidates = await asyncio.gather(
+                fetch_candidates(retriever, prompt, 2 * OVERFETCH,
+                                 {"channel_id": channel_id, "workspace_id": workspace_id, "sender_id": persona_id}),
+                fetch_candidates(retriever, prompt, 3 * OVERFETCH,
+                                 {"channel_id": channel_id, "workspace_id": workspace_id,
+                                  "sender_id": {"$ne": persona_id}})
+            )
+            span.set_attribute('documents', len(own_candidates) + len(other_candidates))
+
+        with tracer.span('rerank'):
+            # Sender diversity only applies to the other senders' pool; the persona's own pool has one sender
+            own_messages = sorted(rerank(own_candidates, 2, thread_id=thread_id, diversity_penalty=0.0),
+                                  key=lambda doc: message_time(doc.metadata))
+            other_messages = sorted(rerank(other_candidates, 3, thread_id=thread_id),
+                                    key=lambda doc: message_time(doc.metadata))
         
-        # Create prompt template for persona response
-        template = PromptTemplate(
-            template="""You are {name}, {role}. Your personality is: {personality}
-Your conversation style is: {conversation_style}
-Your knowledge areas are: {knowledge_base}
-Your opinions are: {opinions}
-You disagree with: {disagreements}
-
-Recent conversation context:
-{channel_context}
-
-Your own recent messages:
-{own_messages}
-
-You are responding to {sender_name} ({sender_id}).
-Please respond to their following message in your unique voice and style briefly, maintaining your personality and viewpoints:
-{prompt}""",
-            input_variables=["name", "role", "personality", "conversation_style", "knowledge_base", 
-                           "opinions", "disagreements", "channel_context", "own_messages", 
-                           "sender_name", "sender_id", "prompt"]
-        )
-
-        # Format the prompt with persona information
-        prompt_with_context = template.format(
-            name=persona_context['persona']['name'],
-            role=persona_context['persona']['role'],
-            personality=persona_context['persona']['personality'],
-            conversation_style=persona_context['persona']['conversation_style'],
-            knowledge_base=", ".join(persona_context['persona']['knowledge_base']),
-            opinions=", ".join(persona_context['persona'].get('opinions', [])),
-            disagreements=", ".join(persona_context['persona'].get('disagreements', [])),
-            channel_context="\n".join([f"{doc.metadata.get('sender_name', 'Unknown User')}: {doc.page_content}" 
-                                     for doc in other_messages[-3:]]),  # Only use last 3 messages for context
-            own_messages="\n".join([f"You: {doc.page_content}" 
-                                  for doc in own_messages[-2:]]),  # Only use last 2 own messages
-            sender_name=sender_name,
-            sender_id=sender_id,
-            prompt=prompt
-        )
+        # The persona's profile is rendered once per persona version; only the context is formatted here
+        persona = persona_context['persona']
+        with tracer.span('prompt_build'):
+            prompt_with_context = PERSONA_PROMPT.render(
+                persona_key(persona),
+                lambda: persona_fields(persona),
+                channel_context="\n".join([f"{doc.metadata.get('sender_name', 'Unknown User')}: {doc.page_content}"
+                                         for doc in other_messages]),
+                own_messages="\n".join([f"You: {doc.page_content}"
+                                      for doc in own_messages]),
+                sender_name=sender_name,
+                sender_id=sender_id,
+                prompt=prompt
+            )
 
         # Get response
-        llm_start = time.time()
-        response = await llm.ainvoke(prompt_with_context)
-        logger.info(f"LLM response took {time.time() - llm_start:.2f}s")
+        with tracer.span('llm', model=llm.model_name), \
+                performance_metrics.registry.track_in_flight('llm_calls_in_flight', model=llm.model_name):
+            response = await llm.ainvoke(prompt_with_context)
 
         return response.content
 
@@ -307,16 +290,26 @@ def convert_context_to_json(context_list):
     return json_contexts
 
 async def handle_message(request):
+    with tracer.trace('handle_message') as span, request_profiler.maybe_profile(request) as profile_path:
+        if profile_path:
+            span.set_attribute('profile', profile_path)
+        return await process_message(request)
+
+async def process_message(request):
     try:
         data = await request.json()
         logger.info(f"Received message data: {data}")
         
         # Start tracking request
         request_start = time.time()
+        span = current_span()
+        span.set_attribute('workspace_id', data.get('workspace_id'))
+        span.set_attribute('channel_id', data.get('channel_id'))
         
         # Sanitize HTML content and extract mentions
         content = data.get('content', '')
-        clean_content, mentions = sanitize_html_content(content)
+        with tracer.span('sanitize'):
+            clean_content, mentions = sanitize_html_content(content)
         
         # Handle commands
         if clean_content.startswith('/'):
@@ -338,13 +331,15 @@ async def handle_message(request):
                 )
             
             if response_content:
-                await send_private_message(
-                    user_id=data['sender_id'],
-                    content=response_content,
-                    workspace_id=data['workspace_id'],
-                    channel_id=data['channel_id']
-                )
-                performance_metrics.add_operation_time('command_processing', time.time() - command_start)
+                with tracer.span('appwrite.write'):
+                    await send_private_message(
+                        user_id=data['sender_id'],
+                        content=response_content,
+                        workspace_id=data['workspace_id'],
+                        channel_id=data['channel_id']
+                    )
+                performance_metrics.add_operation_time('command_processing', time.time() - command_start,
+                                                       command=command, workspace_id=data['workspace_id'])
                 return web.Response(text='Command processed successfully', status=200)
         
         # Skip embedding if the message is from the bot
@@ -357,13 +352,17 @@ async def handle_message(request):
                     'workspace_id': data['workspace_id'],
                     'sender_id': data['sender_id'],
                     'sender_name': data['sender_name'],
-                    'timestamp': datetime.now().isoformat()
+                    **timestamp_metadata(),
+                    # Pinecone rejects null metadata, so thread_id is only set on thread replies
+                    **({'thread_id': data['thread_id']} if data.get('thread_id') else {})
                 }
             )
             
             # Add document with its embedding to Pinecone
-            document_vectorstore.add_documents([message_document])
-            performance_metrics.add_operation_time('vector_store', time.time() - vector_start)
+            with tracer.span('vector_upsert'):
+                document_vectorstore.add_documents([message_document])
+            performance_metrics.add_operation_time('vector_store', time.time() - vector_start,
+                                                   workspace_id=data['workspace_id'])
         
         # Process mentions
         for mention in mentions:
@@ -377,7 +376,8 @@ async def handle_message(request):
                     if other_mention['id'] != 'bot':
                         context = await get_persona_context(
                             other_mention['id'],
-                            data['channel_id']
+                            data['channel_id'],
+                            data['workspace_id']
                         )
                         if context:
                             mention_contexts.append(context)
@@ -387,13 +387,16 @@ async def handle_message(request):
                     clean_content,
                     data['workspace_id'],
                     data['sender_name'],
-                    data['sender_id']
+                    data['sender_id'],
+                    channel_id=data['channel_id'],
+                    thread_id=data.get('thread_id')
                 )
             else:
                 # Handle direct persona mention
                 persona_context = await get_persona_context(
                     mention['id'],
-                    data['channel_id']
+                    data['channel_id'],
+                    data['workspace_id']
                 )
                 if persona_context:
                     mention_contexts = [persona_context]
@@ -402,10 +405,14 @@ async def handle_message(request):
                         persona_context,
                         data['channel_id'],
                         data['sender_name'],
-                        data['sender_id']
+                        data['sender_id'],
+                        data['workspace_id'],
+                        thread_id=data.get('thread_id')
                     )
             
-            performance_metrics.add_operation_time('llm_processing', time.time() - llm_start)
+            performance_metrics.add_operation_time('llm_processing', time.time() - llm_start,
+                                                   workspace_id=data['workspace_id'],
+                                                   persona_id=mention['id'], model=llm.model_name)
             
             if response_content:
                 db_start = time.time()
@@ -417,10 +424,12 @@ async def handle_message(request):
                         'workspace_id': data['workspace_id'],
                         'sender_id': mention['id'],
                         'sender_name': mention['name'],
-                        'timestamp': datetime.now().isoformat()
+                        **timestamp_metadata(),
+                        **({'thread_id': data['thread_id']} if data.get('thread_id') else {})
                     }
                 )
-                document_vectorstore.add_documents([bot_message_document])
+                with tracer.span('vector_upsert'):
+                    document_vectorstore.add_documents([bot_message_document])
                 
                 # Convert context to JSON serializable format
                 json_contexts = convert_context_to_json(mention_contexts)
@@ -441,23 +450,25 @@ async def handle_message(request):
                 }
                 
                 # Store response in database
-                response = database.create_document(
-                    database_id='main',
-                    collection_id='messages',
-                    document_id=ID.unique(),
-                    data=message,
-                    permissions=[
-                        Permission.read(Role.label(data['channel_id'])),
-                        Permission.write(Role.user(mention['id'])),
-                        Permission.delete(Role.user(mention['id']))
-                    ]
-                )
-                performance_metrics.add_operation_time('db_operations', time.time() - db_start)
+                with tracer.span('appwrite.write'):
+                    response = database.create_document(
+                        database_id='main',
+                        collection_id='messages',
+                        document_id=ID.unique(),
+                        data=message,
+                        permissions=[
+                            Permission.read(Role.label(data['channel_id'])),
+                            Permission.write(Role.user(mention['id'])),
+                            Permission.delete(Role.user(mention['id']))
+                        ]
+                    )
+                performance_metrics.add_operation_time('db_operations', time.time() - db_start,
+                                                       workspace_id=data['workspace_id'])
         
         # Track total request time
         total_time = time.time() - request_start
-        performance_metrics.add_request_time(total_time)
-        performance_metrics.add_operation_time('total_processing', total_time)
+        performance_metrics.add_request_time(total_time, workspace_id=data['workspace_id'])
+        performance_metrics.add_operation_time('total_processing', total_time, workspace_id=data['workspace_id'])
         
         return web.Response(text='Message processed successfully', status=200)
     
@@ -470,21 +481,24 @@ async def handle_message(request):
         return web.Response(text=str(e), status=500)
 
 
-async def get_channel_messages(channel_id, limit=100):
+async def get_channel_messages(channel_id, workspace_id, limit=100, window=None):
     try:
-        # Get all messages from the channel, sorted by timestamp
-        docs = document_vectorstore.similarity_search(
-            query="",  # Empty query to bypass similarity search
-            k=limit,
-            filter={
-                "channel_id": channel_id,
-                # Optionally add time filter, e.g., last 24 hours
-                # "timestamp": {"$gte": (datetime.now() - timedelta(days=1)).isoformat()}
-            },
-        )
+        # Get the channel's messages from the last `window` (None for all), sorted by timestamp
+        channel_filter = {"channel_id": channel_id, "workspace_id": workspace_id}
+        with tracer.span('retrieval.channel_messages', limit=limit) as span:
+            docs = document_vectorstore.similarity_search(
+                query="",  # Empty query to bypass similarity search
+                k=limit,
+                filter=with_time_window(channel_filter, last=window),
+            )
+            if window is not None and not docs:
+                # Vectors without a numeric ts (not yet backfilled) never match a window
+                logger.info(f"No messages in channel {channel_id} within {window}, retrieving without a window")
+                docs = document_vectorstore.similarity_search(query="", k=limit, filter=channel_filter)
+            span.set_attribute('documents', len(docs))
 
         # Sort by timestamp
-        docs.sort(key=lambda x: x.metadata['timestamp'])
+        docs.sort(key=lambda x: message_time(x.metadata))
         return docs
     except Exception as e:
         logger.error(f"Error retrieving channel messages: {e}")
@@ -533,64 +547,44 @@ async def send_private_message(user_id: str, content: str, workspace_id: str, ch
         logger.error(f"Error sending private message to {user_id}: {str(e)}")
         raise
 
-async def get_gpt4_response(prompt, workspace_id, sender_name, sender_id):
+async def get_gpt4_response(prompt, workspace_id, sender_name, sender_id, channel_id=None, thread_id=None):
     try:
-        start_time = time.time()
-
         # Create a more focused query combining user context and prompt
         enhanced_query = f"Context from {sender_name} ({sender_id}): {prompt}"
         
-        # Get relevant context only from current channel and last 24 hours
-        context_start = time.time()
-        channel_context = retriever.get_relevant_documents(
-            enhanced_query,
-            k=5,  # Increased number of relevant docs
-            filter={
-                "workspace_id": workspace_id,
-                "$or": [
-                    {"sender_id": sender_id},  # Get messages from this user
-                ]
-            }
-        )
-
-        logger.info(f"Context retrieval took {time.time() - context_start:.2f}s")
-
-        # Create prompt template focusing on helpful responses with context
-        template = PromptTemplate(
-            template="""You are Chattie Bot, a helpful AI assistant. You are responding to {sender_name} (ID: {sender_id}).
-
-Recent Thread Context:
-{channel_context}
-
-{sender_name}'s Current Query: {query}
-
-When responding:
-- Directly address {sender_name}
-- Reference relevant points from their conversation history
-- Provide clear, helpful information
-- Stay focused on their specific question
-- Be friendly and professional
-- If the context shows previous interactions with {sender_name}, maintain continuity""",
-            input_variables=["query", "channel_context", "sender_name", "sender_id"]
-        )
-
-        prompt_with_context = template.format(
-            query=prompt,
-            channel_context="\n".join([
-                f"[{doc.metadata.get('timestamp', 'Unknown Time')}] {doc.metadata.get('sender_name', 'Unknown User')}: {doc.page_content}" 
-                for doc in sorted(channel_context, key=lambda x: x.metadata.get('timestamp', ''))
-            ]),
-            sender_name=sender_name,
-            sender_id=sender_id
-        )
+        # Over-fetch this user's messages in the workspace, then keep the 5 best by relevance, recency and thread
+        with tracer.span('retrieval.context') as span:
+            candidates = await fetch_candidates(
+                retriever,
+                enhanced_query,
+                5 * OVERFETCH,
+                {"workspace_id": workspace_id, "sender_id": sender_id}
+            )
+            span.set_attribute('documents', len(candidates))
+
+        with tracer.span('rerank'):
+            # The context is the sender's own history, so there are no other senders to diversify over
+            channel_context = rerank(candidates, 5, thread_id=thread_id, channel_id=channel_id,
+                                     diversity_penalty=0.0)
+
+        with tracer.span('prompt_build'):
+            prompt_with_context = ASSISTANT_PROMPT.render(
+                query=prompt,
+                channel_context="\n".join([
+                    f"[{doc.metadata.get('timestamp', 'Unknown Time')}] {doc.metadata.get('sender_name', 'Unknown User')}: {doc.page_content}" 
+                    for doc in sorted(channel_context, key=lambda x: message_time(x.metadata))
+                ]),
+                sender_name=sender_name,
+                sender_id=sender_id
+            )
 
         # Get response with higher temperature for more creative/snarky responses
-        llm_start = time.time()
-        response = await llm.ainvoke(
-            prompt_with_context, 
-            temperature=0.8  # Increased temperature for more personality
-        )
-        logger.info(f"LLM response took {time.time() - llm_start:.2f}s")
+        with tracer.span('llm', model=llm.model_name), \
+                performance_metrics.registry.track_in_flight('llm_calls_in_flight', model=llm.model_name):
+            response = await llm.ainvoke(
+                prompt_with_context, 
+                temperature=0.8  # Increased temperature for more personality
+            )
 
         return response.content
 
@@ -601,8 +595,12 @@ When responding:
 
 
 async def main():
-    app = web.Application()
+    app = web.Application(middlewares=[
+        metrics_middleware_factory(),
+        recording_middleware_factory(webhook_recorder)
+    ])
     app.router.add_post('/', handle_message)
+    app.router.add_get('/metrics', metrics_handler)
 
     runner = web.AppRunner(app)
     await runner.setup()
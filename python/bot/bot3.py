@@ -1,22 +1,23 @@
 from langchain.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
 import os
 
+from fakes.factory import make_embeddings, make_vectorstore, make_chat_model, make_retriever
+
 # Initialize LangChain components
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
-document_vectorstore = PineconeVectorStore(
+embeddings = make_embeddings(model="text-embedding-3-large")
+document_vectorstore = make_vectorstore(
     index_name=os.getenv('PINECONE_INDEX'),
     embedding=embeddings
 )
-retriever = document_vectorstore.as_retriever()
-llm = ChatOpenAI(temperature=0.7, model_name="gpt-4")
+retriever = make_retriever(document_vectorstore)
+llm = make_chat_model(temperature=0.7, model_name="gpt-4")
 
-async def get_relevant_context(query, channel_id):
-    # Get relevant context from vector store
+async def get_relevant_context(query, channel_id, workspace_id):
+    # Get relevant context from the workspace's messages in the vector store
     context_docs = retriever.get_relevant_documents(
         query,
-        k=5  # Get top 5 most relevant messages
+        k=5,  # Get top 5 most relevant messages
+        filter={"workspace_id": workspace_id}
     )
     
     # Split into channel-specific and other context
@@ -30,9 +31,9 @@ async def get_relevant_context(query, channel_id):
             other_context.append(doc)
             
     return channel_context, other_context
-async def generate_response(query, channel_id, previous_messages):
+async def generate_response(query, channel_id, previous_messages, workspace_id):
     # Get relevant context
-    channel_context, other_context = await get_relevant_context(query, channel_id)
+    channel_context, other_context = await get_relevant_context(query, channel_id, workspace_id)
     
     # Create prompt template with CatChampion_Carol's style
     template = PromptTemplate(
@@ -11,15 +11,20 @@ from datetime import datetime
 import asyncio
 import logging
 import time
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
-from langchain.prompts import PromptTemplate
 from langchain.schema import Document
 from appwrite.query import Query
 from collections import deque
 from asyncio import Queue, Lock
 from collections import defaultdict
 
+from fakes.factory import make_embeddings, make_vectorstore, make_chat_model, make_retriever
+from monitoring.performance_logger import performance_metrics
+from monitoring.exposition import metrics_handler, metrics_middleware_factory
+from monitoring.tracing import tracer_from_env
+from monitoring.recording import recorder_from_env, recording_middleware_factory
+from retrieval.timestamps import timestamp_metadata
+from prompts.compiler import CompiledPrompt, persona_fields, persona_key
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -37,18 +42,44 @@ client.set_key(os.getenv('APPWRITE_API_KEY'))
 database = Databases(client)
 
 # Initialize LangChain components
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
-document_vectorstore = PineconeVectorStore(
+embeddings = make_embeddings(model="text-embedding-3-large")
+document_vectorstore = make_vectorstore(
     index_name=os.getenv('PINECONE_INDEX'),
     embedding=embeddings
 )
-retriever = document_vectorstore.as_retriever()
-llm = ChatOpenAI(temperature=0.7, model_name="gpt-4")
+retriever = make_retriever(document_vectorstore)
+llm = make_chat_model(temperature=0.7, model_name="gpt-4")
+
+tracer = tracer_from_env('botConvo')
+webhook_recorder = recorder_from_env()
 
 # Message queue for each channel
 channel_queues = defaultdict(Queue)
 channel_locks = defaultdict(Lock)
 
+def total_queue_depth() -> int:
+    """Messages waiting across all channel queues"""
+    return sum(q.qsize() if isinstance(q, Queue) else len(q) for q in list(channel_queues.values()))
+
+performance_metrics.registry.gauge_callback('message_queue_depth', total_queue_depth)
+
+PERSONA_PROMPT = CompiledPrompt(
+    """You are {name}, {role}. Your personality is: {personality}
+
+Your conversation style is: {conversation_style}
+Your core knowledge areas are: {knowledge_base}
+Your key opinions are: {opinions}
+You disagree with: {disagreements}
+Your debate style is: {debate_style}
+
+Current channel topic: {channel_description}
+Channel purpose: {channel_purpose}
+
+Respond naturally as {name}, maintaining your personality and viewpoints. Keep responses concise and conversational.""",
+    """Previous messages in conversation:
+{previous_messages}"""
+)
+
 class PersonaManager:
     def __init__(self):
         # Load personas and channels from responses.json
@@ -63,51 +94,27 @@ class PersonaManager:
         persona = self.personas[persona_name]
         channel = self.channels[current_channel]
         
-        return PromptTemplate(
-            template="""You are {name}, {role}. Your personality is: {personality}
-
-Your conversation style is: {conversation_style}
-Your core knowledge areas are: {knowledge}
-Your key opinions are: {opinions}
-You disagree with: {disagreements}
-Your debate style is: {debate_style}
-
-Current channel topic: {channel_description}
-Channel purpose: {channel_purpose}
-
-Previous messages in conversation:
-{previous_messages}
-
-Respond naturally as {name}, maintaining your personality and viewpoints. Keep responses concise and conversational.""",
-            input_variables=["name", "role", "personality", "conversation_style", "knowledge", 
-                           "opinions", "disagreements", "debate_style", "channel_description", 
-                           "channel_purpose", "previous_messages"]
-        ).format(
-            name=persona['name'],
-            role=persona['role'],
-            personality=persona['personality'],
-            conversation_style=persona['conversation_style'],
-            knowledge=", ".join(persona['knowledge_base']),
-            opinions=", ".join(persona['opinions']),
-            disagreements=", ".join(persona['disagreements']),
-            debate_style=persona['debate_style'],
-            channel_description=channel['description'],
-            channel_purpose=channel['purpose'],
+        # Everything but the conversation is static per persona and channel, so it is rendered once and sent first
+        return PERSONA_PROMPT.render(
+            persona_key(persona, current_channel, channel.get('$updatedAt')),
+            lambda: {**persona_fields(persona), 'channel_description': channel['description'],
+                     'channel_purpose': channel['purpose']},
             previous_messages="\n".join(previous_messages)
         )
 
 async def get_recent_messages(channel_id, limit=5):
     """Get recent messages from the channel"""
     try:
-        response = database.list_documents(
-            database_id='main',
-            collection_id='messages',
-            queries=[
-                Query.equal('channel_id', channel_id),
-                Query.order_desc('$createdAt'),
-                Query.limit(limit)
-            ]
-        )
+        with tracer.span('retrieval.recent_messages', limit=limit):
+            response = database.list_documents(
+                database_id='main',
+                collection_id='messages',
+                queries=[
+                    Query.equal('channel_id', channel_id),
+                    Query.order_desc('$createdAt'),
+                    Query.limit(limit)
+                ]
+            )
         return response['documents']
     except Exception as e:
         logger.error(f"Error getting recent messages: {str(e)}")
@@ -117,14 +124,17 @@ async def get_persona_response(persona_name, channel_name, previous_messages, pe
     """Generate a response from a specific persona"""
     try:
         # Create prompt using persona manager
-        prompt = persona_manager.get_persona_prompt(
-            persona_name=persona_name,
-            previous_messages=previous_messages,
-            current_channel=channel_name
-        )
+        with tracer.span('prompt_build'):
+            prompt = persona_manager.get_persona_prompt(
+                persona_name=persona_name,
+                previous_messages=previous_messages,
+                current_channel=channel_name
+            )
         
         # Get response from LLM
-        response = await llm.ainvoke(prompt)
+        with tracer.span('llm', model=llm.model_name), \
+                performance_metrics.registry.track_in_flight('llm_calls_in_flight', model=llm.model_name):
+            response = await llm.ainvoke(prompt)
         return response.content
         
     except Exception as e:
@@ -138,54 +148,60 @@ async def process_message_queue(channel_id, persona_manager):
     while True:
         if channel_queues[channel_id]:
             message = channel_queues[channel_id].popleft()
-            
-            # Get recent context
-            recent_messages = await get_recent_messages(channel_id)
-            previous_messages = [msg['content'] for msg in recent_messages]
-            
-            # Generate response from a random persona
-            channel_name = next(name for name, id in persona_manager.channel_ids.items() 
-                              if id == channel_id)
-            channel = persona_manager.channels[channel_name]
-            
-            # Select random persona that hasn't spoken recently
-            available_personas = [p for p in channel.get('primary_personas', [])
-                                if p not in [msg.get('sender_name') for msg in recent_messages[-2:]]]
-            
-            if available_personas:
-                current_persona = random.choice(available_personas)
-                
-                response_content = await get_persona_response(
-                    current_persona,
-                    channel_name,
-                    previous_messages,
-                    persona_manager
-                )
+            with tracer.trace('persona_turn', channel_id=channel_id, workspace_id=message.get('workspace_id')):
+                await generate_persona_turn(channel_id, message, persona_manager)
 
-                # Store message in database
-                await store_message(
-                    channel_id=channel_id,
-                    workspace_id=message['workspace_id'],
-                    sender_id=persona_manager.ai_user_ids[current_persona],
-                    content=response_content,
-                    sender_name=current_persona,
-                    thread_id=message.get('thread_id')
-                )
+        await asyncio.sleep(2)  # Natural conversation pacing
+
+async def generate_persona_turn(channel_id, message, persona_manager):
+    """Reply to a queued message as a random persona that hasn't spoken recently"""
+    # Get recent context
+    recent_messages = await get_recent_messages(channel_id)
+    previous_messages = [msg['content'] for msg in recent_messages]
+    
+    # Generate response from a random persona
+    channel_name = next(name for name, id in persona_manager.channel_ids.items() 
+                      if id == channel_id)
+    channel = persona_manager.channels[channel_name]
+    
+    # Select random persona that hasn't spoken recently
+    available_personas = [p for p in channel.get('primary_personas', [])
+                        if p not in [msg.get('sender_name') for msg in recent_messages[-2:]]]
+    
+    if available_personas:
+        current_persona = random.choice(available_personas)
+        
+        response_content = await get_persona_response(
+            current_persona,
+            channel_name,
+            previous_messages,
+            persona_manager
+        )
 
-                # Create embedding
-                message_document = Document(
-                    page_content=response_content,
-                    metadata={
-                        'channel_id': channel_id,
-                        'workspace_id': message['workspace_id'],
-                        'sender_id': current_persona,
-                        'sender_name': current_persona,
-                        'timestamp': datetime.now().isoformat()
-                    }
-                )
-                await document_vectorstore.aadd_documents([message_document])
+        # Store message in database
+        with tracer.span('appwrite.write'):
+            await store_message(
+                channel_id=channel_id,
+                workspace_id=message['workspace_id'],
+                sender_id=persona_manager.ai_user_ids[current_persona],
+                content=response_content,
+                sender_name=current_persona,
+                thread_id=message.get('thread_id')
+            )
 
-        await asyncio.sleep(2)  # Natural conversation pacing
+        # Create embedding
+        message_document = Document(
+            page_content=response_content,
+            metadata={
+                'channel_id': channel_id,
+                'workspace_id': message['workspace_id'],
+                'sender_id': current_persona,
+                'sender_name': current_persona,
+                **timestamp_metadata()
+            }
+        )
+        with tracer.span('vector_upsert'):
+            await document_vectorstore.aadd_documents([message_document])
 
 async def store_message(channel_id, workspace_id, sender_id, content, sender_name, thread_id=None):
     async with channel_locks[channel_id]:
@@ -206,14 +222,16 @@ async def store_message(channel_id, workspace_id, sender_id, content, sender_nam
             }
             
             # Get current channel state
-            channel = await database.get_document(
+            channel = await asyncio.to_thread(
+                database.get_document,
                 database_id='main',
                 collection_id='channels',
                 document_id=channel_id
             )
             
             # Create message document
-            stored_message = await database.create_document(
+            stored_message = await asyncio.to_thread(
+                database.create_document,
                 database_id='main',
                 collection_id='messages',
                 document_id=ID.unique(),
@@ -226,7 +244,8 @@ async def store_message(channel_id, workspace_id, sender_id, content, sender_nam
             )
             
             # Update channel's last_message_at atomically
-            await database.update_document(
+            await asyncio.to_thread(
+                database.update_document,
                 database_id='main',
                 collection_id='channels',
                 document_id=channel_id,
@@ -248,8 +267,8 @@ async def process_channel_queue(channel_id: str):
         try:
             message_data = await queue.get()
             try:
-                async with channel_locks[channel_id]:
-                    # Process message here
+                with tracer.trace('queued_message', channel_id=channel_id), tracer.span('appwrite.write'):
+                    # store_message takes the channel lock itself
                     await store_message(
                         channel_id=message_data['channel_id'],
                         workspace_id=message_data['workspace_id'],
@@ -283,6 +302,7 @@ async def handle_message(request):
         
         # Add message to channel queue
         await channel_queues[channel_id].put(data)
+        performance_metrics.registry.inc('messages_queued')
         
         return web.Response(text='Message queued successfully', status=200)
         
@@ -294,8 +314,12 @@ async def handle_message(request):
 async def main():
     persona_manager = PersonaManager()
     
-    app = web.Application()
+    app = web.Application(middlewares=[
+        metrics_middleware_factory(),
+        recording_middleware_factory(webhook_recorder)
+    ])
     app.router.add_post('/', handle_message)
+    app.router.add_get('/metrics', metrics_handler)
     
     # Start message queue processors for each channel
     for channel_id in persona_manager.channel_ids.values():
@@ -6,10 +6,9 @@ from appwrite.services.databases import Databases
 from appwrite.permission import Permission
 from appwrite.role import Role
 from appwrite.id import ID
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
 from langchain.schema import Document
 from bot import bot2, bot3
+from fakes.factory import make_embeddings, make_vectorstore
 import logging
 
 # Set up logging
@@ -29,19 +28,22 @@ client.set_key(os.getenv('APPWRITE_API_KEY'))
 database = Databases(client)
 
 # Initialize LangChain components
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
-document_vectorstore = PineconeVectorStore(
+embeddings = make_embeddings(model="text-embedding-3-large")
+document_vectorstore = make_vectorstore(
     index_name=os.getenv('PINECONE_INDEX'),
     embedding=embeddings
 )
 
+# Workspace the conversation's messages are stored and retrieved in
+WORKSPACE_ID = 'default'
+
 async def store_message(channel_id, sender_id, content, sender_name):
     """Store a message in the database and vector store"""
     try:
         # Create message document
         message = {
             'channel_id': channel_id,
-            'workspace_id': 'default',
+            'workspace_id': WORKSPACE_ID,
             'sender_type': 'ai_persona',
             'sender_id': sender_id,
             'content': content,
@@ -71,6 +73,7 @@ async def store_message(channel_id, sender_id, content, sender_name):
             page_content=content,
             metadata={
                 'channel_id': channel_id,
+                'workspace_id': WORKSPACE_ID,
                 'sender_id': sender_id,
                 'sender_name': sender_name,
                 'timestamp': datetime.now().isoformat()
@@ -105,7 +108,8 @@ async def start_conversation(channel_id="67859ec30006b3c8fda3"):
             carol_response = await bot3.generate_response(
                 previous_messages[-1],
                 channel_id,
-                previous_messages[-5:] if len(previous_messages) > 5 else previous_messages
+                previous_messages[-5:] if len(previous_messages) > 5 else previous_messages,
+                WORKSPACE_ID
             )
             
             await store_message(
@@ -122,7 +126,8 @@ async def start_conversation(channel_id="67859ec30006b3c8fda3"):
             danny_response = await bot2.generate_response(
                 previous_messages[-1],
                 channel_id,
-                previous_messages[-5:] if len(previous_messages) > 5 else previous_messages
+                previous_messages[-5:] if len(previous_messages) > 5 else previous_messages,
+                WORKSPACE_ID
             )
             
             await store_message(
@@ -1,19 +1,33 @@
-import os
-from PIL import Image
+import argparse
+import logging
 
-# Get all PNG files in profile_images directory that match the profile pattern
-profile_dir = './profile_images'
-profile_images = [f for f in os.listdir(profile_dir) if f.startswith('profile_') and f.endswith('.png')]
+from image_processing import AVATAR_SIZES, convert_directory
 
-# Convert each image to webp
-for image_file in profile_images:
-    # Open the PNG image
-    img = Image.open(os.path.join(profile_dir, image_file))
-    
-    # Create webp filename by replacing .png extension
-    webp_filename = image_file.rsplit('.', 1)[0] + '.webp'
-    
-    # Convert and save as webp in profile_images directory
-    img.save(os.path.join(profile_dir, webp_filename), 'webp')
-    
-    print(f'Converted {image_file} to {webp_filename}')
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert profile PNGs to WebP avatars in parallel")
+    parser.add_argument('--src', default='./profile_images', help="Directory containing profile_*.png files")
+    parser.add_argument('--out', default=None, help="Output directory (defaults to --src)")
+    parser.add_argument('--sizes', default=','.join(map(str, AVATAR_SIZES)), help="Comma-separated avatar sizes")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (defaults to CPU count)")
+    parser.add_argument('--force', action='store_true', help="Re-encode even if outputs are up to date")
+    parser.add_argument('--report', default='./profile_images/conversion_report.json', help="Per-file timing report")
+    args = parser.parse_args()
+
+    results = convert_directory(
+        args.src,
+        out_dir=args.out,
+        sizes=[int(size) for size in args.sizes.split(',') if size],
+        workers=args.workers,
+        force=args.force,
+        report_path=args.report
+    )
+
+    for result in sorted(results, key=lambda r: r['file']):
+        if result.get('error'):
+            print(f"Failed {result['file']}: {result['error']}")
+        elif result['skipped']:
+            print(f"Skipped {result['file']} (up to date)")
+        else:
+            print(f"Converted {result['file']} in {result['seconds']:.2f}s")
@@ -19,22 +19,26 @@ import string
 import logging
 import sys
 import random
-from openai import OpenAI, AsyncOpenAI
+import time
+from openai import AsyncOpenAI
 from appwrite.query import Query
 
 import aiofiles
 import aiofiles.os
 from asyncio import Lock
+from collections import defaultdict
 from datetime import datetime
-import requests
-from PIL import Image
 from io import BytesIO
-from elevenlabs import ElevenLabs
+from elevenlabs import AsyncElevenLabs
 
 from autonomous_conversation import populate_workspace_conversations
+from adaptive_limiter import AdaptiveConcurrencyLimiter, call_with_limiter
+from monitoring.performance_logger import performance_metrics
+from monitoring.exposition import metrics_handler, metrics_middleware_factory
+from image_cache import image_cache, content_hash
+from image_processing import encode_webp_variants
 
-import multiprocessing
-from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 
 # Configure logging
 logging.basicConfig(
@@ -75,6 +79,22 @@ AI_PERSONAS_COLLECTION = 'ai_personas'
 CHANNELS_COLLECTION = 'channels'
 MESSAGES_COLLECTION = 'messages'
 
+# Avatar generation settings
+AVATAR_CONCURRENCY = int(os.getenv('AVATAR_CONCURRENCY', '5'))  # personas processed in parallel
+AVATAR_ENCODE_WORKERS = int(os.getenv('AVATAR_ENCODE_WORKERS', '2'))
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Voice generation settings (ElevenLabs concurrency limits depend on the plan).
+# Start wide open and let the limiter back off when ElevenLabs pushes back
+VOICE_MAX_CONCURRENCY = int(os.getenv('VOICE_MAX_CONCURRENCY', '10'))
+VOICE_INITIAL_CONCURRENCY = int(os.getenv('VOICE_INITIAL_CONCURRENCY', str(VOICE_MAX_CONCURRENCY)))
+
+# Shared thread pool for Pillow WebP encoding (Pillow releases the GIL while encoding)
+image_executor = ThreadPoolExecutor(max_workers=AVATAR_ENCODE_WORKERS, thread_name_prefix='avatar-encode')
+
+# One upload per distinct avatar: concurrent personas with identical bytes wait on the same lock
+avatar_upload_locks = defaultdict(Lock)
+
 
 # LangWatch
 
@@ -409,84 +429,21 @@ async def create_workspace(description: str, workspace_id: str, api_key: str):
         except Exception as e:
             logger.error(f"Failed to add AI users to workspace members: {str(e)}")
         
-        # Prepare storage config for multiprocessing
-        storage_config = {
-            'endpoint': os.getenv('PUBLIC_APPWRITE_ENDPOINT'),
-            'project': os.getenv('APPWRITE_PROJECT_ID'),
-            'api_key': os.getenv('APPWRITE_API_KEY')
-        }
-
-        # Create process pool for avatar generation
-        num_cores = min(5, multiprocessing.cpu_count())
-        avatar_pool = multiprocessing.Pool(num_cores)
+        # Generate avatars concurrently in the background while voices are created
+        avatar_task = asyncio.create_task(generate_avatars(stored_personas, workspace_id))
 
         try:
-            # Run avatar generation in parallel
-            avatar_tasks = []
-            for stored_persona in stored_personas:
-                avatar_tasks.append(
-                    avatar_pool.apply_async(
-                        process_avatar_generation,
-                        args=(storage_config, stored_persona, workspace_id)
-                    )
-                )
+            # Run voice generation concurrently under an adaptive rate limiter
+            voice_results = await generate_voices(stored_personas, api_key)
+            logger.info(f"Generated {len(voice_results)}/{len(stored_personas)} voices")
 
-            # Run voice generation sequentially (to avoid rate limits)
-            voice_results = []
-            for stored_persona in stored_personas:
-                try:
-                    # Generate voice with retry logic
-                    max_retries = 3
-                    retry_delay = 5  # seconds
-                    
-                    for attempt in range(max_retries):
-                        try:
-                            voice_id = await generate_voice_for_persona(stored_persona, OpenAI(api_key=api_key))
-                            if voice_id:
-                                logger.info(f"Successfully generated voice for {stored_persona['name']}")
-                                # Update persona document with voice ID
-                                databases.update_document(
-                                    database_id=DATABASE_ID,
-                                    collection_id=AI_PERSONAS_COLLECTION,
-                                    document_id=stored_persona['$id'],
-                                    data={'voice_id': voice_id}
-                                )
-                                # Update user preferences with voice ID
-                                users.update_prefs(
-                                    user_id=stored_persona['$id'],
-                                    prefs={'voiceId': voice_id}
-                                )
-                                logger.info(f"Updated user preferences with voice ID for {stored_persona['name']}")
-                            break
-                        except Exception as e:
-                            if "502" in str(e) and attempt < max_retries - 1:
-                                logger.warning(f"Rate limited, retrying in {retry_delay} seconds...")
-                                await asyncio.sleep(retry_delay)
-                                retry_delay *= 2  # Exponential backoff
-                                continue
-                            logger.error(f"Failed to generate voice for {stored_persona['name']}: {str(e)}")
-                            break
-                    
-                    # Add delay between voice generations
-                    await asyncio.sleep(2)
-                    
-                except Exception as e:
-                    logger.error(f"Voice generation error for {stored_persona['name']}: {str(e)}")
-
-            # Wait for avatar generation to complete and process results
-            avatar_results = {}
-            for task in avatar_tasks:
-                try:
-                    user_id, avatar_id = task.get()
-                    if avatar_id:
-                        avatar_results[user_id] = avatar_id
-                        logger.info(f"Successfully processed avatar for user {user_id}")
-                except Exception as e:
-                    logger.error(f"Error getting avatar task result: {str(e)}")
+            # Wait for avatar generation to complete
+            avatar_results = await avatar_task
+            logger.info(f"Generated {len(avatar_results)}/{len(stored_personas)} avatars")
 
         finally:
-            avatar_pool.close()
-            avatar_pool.join()
+            if not avatar_task.done():
+                avatar_task.cancel()
 
         # Prepare success response before starting autonomous conversations
         response = {
@@ -537,7 +494,10 @@ async def handle_request(request):
         
         # Create workspace with personas and store in Appwrite
         logger.info("Creating workspace with ID: %s", workspace_id)
+        creation_start = time.time()
         workspace = await create_workspace(description, workspace_id, OPENAI_API_KEY)
+        performance_metrics.add_operation_time('workspace_creation', time.time() - creation_start)
+        performance_metrics.registry.inc('workspaces_created')
         
         logger.info("Successfully processed workspace creation request")
         # Return the complete workspace initialization data
@@ -550,14 +510,16 @@ async def handle_request(request):
     except Exception as e:
         logger.error("Request handler error: %s", str(e))
         logger.exception(e)
+        performance_metrics.log_error(type(e).__name__)
         return web.Response(text=f"Error: {str(e)}", status=500)
 
 
 
 async def main():
     logger.info("Starting server initialization")
-    app = web.Application()
+    app = web.Application(middlewares=[metrics_middleware_factory()])
     app.router.add_get('/', handle_request)
+    app.router.add_get('/metrics', metrics_handler)
     
     runner = web.AppRunner(app)
     await runner.setup()
@@ -572,7 +534,107 @@ async def main():
         await asyncio.sleep(3600)
         logger.debug("Server heartbeat")
 
-async def generate_and_store_avatar(storage: Storage, persona: dict, workspace_id: str) -> str:
+def build_avatar_prompt(persona: dict) -> str:
+    """Create a personalized, abstract avatar prompt from persona attributes"""
+    personality_traits = persona['personality'].lower()
+    role = persona['role'].lower()
+    conversation_style = persona['conversation_style'].lower()
+    
+    # Map personality traits to creative, abstract descriptors with blue/purple focus
+    style_mapping = {
+        'formal': 'geometric shapes in navy blue, crystalline structures',
+        'professional': 'flowing gradients of indigo and violet, clean lines',
+        'casual': 'playful swirls of periwinkle and lavender',
+        'friendly': 'soft clouds of powder blue and lilac',
+        'analytical': 'angular patterns in sapphire and amethyst',
+        'creative': 'abstract splashes of cobalt and purple',
+        'tech': 'digital waves of electric blue and ultraviolet',
+        'academic': 'constellation patterns in deep blue and royal purple'
+    }
+    
+    # Find matching style descriptors
+    style_elements = []
+    for key, value in style_mapping.items():
+        if key in personality_traits or key in conversation_style or key in role:
+            style_elements.append(value)
+    
+    # If no specific style matches, use creative default style
+    if not style_elements:
+        style_elements = ['ethereal blend of blue and purple hues, abstract forms']
+        
+    # Create an artistic, abstract prompt
+    return (
+        f"Abstract artistic portrait incorporating {', '.join(style_elements[:2])}, "
+        f"minimalist face suggestion emerging from {persona['role'].lower()} themed elements, "
+        "predominantly blue and purple color palette, ethereal lighting, "
+        "modern digital art style with subtle sacred geometry patterns"
+    )
+
+async def download_image(session: aiohttp.ClientSession, url: str) -> bytes:
+    """Stream an image from a URL into memory in fixed-size chunks"""
+    async with session.get(url) as response:
+        response.raise_for_status()
+        buffer = BytesIO()
+        async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+            buffer.write(chunk)
+        return buffer.getvalue()
+
+async def generate_image_bytes(openai_client: AsyncOpenAI, session: aiohttp.ClientSession, prompt: str) -> bytes:
+    """Generate a DALL-E image and download its bytes, reusing cached images for identical prompts"""
+    model, size = "dall-e-3", "1024x1024"
+    cached = await asyncio.to_thread(image_cache.get, model, prompt, size, quality="standard")
+    if cached is not None:
+        return cached
+    
+    response = await openai_client.images.generate(
+        model=model,
+        prompt=prompt,
+        size=size,
+        quality="standard",
+        n=1,
+    )
+    image_bytes = await download_image(session, response.data[0].url)
+    await asyncio.to_thread(image_cache.put, model, prompt, size, None, image_bytes, quality="standard")
+    return image_bytes
+
+async def upload_avatar(storage: Storage, webp_bytes: bytes, filename: str, bucket_id: str = 'avatars') -> str:
+    """
+    Upload avatar bytes without blocking the event loop, deduplicated by content hash.
+    
+    Identical WebP bytes are uploaded once and the existing file ID is shared.
+    The Appwrite SDK is synchronous, so the upload runs in a worker thread. Files
+    larger than the SDK chunk size are streamed to Appwrite in chunks by the SDK.
+    """
+    digest = content_hash(webp_bytes)
+    async with avatar_upload_locks[digest]:
+        existing_id = await asyncio.to_thread(image_cache.get_uploaded_file, bucket_id, digest)
+        if existing_id:
+            try:
+                await asyncio.to_thread(storage.get_file, bucket_id=bucket_id, file_id=existing_id)
+                logger.info(f"Reusing stored avatar {existing_id} for identical image")
+                return existing_id
+            except Exception:
+                logger.warning(f"Stored avatar {existing_id} no longer exists, uploading again")
+                await asyncio.to_thread(image_cache.forget_upload, bucket_id, digest)
+        
+        file_id = ID.unique()
+        input_file = InputFile.from_bytes(webp_bytes, filename=filename)
+        await asyncio.to_thread(
+            storage.create_file,
+            bucket_id=bucket_id,
+            file_id=file_id,
+            file=input_file,
+        )
+        await asyncio.to_thread(image_cache.record_upload, bucket_id, digest, file_id)
+        return file_id
+
+async def generate_and_store_avatar(
+    storage: Storage,
+    persona: dict,
+    workspace_id: str,
+    session: aiohttp.ClientSession,
+    openai_client: AsyncOpenAI
+) -> str:
     """
     Generate and store an AI avatar for a persona in Appwrite Storage based on their attributes.
     
@@ -580,6 +642,8 @@ async def generate_and_store_avatar(storage: Storage, persona: dict, workspace_i
         storage: Appwrite Storage service instance
         persona: Dictionary containing persona attributes
         workspace_id: ID of the workspace
+        session: Shared aiohttp session used to download generated images
+        openai_client: Shared async OpenAI client
         
     Returns:
         str: ID of the stored file in Appwrite
@@ -588,122 +652,45 @@ async def generate_and_store_avatar(storage: Storage, persona: dict, workspace_i
     
     try:
         # 1. Create a personalized prompt based on persona attributes
-        personality_traits = persona['personality'].lower()
-        role = persona['role'].lower()
-        conversation_style = persona['conversation_style'].lower()
-        
-        # Map personality traits to creative, abstract descriptors with blue/purple focus
-        style_mapping = {
-            'formal': 'geometric shapes in navy blue, crystalline structures',
-            'professional': 'flowing gradients of indigo and violet, clean lines',
-            'casual': 'playful swirls of periwinkle and lavender',
-            'friendly': 'soft clouds of powder blue and lilac',
-            'analytical': 'angular patterns in sapphire and amethyst',
-            'creative': 'abstract splashes of cobalt and purple',
-            'tech': 'digital waves of electric blue and ultraviolet',
-            'academic': 'constellation patterns in deep blue and royal purple'
-        }
-        
-        # Find matching style descriptors
-        style_elements = []
-        for key, value in style_mapping.items():
-            if key in personality_traits or key in conversation_style or key in role:
-                style_elements.append(value)
-        
-        # If no specific style matches, use creative default style
-        if not style_elements:
-            style_elements = ['ethereal blend of blue and purple hues, abstract forms']
-            
-        # Create an artistic, abstract prompt
-        prompt = (
-            f"Abstract artistic portrait incorporating {', '.join(style_elements[:2])}, "
-            f"minimalist face suggestion emerging from {persona['role'].lower()} themed elements, "
-            "predominantly blue and purple color palette, ethereal lighting, "
-            "modern digital art style with subtle sacred geometry patterns"
-        )
+        prompt = build_avatar_prompt(persona)
         
         logger.debug(f"Generated prompt: {prompt}")
         logger.debug(f"Prompt length: {len(prompt)} characters")
         
         try:
-            # Initialize OpenAI client
-            client = OpenAI(api_key=OPENAI_API_KEY)
-            
             # First attempt with personalized prompt
-            response = client.images.generate(
-                model="dall-e-3",
-                prompt=prompt,
-                size="1024x1024",
-                quality="standard",
-                n=1,
-            )
-            
-            # Download the image from the URL
-            image_url = response.data[0].url
-            image_response = requests.get(image_url)
-            image_bytes = image_response.content
+            image_bytes = await generate_image_bytes(openai_client, session, prompt)
             
         except Exception as img_error:
             logger.warning(f"Failed with personalized prompt: {str(img_error)}. Trying fallback prompt...")
             # Fallback to a creative but safe prompt
             fallback_prompt = "Abstract portrait, flowing blue and purple gradients, minimal geometric patterns, ethereal lighting"
-            response = client.images.generate(
-                model="dall-e-3",
-                prompt=fallback_prompt,
-                size="1024x1024",
-                quality="standard",
-                n=1,
-            )
-            
-            # Download the image from the URL
-            image_url = response.data[0].url
-            image_response = requests.get(image_url)
-            image_bytes = image_response.content
+            image_bytes = await generate_image_bytes(openai_client, session, fallback_prompt)
             
-        # Convert PNG bytes to WebP
-        image = Image.open(BytesIO(image_bytes))
-        
-        # Create a BytesIO object to store the WebP image
-        webp_buffer = BytesIO()
-        # Convert to WebP with high quality
-        image.save(webp_buffer, format="WebP", quality=95, method=6)
-        webp_bytes = webp_buffer.getvalue()
-        
-        # 3. Create a unique filename
-        filename = f"{persona['name'].lower().replace(' ', '_')}_{workspace_id}_avatar.webp"
+        # 2. Convert PNG bytes to full-size and avatar-size WebPs in the shared thread pool, decoding once
+        loop = asyncio.get_running_loop()
+        variants = await loop.run_in_executor(image_executor, encode_webp_variants, image_bytes)
         
-        # 4. Store in Appwrite Storage using InputFile
-        logger.info(f"Storing avatar in Appwrite bucket: {filename}")
-        
-        # Create the file using InputFile
-        input_file = InputFile.from_bytes(
-            webp_bytes,
-            filename=filename
-        )
-
-        file_id = ID.unique()
+        # 3. Create a unique filename per size
+        stem = f"{persona['name'].lower().replace(' ', '_')}_{workspace_id}_avatar"
+        filenames = {size: f"{stem}.webp" if size is None else f"{stem}_{size}.webp" for size in variants}
         
-        result = storage.create_file(
-            bucket_id='avatars',
-            file_id=file_id,
-            file=input_file,
-        )
+        # 4. Store in Appwrite Storage
+        logger.info(f"Storing avatar in Appwrite bucket: {filenames[None]} and {len(variants) - 1} resized copies")
+        file_ids = dict(zip(variants, await asyncio.gather(*(
+            upload_avatar(storage, webp_bytes, filenames[size]) for size, webp_bytes in variants.items()
+        ))))
+        file_id = file_ids.pop(None)
         
         logger.info(f"Successfully stored avatar with ID: {file_id}")
 
-        # Immediately update user preferences with avatar ID
+        # Immediately update user preferences with avatar ID and the resized avatars' IDs
         try:
-            # Create new Appwrite client for user operations
-            appwrite_client = Client()
-            appwrite_client.set_endpoint(os.getenv('PUBLIC_APPWRITE_ENDPOINT'))
-            appwrite_client.set_project(os.getenv('APPWRITE_PROJECT_ID'))
-            appwrite_client.set_key(os.getenv('APPWRITE_API_KEY'))
-            
-            users = Users(appwrite_client)
             logger.info(f"Setting avatar ID {file_id} for user {persona['ai_user_id']}")
-            users.update_prefs(
+            await asyncio.to_thread(
+                users.update_prefs,
                 user_id=persona['ai_user_id'],
-                prefs={'avatarId': file_id}
+                prefs={'avatarId': file_id, 'avatarSizes': {str(size): id for size, id in file_ids.items()}}
             )
             logger.info(f"Successfully set avatar ID for user {persona['ai_user_id']}")
         except Exception as e:
@@ -717,13 +704,54 @@ async def generate_and_store_avatar(storage: Storage, persona: dict, workspace_i
         logger.exception(e)
         return None
 
-async def generate_voice_for_persona(persona: dict, openai_client: OpenAI) -> str:
+async def generate_avatars(personas: list, workspace_id: str, concurrency: int = AVATAR_CONCURRENCY) -> dict:
+    """
+    Generate avatars for many personas concurrently on the event loop.
+    
+    Args:
+        personas: Stored persona documents
+        workspace_id: ID of the workspace
+        concurrency: Maximum number of personas processed at once
+        
+    Returns:
+        dict: Mapping of AI user ID to stored avatar file ID
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    ssl_context = ssl.create_default_context(cafile=certifi.where())
+    
+    async with aiohttp.ClientSession(connector=TCPConnector(ssl=ssl_context, limit=concurrency)) as session:
+        async def run(persona: dict) -> tuple:
+            async with semaphore:
+                avatar_id = await generate_and_store_avatar(storage, persona, workspace_id, session, openai_client)
+                return persona['ai_user_id'], avatar_id
+        
+        results = await asyncio.gather(*(run(persona) for persona in personas), return_exceptions=True)
+    
+    avatar_results = {}
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"Error getting avatar task result: {str(result)}")
+            continue
+        user_id, avatar_id = result
+        if avatar_id:
+            avatar_results[user_id] = avatar_id
+            logger.info(f"Successfully processed avatar for user {user_id}")
+    
+    return avatar_results
+
+async def generate_voice_for_persona(
+    persona: dict,
+    openai_client: AsyncOpenAI,
+    limiter: AdaptiveConcurrencyLimiter = None
+) -> str:
     """
     Generate a voice for an AI persona using OpenAI for the prompt and ElevenLabs for synthesis.
     
     Args:
         persona: Dictionary containing persona attributes
-        openai_client: OpenAI client instance
+        openai_client: Async OpenAI client instance
+        limiter: Shared ElevenLabs concurrency limiter; throttled calls are retried through it
         
     Returns:
         str: Voice ID from ElevenLabs
@@ -742,7 +770,7 @@ KEEP YOUR RESPONSE UNDER 300 CHARACTERS."""
 
         prompt = base_prompt.format(persona_json=json.dumps(persona, indent=2))
 
-        response = openai_client.chat.completions.create(
+        response = await openai_client.chat.completions.create(
             model="gpt-4o-mini",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.7
@@ -762,18 +790,18 @@ KEEP YOUR RESPONSE UNDER 300 CHARACTERS."""
         example_text = f"Hello everyone, I am {persona['name']}. {persona.get('greeting', '')} " + \
                       f"As a {persona.get('role', '')}, I bring unique perspectives shaped by my background in " + \
                       f"{', '.join(persona.get('knowledge_base', []))}. " + \
-                      f"{persona.get('catchphrases', [''])[0]}"
+                      f"{(persona.get('catchphrases') or [''])[0]}"
         
         max_retries = 3
         current_retry = 0
+        eleven_client = AsyncElevenLabs(api_key=os.getenv('ELEVENLABS_API_KEY'))
         
         while current_retry < max_retries:
             try:
-                # Initialize ElevenLabs client
-                eleven_client = ElevenLabs(api_key=os.getenv('ELEVENLABS_API_KEY'))
-                
                 # Create voice previews
-                preview_response = eleven_client.text_to_voice.create_previews(
+                preview_response = await call_with_limiter(
+                    limiter,
+                    eleven_client.text_to_voice.create_previews,
                     voice_description=voice_description,
                     text=example_text
                 )
@@ -783,7 +811,9 @@ KEEP YOUR RESPONSE UNDER 300 CHARACTERS."""
                 logger.info(f"Generated preview voice ID for {persona['name']}: {generated_voice_id}")
                 
                 # Create the final voice
-                voice_response = eleven_client.text_to_voice.create_voice_from_preview(
+                voice_response = await call_with_limiter(
+                    limiter,
+                    eleven_client.text_to_voice.create_voice_from_preview,
                     voice_name=persona['name'],
                     voice_description=voice_description,
                     generated_voice_id=generated_voice_id
@@ -811,43 +841,77 @@ KEEP YOUR RESPONSE UNDER 300 CHARACTERS."""
         logger.exception(e)
         return None
 
-def process_avatar_generation(storage_config: dict, persona: dict, workspace_id: str) -> tuple:
-    """Wrapper for parallel avatar generation"""
+async def generate_voice_job(
+    persona: dict,
+    openai_client: AsyncOpenAI,
+    limiter: AdaptiveConcurrencyLimiter
+) -> tuple:
+    """
+    Generate and persist one persona's voice. Idempotent: personas that already
+    have a voice_id are skipped.
+    """
+    if persona.get('voice_id'):
+        logger.info(f"Skipping voice generation for {persona['name']}, voice already exists")
+        return persona['$id'], persona['voice_id']
+    
+    voice_id = await generate_voice_for_persona(persona, openai_client, limiter)
+    if not voice_id:
+        return persona['$id'], None
+    
+    logger.info(f"Successfully generated voice for {persona['name']}")
     try:
-        # Recreate storage client in the new process
-        client = Client()
-        client.set_endpoint(storage_config['endpoint'])
-        client.set_project(storage_config['project'])
-        client.set_key(storage_config['api_key'])
-        
-        storage = Storage(client)
-        
-        # Run the avatar generation
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        avatar_id = loop.run_until_complete(generate_and_store_avatar(storage, persona, workspace_id))
-        loop.close()
-        
-        return persona['ai_user_id'], avatar_id
+        # Update persona document with voice ID
+        await asyncio.to_thread(
+            databases.update_document,
+            database_id=DATABASE_ID,
+            collection_id=AI_PERSONAS_COLLECTION,
+            document_id=persona['$id'],
+            data={'voice_id': voice_id}
+        )
+        # Update user preferences with voice ID
+        await asyncio.to_thread(
+            users.update_prefs,
+            user_id=persona['$id'],
+            prefs={'voiceId': voice_id}
+        )
+        logger.info(f"Updated user preferences with voice ID for {persona['name']}")
     except Exception as e:
-        logger.error(f"Avatar generation process error for {persona['name']}: {str(e)}")
-        return persona['ai_user_id'], None
+        logger.error(f"Failed to store voice ID for {persona['name']}: {str(e)}")
+    
+    return persona['$id'], voice_id
 
-def process_voice_generation(openai_key: str, persona: dict) -> tuple:
-    """Wrapper for parallel voice generation"""
-    try:
-        # Create new OpenAI client in the new process
-        openai_client = OpenAI(api_key=openai_key)
-        
-        # Run the voice generation
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        result = loop.run_until_complete(generate_voice_for_persona(persona, openai_client))
-        loop.close()
-        return persona['ai_user_id'], result
-    except Exception as e:
-        logger.error(f"Voice generation process error for {persona['name']}: {str(e)}")
-        return persona['ai_user_id'], None
+async def generate_voices(personas: list, api_key: str) -> dict:
+    """
+    Generate voices for all personas concurrently.
+    
+    Calls to ElevenLabs share one adaptive limiter that backs off on 429/5xx
+    responses and honours Retry-After, so one throttled job slows down the others.
+    
+    Returns:
+        dict: Mapping of persona ID to ElevenLabs voice ID
+    """
+    openai_client = AsyncOpenAI(api_key=api_key)
+    limiter = AdaptiveConcurrencyLimiter(
+        initial_limit=VOICE_INITIAL_CONCURRENCY,
+        max_limit=VOICE_MAX_CONCURRENCY,
+        name='elevenlabs'
+    )
+    
+    results = await asyncio.gather(
+        *(generate_voice_job(persona, openai_client, limiter) for persona in personas),
+        return_exceptions=True
+    )
+    
+    voice_results = {}
+    for persona, result in zip(personas, results):
+        if isinstance(result, Exception):
+            logger.error(f"Voice generation error for {persona['name']}: {str(result)}")
+            continue
+        persona_id, voice_id = result
+        if voice_id:
+            voice_results[persona_id] = voice_id
+    
+    return voice_results
 
 if __name__ == "__main__":
     logger.info("=== Application Starting ===")
@@ -6,13 +6,14 @@ from appwrite.id import ID
 from datetime import datetime
 import os
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
+from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
 from langchain.schema import Document
 import logging
 import json
 
+from fakes.factory import make_embeddings, make_vectorstore, make_retriever
+
 load_dotenv()
 
 # Set up logging
@@ -32,12 +33,12 @@ client.set_key(os.getenv('APPWRITE_API_KEY'))
 database = Databases(client)
 
 # Initialize LangChain components
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
-document_vectorstore = PineconeVectorStore(
+embeddings = make_embeddings(model="text-embedding-3-large")
+document_vectorstore = make_vectorstore(
     index_name=os.getenv('PINECONE_INDEX'),
     embedding=embeddings
 )
-retriever = document_vectorstore.as_retriever()
+retriever = make_retriever(document_vectorstore)
 llm = ChatOpenAI(temperature=0.7, model_name="gpt-4")
 
 class PersonaManager:
@@ -46,13 +47,13 @@ class PersonaManager:
             data = json.load(f)
             self.personas = {persona['name']: persona for persona in data['personas']}
 
-async def create_bot_message(channel_id, persona_id, bot_user_id, prompt):
+async def create_bot_message(channel_id, persona_id, bot_user_id, prompt, workspace_id='default'):
     try:
         # Get relevant context from embeddings with bot_user_id filter
         context = retriever.get_relevant_documents(
             prompt,
             k=5,  # Get top 5 most relevant messages
-            filter={"sender_id": bot_user_id}
+            filter={"workspace_id": workspace_id, "sender_id": bot_user_id}
         )
         
         # Get bot persona
@@ -99,7 +100,7 @@ Current Query: {query}""",
 
         message = {
             'channel_id': channel_id,
-            'workspace_id': 'default',
+            'workspace_id': workspace_id,
             'sender_type': 'ai_persona',
             'sender_id': bot_user_id,
             'content': response_content,
@@ -129,6 +130,7 @@ Current Query: {query}""",
             page_content=response_content,
             metadata={
                 'channel_id': channel_id,
+                'workspace_id': workspace_id,
                 'sender_id': bot_user_id,
                 'sender_name': persona["name"],
                 'timestamp': datetime.now().isoformat()
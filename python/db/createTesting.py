@@ -8,6 +8,13 @@ from appwrite.role import Role
 import os
 from dotenv import load_dotenv
 import logging
+import sys
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from monitoring.histogram import LatencyHistogram
 
 # Configure logging
 logging.basicConfig(
@@ -51,7 +58,9 @@ async def create_test_message(workspace_id: str, channel_id: str, sender_id: str
     start_time = time.time()
     
     try:
-        message = databases.create_document(
+        # The Appwrite SDK is synchronous, so run the create in a worker thread
+        message = await asyncio.to_thread(
+            databases.create_document,
             database_id=DATABASE_ID,
             collection_id=MESSAGES_COLLECTION,
             document_id=ID.unique(),
@@ -68,37 +77,48 @@ async def create_test_message(workspace_id: str, channel_id: str, sender_id: str
         logger.error(f"Error creating message: {str(e)}")
         raise
 
-async def run_performance_test(num_messages: int = 100):
-    """Run performance test creating multiple messages"""
+async def run_performance_test(num_messages: int = 100, concurrency: int = 1):
+    """Run performance test creating multiple messages, `concurrency` at a time"""
     test_workspace_id = "test_workspace"
     test_channel_id = "test_channel"
     test_sender_id = "test_user"
     
-    creation_times = []
-    logger.info(f"Starting performance test - creating {num_messages} messages")
-    
-    for i in range(num_messages):
-        try:
-            creation_time = await create_test_message(
-                test_workspace_id,
-                test_channel_id,
-                test_sender_id
-            )
-            creation_times.append(creation_time)
-            logger.info(f"Message {i+1}/{num_messages} created in {creation_time:.3f} seconds")
-        except Exception as e:
-            logger.error(f"Failed to create message {i+1}: {str(e)}")
-    
-    avg_time = sum(creation_times) / len(creation_times)
-    min_time = min(creation_times)
-    max_time = max(creation_times)
-    
+    creation_times = LatencyHistogram()
+    failures = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    logger.info(f"Starting performance test - creating {num_messages} messages ({concurrency} concurrent)")
+
+    async def create(i: int):
+        nonlocal failures
+        async with semaphore:
+            try:
+                creation_time = await create_test_message(
+                    test_workspace_id,
+                    test_channel_id,
+                    test_sender_id
+                )
+                creation_times.record(creation_time)
+                logger.info(f"Message {i+1}/{num_messages} created in {creation_time:.3f} seconds")
+            except Exception as e:
+                failures += 1
+                logger.error(f"Failed to create message {i+1}: {str(e)}")
+
+    test_start = time.time()
+    await asyncio.gather(*(create(i) for i in range(num_messages)))
+    elapsed = time.time() - test_start
+
     logger.info("Performance Test Results:")
-    logger.info(f"Total messages created: {len(creation_times)}")
-    logger.info(f"Average creation time: {avg_time:.3f} seconds")
-    logger.info(f"Minimum creation time: {min_time:.3f} seconds")
-    logger.info(f"Maximum creation time: {max_time:.3f} seconds")
-    logger.info(f"Messages per second: {1/avg_time:.2f}")
+    logger.info(f"Total messages created: {creation_times.count} ({failures} failed)")
+    if not creation_times.count:
+        logger.error("No messages were created; nothing to report")
+        return
+
+    summary = creation_times.summary()
+    logger.info(f"Average creation time: {summary['avg']:.3f} seconds")
+    logger.info(f"Minimum creation time: {summary['min']:.3f} seconds")
+    logger.info(f"Maximum creation time: {summary['max']:.3f} seconds")
+    logger.info(f"p50/p99 creation time: {summary['p50']:.3f}/{summary['p99']:.3f} seconds")
+    logger.info(f"Messages per second: {creation_times.count / elapsed:.2f}")
 
 if __name__ == "__main__":
     asyncio.run(run_performance_test())
@@ -1,10 +1,10 @@
 from langchain_openai import ChatOpenAI
 from langchain.prompts.prompt import PromptTemplate
-from langchain_pinecone import PineconeVectorStore
-from langchain_openai import OpenAIEmbeddings
 import os
 from dotenv import load_dotenv
 
+from fakes.factory import make_embeddings, make_vectorstore, make_retriever
+
 load_dotenv()
 
 os.environ["PINECONE_API_KEY"] = os.getenv("PINECONE_API_KEY")
@@ -12,18 +12,20 @@ os.environ["LANGCHAIN_API_KEY"] = os.getenv("LANGCHAIN_API_KEY")
 os.environ["LANGCHAIN_TRACING_V2"] = os.getenv("LANGCHAIN_TRACING_V2")
 os.environ["LANGCHAIN_PROJECT"] = os.getenv("LANGCHAIN_PROJECT")
 PINECONE_INDEX = os.getenv("PINECONE_INDEX")
+# Vectors are stored per workspace, so queries name the workspace they search
+WORKSPACE_ID = os.getenv("WORKSPACE_ID")
 
 prompt = "What were the main is"
 
 # Note: we must use the same embedding model that we used when uploading the docs
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+embeddings = make_embeddings(model="text-embedding-3-large")
 
 # Querying the vector database for relevant docs
-document_vectorstore = PineconeVectorStore(index_name=PINECONE_INDEX, embedding=embeddings)
-retriever = document_vectorstore.as_retriever()
-context = retriever.invoke(prompt)
+document_vectorstore = make_vectorstore(index_name=PINECONE_INDEX, embedding=embeddings)
+retriever = make_retriever(document_vectorstore)
+context = retriever.invoke(prompt, filter={"workspace_id": WORKSPACE_ID})
 for doc in context:
-    print(f"Source: {doc.metadata['source']}\nContent: {doc.page_content}\n\n")
+    print(f"Source: {doc.metadata.get('source', doc.metadata.get('sender_name'))}\nContent: {doc.page_content}\n\n")
 print("__________________________")
 
 # Adding context to our prompt
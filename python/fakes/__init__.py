@@ -0,0 +1 @@
+# fake services package
\ No newline at end of file
@@ -0,0 +1,275 @@
+import argparse
+import asyncio
+import json
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+from .latency import LatencyModel
+
+logger = logging.getLogger('fake_appwrite')
+
+
+class AppwriteError(Exception):
+    def __init__(self, message: str, code: int, type: str):
+        super().__init__(message)
+        self.code = code
+        self.type = type
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+
+
+def _parse_query(query) -> dict:
+    return json.loads(query) if isinstance(query, str) else query
+
+
+def _matches(document: dict, query: dict) -> bool:
+    method = query['method']
+    if method in ('or', 'and'):
+        clauses = [_parse_query(q) for q in query.get('values', [])]
+        combine = any if method == 'or' else all
+        return combine(_matches(document, clause) for clause in clauses)
+
+    value = document.get(query.get('attribute'))
+    values = query.get('values', [])
+    if method == 'equal':
+        return any(v in values for v in value) if isinstance(value, list) else value in values
+    if method == 'notEqual':
+        return value not in values
+    if method == 'isNull':
+        return value is None
+    if method == 'isNotNull':
+        return value is not None
+    if value is None:
+        return False
+    if method == 'lessThan':
+        return value < values[0]
+    if method == 'lessThanEqual':
+        return value <= values[0]
+    if method == 'greaterThan':
+        return value > values[0]
+    if method == 'greaterThanEqual':
+        return value >= values[0]
+    if method == 'between':
+        return values[0] <= value <= values[1]
+    if method == 'startsWith':
+        return str(value).startswith(values[0])
+    if method == 'endsWith':
+        return str(value).endswith(values[0])
+    if method == 'search':
+        text = str(value).lower()
+        return all(word in text for word in str(values[0]).lower().split())
+    if method == 'contains':
+        if isinstance(value, list):
+            return any(v in value for v in values)
+        return any(str(v) in str(value) for v in values)
+    raise AppwriteError(f'Invalid query method: {method}', 400, 'general_query_invalid')
+
+
+class DocumentStore:
+    """In-memory databases -> collections -> documents, shaped like Appwrite's responses"""
+
+    def __init__(self):
+        self.collections: Dict[tuple, Dict[str, dict]] = {}
+
+    def _collection(self, database_id: str, collection_id: str) -> Dict[str, dict]:
+        return self.collections.setdefault((database_id, collection_id), {})
+
+    def create(self, database_id: str, collection_id: str, document_id: Optional[str], data: dict,
+               permissions: Optional[List[str]] = None) -> dict:
+        collection = self._collection(database_id, collection_id)
+        if not document_id or document_id == 'unique()':
+            document_id = uuid.uuid4().hex[:20]
+        if document_id in collection:
+            raise AppwriteError('Document with the requested ID already exists.', 409, 'document_already_exists')
+        now = _now()
+        document = {
+            **{key: value for key, value in data.items() if not key.startswith('$')},
+            '$id': document_id,
+            '$collectionId': collection_id,
+            '$databaseId': database_id,
+            '$createdAt': data.get('$createdAt', now),
+            '$updatedAt': now,
+            '$permissions': permissions or []
+        }
+        collection[document_id] = document
+        return document
+
+    def get(self, database_id: str, collection_id: str, document_id: str) -> dict:
+        document = self._collection(database_id, collection_id).get(document_id)
+        if document is None:
+            raise AppwriteError('Document with the requested ID could not be found.', 404, 'document_not_found')
+        return document
+
+    def update(self, database_id: str, collection_id: str, document_id: str, data: Optional[dict],
+               permissions: Optional[List[str]] = None) -> dict:
+        document = self.get(database_id, collection_id, document_id)
+        document.update({key: value for key, value in (data or {}).items() if not key.startswith('$')})
+        if permissions is not None:
+            document['$permissions'] = permissions
+        document['$updatedAt'] = _now()
+        return document
+
+    def delete(self, database_id: str, collection_id: str, document_id: str):
+        self.get(database_id, collection_id, document_id)
+        del self._collection(database_id, collection_id)[document_id]
+
+    def list(self, database_id: str, collection_id: str, queries: List[dict]) -> dict:
+        documents = list(self._collection(database_id, collection_id).values())
+        limit, offset, cursor, select, orders = 25, 0, None, None, []
+        for query in queries:
+            method = query['method']
+            if method == 'limit':
+                limit = int(query['values'][0])
+            elif method == 'offset':
+                offset = int(query['values'][0])
+            elif method in ('cursorAfter', 'cursorBefore'):
+                cursor = (method, query['values'][0])
+            elif method == 'select':
+                select = query['values']
+            elif method in ('orderAsc', 'orderDesc'):
+                orders.append((query['attribute'], method == 'orderDesc'))
+            else:
+                documents = [doc for doc in documents if _matches(doc, query)]
+
+        # Apply sort keys from last to first so the first one takes precedence
+        for attribute, descending in reversed(orders):
+            documents.sort(key=lambda doc: (doc.get(attribute) is None, doc.get(attribute)), reverse=descending)
+        total = len(documents)
+
+        if cursor:
+            ids = [doc['$id'] for doc in documents]
+            if cursor[1] not in ids:
+                raise AppwriteError(f'Document \'{cursor[1]}\' for the cursor could not be found.', 400,
+                                    'general_cursor_not_found')
+            position = ids.index(cursor[1])
+            documents = documents[position + 1:] if cursor[0] == 'cursorAfter' else documents[:position][::-1]
+        documents = documents[offset:offset + limit]
+        if cursor and cursor[0] == 'cursorBefore':
+            documents.reverse()
+        if select:
+            documents = [
+                {key: value for key, value in doc.items() if key in select or key.startswith('$')}
+                for doc in documents
+            ]
+        return {'total': total, 'documents': documents}
+
+    def load(self, seed: dict):
+        """Load {database_id: {collection_id: [documents]}}; documents may carry their own $id"""
+        for database_id, collections in seed.items():
+            for collection_id, documents in collections.items():
+                for document in documents:
+                    self.create(database_id, collection_id, document.get('$id'), document,
+                                document.get('$permissions'))
+
+
+def _error_response(error: AppwriteError) -> web.Response:
+    return web.json_response(
+        {'message': str(error), 'code': error.code, 'type': error.type, 'version': 'fake'},
+        status=error.code
+    )
+
+
+def _queries(request) -> List[dict]:
+    # The SDK flattens queries into queries[0]=..., queries[1]=...
+    keyed = [(key, value) for key, value in request.query.items() if key.startswith('queries')]
+    keyed.sort(key=lambda item: int(item[0][8:-1]) if item[0][8:-1].isdigit() else 0)
+    return [_parse_query(value) for _, value in keyed]
+
+
+def create_app(store: Optional[DocumentStore] = None, latency: Optional[LatencyModel] = None) -> web.Application:
+    """aiohttp application serving Appwrite's document endpoints under /v1"""
+    store = store or DocumentStore()
+    latency = latency or LatencyModel()
+    base = '/v1/databases/{database_id}/collections/{collection_id}/documents'
+
+    @web.middleware
+    async def errors(request, handler):
+        await latency.asleep()
+        try:
+            return await handler(request)
+        except AppwriteError as e:
+            return _error_response(e)
+
+    async def create_document(request):
+        body = await request.json()
+        document = store.create(
+            request.match_info['database_id'], request.match_info['collection_id'],
+            body.get('documentId'), body.get('data') or {}, body.get('permissions')
+        )
+        return web.json_response(document, status=201)
+
+    async def list_documents(request):
+        return web.json_response(store.list(
+            request.match_info['database_id'], request.match_info['collection_id'], _queries(request)
+        ))
+
+    async def get_document(request):
+        return web.json_response(store.get(
+            request.match_info['database_id'], request.match_info['collection_id'], request.match_info['document_id']
+        ))
+
+    async def update_document(request):
+        body = await request.json() if request.can_read_body else {}
+        return web.json_response(store.update(
+            request.match_info['database_id'], request.match_info['collection_id'], request.match_info['document_id'],
+            body.get('data'), body.get('permissions')
+        ))
+
+    async def delete_document(request):
+        store.delete(
+            request.match_info['database_id'], request.match_info['collection_id'], request.match_info['document_id']
+        )
+        return web.Response(status=204, content_type='text/plain')
+
+    async def health(request):
+        return web.json_response({'name': 'http', 'ping': 0, 'status': 'pass'})
+
+    app = web.Application(middlewares=[errors])
+    app['store'] = store
+    app.router.add_get('/v1/health', health)
+    app.router.add_post(base, create_document)
+    app.router.add_get(base, list_documents)
+    app.router.add_get(base + '/{document_id}', get_document)
+    app.router.add_patch(base + '/{document_id}', update_document)
+    app.router.add_put(base + '/{document_id}', update_document)
+    app.router.add_delete(base + '/{document_id}', delete_document)
+    return app
+
+
+async def start_server(host: str = 'localhost', port: int = 8090, store: Optional[DocumentStore] = None,
+                       latency: Optional[LatencyModel] = None) -> web.AppRunner:
+    """Start the stand-in in the running event loop; point PUBLIC_APPWRITE_ENDPOINT at http://host:port/v1"""
+    runner = web.AppRunner(create_app(store, latency), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Appwrite document API")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--seed', help="JSON file of {database_id: {collection_id: [documents]}}")
+    parser.add_argument('--latency', type=float, default=0.0, help="Mean added latency per request in seconds")
+    args = parser.parse_args()
+
+    store = DocumentStore()
+    if args.seed:
+        with open(args.seed) as f:
+            store.load(json.load(f))
+    await start_server(args.host, args.port, store, LatencyModel(args.latency, 0.5))
+    logger.info(f"Fake Appwrite listening at http://{args.host}:{args.port}/v1")
+
+    while True:
+        await asyncio.sleep(3600)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
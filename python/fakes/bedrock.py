@@ -0,0 +1,84 @@
+import base64
+import json
+import random
+import threading
+import time
+from io import BytesIO
+from typing import Optional
+
+from PIL import Image
+
+
+class StubThrottlingException(Exception):
+    """Mimics botocore's ClientError for a ThrottlingException"""
+
+    def __init__(self, operation_name: str = 'InvokeModel'):
+        self.response = {
+            'Error': {'Code': 'ThrottlingException', 'Message': 'Too many requests, please wait before trying again.'},
+            'ResponseMetadata': {'HTTPStatusCode': 429, 'HTTPHeaders': {}}
+        }
+        super().__init__(f"An error occurred (ThrottlingException) when calling the {operation_name} operation")
+
+
+class StubBedrockRuntime:
+    """
+    Offline stand-in for a boto3 `bedrock-runtime` client.
+
+    Implements `invoke_model` for Titan image generation requests with a
+    configurable latency distribution, and throttles callers that exceed
+    `max_concurrency` in-flight requests (or at `throttle_rate`), so batch
+    generators can be benchmarked without AWS access.
+    """
+
+    def __init__(
+        self,
+        latency_mean: float = 2.0,
+        latency_jitter: float = 0.5,
+        max_concurrency: Optional[int] = 4,
+        throttle_rate: float = 0.0,
+        image_size: int = 64,
+        seed: Optional[int] = None
+    ):
+        self.latency_mean = latency_mean
+        self.latency_jitter = latency_jitter
+        self.max_concurrency = max_concurrency
+        self.throttle_rate = throttle_rate
+        self.image_size = image_size
+        self.random = random.Random(seed)
+        self.in_flight = 0
+        self.calls = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def _render_image(self, seed: int) -> str:
+        color = random.Random(seed).randrange(0xFFFFFF)
+        image = Image.new('RGB', (self.image_size, self.image_size), (color >> 16, (color >> 8) & 0xFF, color & 0xFF))
+        buffer = BytesIO()
+        image.save(buffer, format='PNG')
+        return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+    def invoke_model(self, modelId: str, body: str, contentType: str = 'application/json', accept: str = 'application/json'):
+        request = json.loads(body)
+        config = request.get('imageGenerationConfig', {})
+
+        with self._lock:
+            self.calls += 1
+            over_limit = self.max_concurrency is not None and self.in_flight >= self.max_concurrency
+            if over_limit or self.random.random() < self.throttle_rate:
+                self.throttled += 1
+                raise StubThrottlingException()
+            self.in_flight += 1
+            latency = max(0.0, self.random.gauss(self.latency_mean, self.latency_jitter))
+
+        try:
+            time.sleep(latency)
+            seed = config.get('seed', 0)
+            images = [self._render_image(seed + n) for n in range(config.get('numberOfImages', 1))]
+            return {
+                'body': BytesIO(json.dumps({'images': images, 'error': None}).encode('utf-8')),
+                'contentType': accept,
+                'ResponseMetadata': {'HTTPStatusCode': 200}
+            }
+        finally:
+            with self._lock:
+                self.in_flight -= 1
@@ -0,0 +1,64 @@
+import hashlib
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+from .latency import LatencyModel
+
+_WORDS = (
+    "actually", "think", "channel", "point", "really", "agree", "though", "idea", "maybe", "interesting",
+    "because", "honestly", "data", "team", "question", "simple", "right", "wrong", "next", "plan"
+)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Offline stand-in for ChatOpenAI.
+
+    Responses are deterministic for a given prompt (a few filler words
+    chosen by hashing it) and each call waits for a latency sampled from the
+    configured distribution, so handlers can be load-tested without the API.
+    """
+
+    model_name: str = 'fake-chat'
+    temperature: float = 0.7
+    latency_mean: float = 1.0
+    latency_sigma: float = 0.5
+    latency_distribution: str = 'lognormal'
+    response_words: int = 40
+    seed: Optional[int] = None
+
+    _latency: LatencyModel = PrivateAttr()
+    _calls: int = PrivateAttr(default=0)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._latency = LatencyModel(self.latency_mean, self.latency_sigma, self.latency_distribution, self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return 'fake-chat'
+
+    @property
+    def calls(self) -> int:
+        return self._calls
+
+    def _respond(self, messages: List[BaseMessage]) -> ChatResult:
+        self._calls += 1
+        prompt = '\n'.join(str(message.content) for message in messages)
+        digest = hashlib.blake2b(prompt.encode('utf-8'), digest_size=32).digest()
+        words = [_WORDS[digest[i % len(digest)] % len(_WORDS)] for i in range(self.response_words)]
+        text = ' '.join(words).capitalize() + '.'
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        self._latency.sleep()
+        return self._respond(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        await self._latency.asleep()
+        return self._respond(messages)
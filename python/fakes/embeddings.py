@@ -0,0 +1,58 @@
+import hashlib
+import re
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .latency import LatencyModel
+
+_TOKEN = re.compile(r"\w+")
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic, offline stand-in for OpenAIEmbeddings.
+
+    Texts are embedded by feature hashing their lowercased word tokens into a
+    signed, L2-normalized vector, so identical texts always get identical
+    vectors and texts sharing words have a higher cosine similarity. Each
+    call can be delayed by a `latency` model to imitate the API round trip.
+    """
+
+    def __init__(self, dimensions: int = 3072, latency: Optional[LatencyModel] = None):
+        self.dimensions = dimensions
+        self.latency = latency or LatencyModel()
+        self.calls = 0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        # The whole text is hashed as well so that even "" gets a stable, non-zero vector
+        for token in _TOKEN.findall(text.lower()) + [f"\x00{text}"]:
+            digest = hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest()
+            value = int.from_bytes(digest, 'little')
+            vector[value % self.dimensions] += 1.0 if value >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.latency.sleep()
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        self.latency.sleep()
+        return self._embed(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        await self.latency.asleep()
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        await self.latency.asleep()
+        return self._embed(text)
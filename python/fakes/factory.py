@@ -0,0 +1,214 @@
+"""
+Client construction points shared by the bots and pipelines.
+
+With FAKE_SERVICES=1 these return the offline stand-ins from this package
+instead of OpenAI and Pinecone clients; Appwrite is redirected by pointing
+PUBLIC_APPWRITE_ENDPOINT at `python -m fakes.appwrite_server`.
+
+Stand-in latency is configured with FAKE_LLM_LATENCY (mean seconds),
+FAKE_LLM_SIGMA, FAKE_LLM_DISTRIBUTION, FAKE_EMBEDDING_LATENCY and
+FAKE_VECTOR_LATENCY.
+
+Vector stores are fronted by an in-process hot tier (retrieval.tiered)
+unless LOCAL_VECTOR_INDEX=0; it is tuned with LOCAL_INDEX_TTL (seconds),
+LOCAL_INDEX_HNSW_THRESHOLD, LOCAL_INDEX_MAX_VECTORS and
+LOCAL_INDEX_HYDRATE_LIMIT. make_retriever attaches a lexical index to the
+hot tier for hybrid search: LEXICAL_BACKEND=bm25 (default, in-process),
+meilisearch (MEILISEARCH_ENDPOINT, MEILISEARCH_ADMIN_API_KEY,
+MEILISEARCH_INDEX_NAME) or none. Processes that never make a retriever have
+none. The BM25 index loads a workspace's messages from the Appwrite messages
+collection in the background on its first query (search is vector-only until
+then) and holds at most LEXICAL_MAX_DOCUMENTS messages (default 100000).
+
+Vectors stay in the index's default namespace unless
+VECTOR_NAMESPACES=workspace, which partitions them into one Pinecone
+namespace per workspace (retrieval.namespaces). Turn it on only after
+loadEmbeddings/migrateNamespaces.py has moved the existing vectors;
+otherwise every read comes back empty.
+
+The embedding profile is set with EMBEDDING_DIMENSIONS (shortened
+text-embedding-3 output, e.g. 1024; unset keeps the model's full 3072) and
+LOCAL_INDEX_QUANTIZATION=none|int8|binary for the hot tier's brute-force
+partitions. Pinecone indexes have a fixed dimension, so a shortened profile
+needs a new index loaded with the same EMBEDDING_DIMENSIONS. Compare
+profiles first with `python -m benchmarks.embedding_eval`.
+"""
+import logging
+import os
+import threading
+
+from .latency import LatencyModel
+
+logger = logging.getLogger('factory')
+
+_stores = {}
+_tiers = {}
+_stores_lock = threading.RLock()
+
+
+def fake_services_enabled() -> bool:
+    return os.getenv('FAKE_SERVICES', '').lower() in ('1', 'true', 'yes')
+
+
+def local_index_enabled() -> bool:
+    return os.getenv('LOCAL_VECTOR_INDEX', '1').lower() in ('1', 'true', 'yes')
+
+
+def workspace_namespaces_enabled() -> bool:
+    return os.getenv('VECTOR_NAMESPACES', 'shared').lower() == 'workspace'
+
+
+def _latency(prefix: str, default_mean: float) -> LatencyModel:
+    return LatencyModel(
+        mean=float(os.getenv(f'{prefix}_LATENCY', default_mean)),
+        sigma=float(os.getenv(f'{prefix}_SIGMA', 0.5)),
+        distribution=os.getenv(f'{prefix}_DISTRIBUTION', 'lognormal')
+    )
+
+
+def embedding_dimensions():
+    value = os.getenv('EMBEDDING_DIMENSIONS', '')
+    return int(value) if value else None
+
+
+def make_embeddings(model: str = "text-embedding-3-large", **kwargs):
+    if 'dimensions' not in kwargs and embedding_dimensions():
+        kwargs['dimensions'] = embedding_dimensions()
+    if fake_services_enabled():
+        from .embeddings import FakeEmbeddings
+        return FakeEmbeddings(dimensions=kwargs.get('dimensions') or 3072,
+                              latency=_latency('FAKE_EMBEDDING', 0.05))
+    from langchain_openai import OpenAIEmbeddings
+    return OpenAIEmbeddings(model=model, **kwargs)
+
+
+def make_vectorstore(index_name: str, embedding, **kwargs):
+    """
+    Process-wide store per index name: Pinecone (or the in-memory stand-in)
+    behind the local hot tier. Stores pinned to a namespace skip the hot tier.
+    """
+    if not local_index_enabled() or kwargs.get('namespace'):
+        return make_cold_vectorstore(index_name, embedding, **kwargs)
+
+    from retrieval.local_index import LocalVectorIndex
+    from retrieval.tiered import EmbeddingMemo, TieredVectorStore
+    with _stores_lock:
+        key = index_name or 'fake-index'
+        if key not in _tiers:
+            memo = EmbeddingMemo(embedding)
+            local = LocalVectorIndex(
+                hnsw_threshold=int(os.getenv('LOCAL_INDEX_HNSW_THRESHOLD', '2000')),
+                max_vectors=int(os.getenv('LOCAL_INDEX_MAX_VECTORS', '200000')),
+                ttl=float(os.getenv('LOCAL_INDEX_TTL', '60')),
+                quantization=os.getenv('LOCAL_INDEX_QUANTIZATION', 'none')
+            )
+            _tiers[key] = TieredVectorStore(
+                make_cold_vectorstore(index_name, memo, **kwargs), memo, local,
+                hydrate_limit=int(os.getenv('LOCAL_INDEX_HYDRATE_LIMIT', '999')),
+                records=make_record_store(index_name, memo)
+            )
+        return _tiers[key]
+
+
+def make_lexical_index():
+    backend = os.getenv('LEXICAL_BACKEND', 'bm25').lower()
+    if backend == 'bm25':
+        from retrieval.lexical import BM25Index
+        return BM25Index(loader=_lexical_loader(),
+                         max_documents=int(os.getenv('LEXICAL_MAX_DOCUMENTS', '100000')))
+    if backend == 'meilisearch':
+        from retrieval.lexical import MeilisearchIndex
+        return MeilisearchIndex(
+            endpoint=os.getenv('MEILISEARCH_ENDPOINT'),
+            api_key=os.getenv('MEILISEARCH_ADMIN_API_KEY'),
+            index=os.getenv('MEILISEARCH_INDEX_NAME', 'messages')
+        )
+    return None
+
+
+def _lexical_loader():
+    """Reads a workspace's messages from Appwrite for the BM25 index, or None without an endpoint"""
+    endpoint = os.getenv('PUBLIC_APPWRITE_ENDPOINT')
+    if not endpoint:
+        logger.warning("PUBLIC_APPWRITE_ENDPOINT is not set; the BM25 index has no corpus and search is vector-only")
+        return None
+    from appwrite.client import Client
+    from appwrite.services.databases import Databases
+    from retrieval.lexical import appwrite_loader
+
+    client = Client()
+    client.set_endpoint(endpoint)
+    client.set_project(os.getenv('APPWRITE_PROJECT_ID'))
+    client.set_key(os.getenv('APPWRITE_API_KEY'))
+    return appwrite_loader(Databases(client))
+
+
+def make_retriever(vectorstore, **kwargs):
+    """
+    Hybrid lexical + vector retriever over a hot-tier store, attaching its
+    lexical index on first use; the store's plain retriever otherwise.
+    """
+    if not hasattr(vectorstore, 'lexical'):
+        return vectorstore.as_retriever(**kwargs)
+    with _stores_lock:
+        if vectorstore.lexical is None:
+            vectorstore.lexical = make_lexical_index()
+    if vectorstore.lexical is None:
+        return vectorstore.as_retriever(**kwargs)
+    from retrieval.hybrid import HybridRetriever
+    return HybridRetriever(vectorstore=vectorstore, lexical=vectorstore.lexical, **kwargs)
+
+
+def _fake_store(index_name: str, embedding, **kwargs):
+    from .vectorstore import InMemoryVectorStore
+    with _stores_lock:
+        key = index_name or 'fake-index'
+        if key not in _stores:
+            _stores[key] = InMemoryVectorStore(embedding, index_name=key,
+                                               latency=_latency('FAKE_VECTOR', 0.02), **kwargs)
+        return _stores[key]
+
+
+def make_index_vectorstore(index_name: str, embedding, **kwargs):
+    """PineconeVectorStore, or a process-wide in-memory store per index name, without namespace routing"""
+    if fake_services_enabled():
+        return _fake_store(index_name, embedding, **kwargs)
+    from langchain_pinecone import PineconeVectorStore
+    return PineconeVectorStore(index_name=index_name, embedding=embedding, **kwargs)
+
+
+def make_cold_vectorstore(index_name: str, embedding, **kwargs):
+    """make_index_vectorstore, routed to per-workspace namespaces unless pinned to a namespace"""
+    store = make_index_vectorstore(index_name, embedding, **kwargs)
+    if workspace_namespaces_enabled() and not kwargs.get('namespace'):
+        from retrieval.namespaces import WorkspaceNamespacedStore
+        return WorkspaceNamespacedStore(store)
+    return store
+
+
+def make_record_store(index_name: str, embedding=None):
+    """
+    Record-level access to an index (see retrieval.maintenance): a
+    PineconeRecords over its pinecone.Index, or the in-memory store itself.
+    """
+    if fake_services_enabled():
+        return _fake_store(index_name, embedding)
+    from pinecone import Pinecone
+    from retrieval.maintenance import PineconeRecords
+    return PineconeRecords(Pinecone(api_key=os.getenv('PINECONE_API_KEY')).Index(index_name))
+
+
+def make_chat_model(**kwargs):
+    """ChatOpenAI, or a FakeChatModel that keeps the requested model_name for labels"""
+    if fake_services_enabled():
+        from .chat import FakeChatModel
+        latency = _latency('FAKE_LLM', 1.0)
+        return FakeChatModel(
+            model_name=kwargs.get('model_name') or kwargs.get('model') or 'fake-chat',
+            temperature=kwargs.get('temperature', 0.7),
+            latency_mean=latency.mean,
+            latency_sigma=latency.sigma,
+            latency_distribution=latency.distribution
+        )
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(**kwargs)
@@ -0,0 +1,49 @@
+import asyncio
+import math
+import random
+import time
+from typing import Optional
+
+DISTRIBUTIONS = ('constant', 'normal', 'lognormal', 'exponential')
+
+
+class LatencyModel:
+    """
+    Simulated service latency in seconds.
+
+    `mean` is the mean of every distribution; `sigma` is the standard
+    deviation for 'normal' and the log-space sigma for 'lognormal', which
+    gives the long right tail typical of LLM APIs.
+    """
+
+    def __init__(self, mean: float = 0.0, sigma: float = 0.0, distribution: str = 'lognormal',
+                 seed: Optional[int] = None):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        self.mean = mean
+        self.sigma = sigma
+        self.distribution = distribution
+        self.random = random.Random(seed)
+
+    def sample(self) -> float:
+        if self.mean <= 0:
+            return 0.0
+        if self.distribution == 'constant':
+            return self.mean
+        if self.distribution == 'normal':
+            return max(0.0, self.random.gauss(self.mean, self.sigma))
+        if self.distribution == 'exponential':
+            return self.random.expovariate(1.0 / self.mean)
+        # lognormal with the requested mean: mu = ln(mean) - sigma^2 / 2
+        mu = math.log(self.mean) - self.sigma ** 2 / 2
+        return self.random.lognormvariate(mu, self.sigma)
+
+    def sleep(self):
+        delay = self.sample()
+        if delay:
+            time.sleep(delay)
+
+    async def asleep(self):
+        delay = self.sample()
+        if delay:
+            await asyncio.sleep(delay)
@@ -0,0 +1,253 @@
+import itertools
+import threading
+import uuid
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from retrieval.filters import matches_filter
+
+from .latency import LatencyModel
+
+
+class _Namespace:
+    __slots__ = ('ids', 'index', 'texts', 'metadatas', 'vectors', '_matrix')
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.index = {}
+        self.texts: List[str] = []
+        self.metadatas: List[dict] = []
+        self.vectors: List[np.ndarray] = []
+        self._matrix: Optional[np.ndarray] = None
+
+    def upsert(self, id: str, text: str, metadata: dict, vector: np.ndarray):
+        position = self.index.get(id)
+        if position is None:
+            self.index[id] = len(self.ids)
+            self.ids.append(id)
+            self.texts.append(text)
+            self.metadatas.append(metadata)
+            self.vectors.append(vector)
+        else:
+            self.texts[position] = text
+            self.metadatas[position] = metadata
+            self.vectors[position] = vector
+        self._matrix = None
+
+    def remove(self, positions: Iterable[int]):
+        drop = set(positions)
+        keep = [i for i in range(len(self.ids)) if i not in drop]
+        self.ids = [self.ids[i] for i in keep]
+        self.texts = [self.texts[i] for i in keep]
+        self.metadatas = [self.metadatas[i] for i in keep]
+        self.vectors = [self.vectors[i] for i in keep]
+        self.index = {id: i for i, id in enumerate(self.ids)}
+        self._matrix = None
+
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            self._matrix = np.vstack(self.vectors) if self.vectors else np.zeros((0, 0), dtype=np.float32)
+        return self._matrix
+
+
+class InMemoryVectorStore(VectorStore):
+    """
+    In-process stand-in for PineconeVectorStore.
+
+    Records live in per-namespace NumPy matrices and are scored by cosine
+    similarity, with Pinecone's metadata filter semantics (including its
+    numbers-only range operators). Upserts with an existing id overwrite the
+    record. `latency` delays every query and write to imitate the network.
+    """
+
+    def __init__(self, embedding: Embeddings, index_name: str = 'fake-index', namespace: Optional[str] = None,
+                 latency: Optional[LatencyModel] = None):
+        self._embedding = embedding
+        self.index_name = index_name
+        self.namespace = namespace
+        self.latency = latency or LatencyModel()
+        self._namespaces = {}
+        self._lock = threading.Lock()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def _namespace(self, namespace: Optional[str]) -> _Namespace:
+        name = namespace if namespace is not None else (self.namespace or '')
+        if name not in self._namespaces:
+            self._namespaces[name] = _Namespace()
+        return self._namespaces[name]
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None,
+                  namespace: Optional[str] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        vectors = self._embedding.embed_documents(texts)
+        self.latency.sleep()
+        with self._lock:
+            store = self._namespace(namespace)
+            for id, text, metadata, vector in zip(ids, texts, metadatas, vectors):
+                store.upsert(id, text, dict(metadata), np.asarray(vector, dtype=np.float32))
+        return ids
+
+    def add_documents(self, documents: List[Document], **kwargs: Any) -> List[str]:
+        if 'ids' not in kwargs and any(doc.id for doc in documents):
+            kwargs['ids'] = [doc.id or str(uuid.uuid4()) for doc in documents]
+        return self.add_texts(
+            [doc.page_content for doc in documents],
+            [doc.metadata for doc in documents],
+            **kwargs
+        )
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4, filter: Optional[dict] = None,
+                                               namespace: Optional[str] = None) -> List[Tuple[Document, float]]:
+        self.latency.sleep()
+        with self._lock:
+            store = self._namespace(namespace)
+            if not store.ids:
+                return []
+            candidates = np.array(
+                [i for i, metadata in enumerate(store.metadatas) if matches_filter(metadata, filter)],
+                dtype=np.int64
+            )
+            if not len(candidates):
+                return []
+            query = np.asarray(embedding, dtype=np.float32)
+            norm = np.linalg.norm(query)
+            matrix = store.matrix()[candidates]
+            scores = matrix @ query / ((np.linalg.norm(matrix, axis=1) * norm) + 1e-12)
+            top = np.argsort(-scores, kind='stable')[:k]
+            return [
+                (
+                    Document(
+                        id=store.ids[candidates[i]],
+                        page_content=store.texts[candidates[i]],
+                        metadata=dict(store.metadatas[candidates[i]])
+                    ),
+                    float(scores[i])
+                )
+                for i in top
+            ]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[dict] = None,
+                                     namespace: Optional[str] = None, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(
+            self._embedding.embed_query(query), k=k, filter=filter, namespace=namespace
+        )
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None,
+                          namespace: Optional[str] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter, namespace=namespace)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[dict] = None,
+                                    namespace: Optional[str] = None, **kwargs: Any) -> List[Document]:
+        return [
+            doc for doc, _ in
+            self.similarity_search_by_vector_with_score(embedding, k=k, filter=filter, namespace=namespace)
+        ]
+
+    def _select_relevance_score_fn(self):
+        # Cosine similarity in [-1, 1] -> relevance in [0, 1]
+        return lambda score: (score + 1) / 2
+
+    def delete(self, ids: Optional[List[str]] = None, delete_all: Optional[bool] = None,
+               namespace: Optional[str] = None, filter: Optional[dict] = None, **kwargs: Any) -> None:
+        self.latency.sleep()
+        with self._lock:
+            name = namespace if namespace is not None else (self.namespace or '')
+            if delete_all:
+                self._namespaces.pop(name, None)
+                return
+            store = self._namespace(namespace)
+            positions = set()
+            # Like Pinecone, a delete is by ids or else by filter
+            if ids:
+                positions.update(store.index[id] for id in ids if id in store.index)
+            elif filter:
+                positions.update(i for i, metadata in enumerate(store.metadatas) if matches_filter(metadata, filter))
+            if positions:
+                store.remove(positions)
+
+    def list_ids(self, namespace: Optional[str] = None, limit: int = 100,
+                 prefix: Optional[str] = None) -> Iterable[List[str]]:
+        """Pages of record ids, like Index.list"""
+        with self._lock:
+            ids = [id for id in self._namespace(namespace).ids if not prefix or id.startswith(prefix)]
+        for start in range(0, len(ids), limit):
+            yield ids[start:start + limit]
+
+    def list_namespaces(self) -> List[str]:
+        with self._lock:
+            return [name for name, store in self._namespaces.items() if store.ids]
+
+    def fetch_vectors(self, ids: List[str], namespace: Optional[str] = None) -> dict:
+        """{id: {'values', 'metadata'}} with the text under metadata['text'], like Index.fetch"""
+        self.latency.sleep()
+        with self._lock:
+            store = self._namespace(namespace)
+            return {
+                id: {
+                    'values': store.vectors[store.index[id]].tolist(),
+                    'metadata': {**store.metadatas[store.index[id]], 'text': store.texts[store.index[id]]}
+                }
+                for id in ids if id in store.index
+            }
+
+    def query_records(self, filter: Optional[dict], top_k: int, namespace: Optional[str] = None) -> List[dict]:
+        """Up to `top_k` {'id', 'values', 'metadata'} records matching `filter`, like Index.query with values"""
+        self.latency.sleep()
+        with self._lock:
+            store = self._namespace(namespace)
+            positions = (i for i, metadata in enumerate(store.metadatas) if matches_filter(metadata, filter))
+            return [
+                {
+                    'id': store.ids[i],
+                    'values': store.vectors[i].tolist(),
+                    'metadata': {**store.metadatas[i], 'text': store.texts[i]}
+                }
+                for i in itertools.islice(positions, top_k)
+            ]
+
+    def upsert_vectors(self, vectors: List[dict], namespace: Optional[str] = None):
+        """Write {'id', 'values', 'metadata'} records as returned by fetch_vectors, like Index.upsert"""
+        self.latency.sleep()
+        with self._lock:
+            store = self._namespace(namespace)
+            for vector in vectors:
+                metadata = dict(vector['metadata'])
+                text = metadata.pop('text', '')
+                store.upsert(vector['id'], text, metadata, np.asarray(vector['values'], dtype=np.float32))
+
+    def update_metadata(self, id: str, metadata: dict, namespace: Optional[str] = None):
+        """Merge `metadata` into a record's metadata, like Index.update(set_metadata=...)"""
+        self.latency.sleep()
+        with self._lock:
+            store = self._namespace(namespace)
+            if id in store.index:
+                store.metadatas[store.index[id]] = {**store.metadatas[store.index[id]], **metadata}
+
+    def get_by_ids(self, ids: List[str], namespace: Optional[str] = None) -> List[Document]:
+        with self._lock:
+            store = self._namespace(namespace)
+            return [
+                Document(id=id, page_content=store.texts[store.index[id]], metadata=dict(store.metadatas[store.index[id]]))
+                for id in ids if id in store.index
+            ]
+
+    def count(self, namespace: Optional[str] = None) -> int:
+        with self._lock:
+            return len(self._namespace(namespace).ids)
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None, **kwargs: Any) -> 'InMemoryVectorStore':
+        namespace = kwargs.pop('namespace', None)
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids, namespace=namespace)
+        return store
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Optional
+
+logger = logging.getLogger('image_cache')
+
+IMAGE_CACHE_DIR = os.getenv('IMAGE_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.image_cache'))
+
+
+def content_hash(data: bytes) -> str:
+    """SHA-256 of raw bytes, used as the object name on disk and for upload dedup"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class ImageCache:
+    """
+    Content-addressed on-disk cache for generated images.
+
+    Generation requests are keyed by (model, prompt, size, seed, extra params)
+    and point at an object named by the SHA-256 of its bytes, so identical
+    images are stored once. The manifest also remembers which storage file
+    already holds a given hash, letting callers skip duplicate uploads.
+
+    Layout:
+        <root>/objects/ab/abcdef...   image bytes
+        <root>/manifest.json          {"requests": {...}, "uploads": {...}} snapshot
+        <root>/manifest.jsonl         changes since the snapshot, one JSON line each
+
+    Each change is appended to the journal, so a write costs one line rather
+    than a rewrite of the whole manifest; the journal is folded into the
+    snapshot once it holds `compact_after` lines. Nothing is read or created
+    on disk until the cache is first used.
+    """
+
+    def __init__(self, root: str = IMAGE_CACHE_DIR, compact_after: int = 1000):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.manifest_path = os.path.join(root, 'manifest.json')
+        self.journal_path = os.path.join(root, 'manifest.jsonl')
+        self.compact_after = compact_after
+        self._journal_lines = 0
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._manifest: Optional[dict] = None
+
+    @property
+    def manifest(self) -> dict:
+        if self._manifest is None:
+            with self._load_lock:
+                if self._manifest is None:
+                    self._manifest = self._load_manifest()
+        return self._manifest
+
+    def _load_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path, 'r') as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            manifest = {}
+        manifest.setdefault('requests', {})
+        manifest.setdefault('uploads', {})
+        torn = False
+        try:
+            with open(self.journal_path, 'r') as f:
+                for line in f:
+                    try:
+                        self._apply(manifest, json.loads(line))
+                    except (json.JSONDecodeError, KeyError, TypeError):
+                        # A crash can leave the last line torn
+                        torn = True
+                        continue
+                    self._journal_lines += 1
+        except FileNotFoundError:
+            pass
+        if torn:
+            # Later appends would run on from the torn line
+            self._compact(manifest)
+        return manifest
+
+    @staticmethod
+    def _apply(manifest: dict, change: dict):
+        op = change['op']
+        if op == 'request':
+            manifest['requests'][change['key']] = change['entry']
+        elif op == 'upload':
+            manifest['uploads'].setdefault(change['bucket_id'], {})[change['digest']] = change['file_id']
+        elif op == 'forget':
+            manifest['uploads'].get(change['bucket_id'], {}).pop(change['digest'], None)
+
+    def _record(self, change: dict):
+        """Apply a change and append it to the journal; call with the lock held"""
+        self._apply(self.manifest, change)
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.journal_path, 'a') as f:
+            f.write(json.dumps(change) + '\n')
+        self._journal_lines += 1
+        if self._journal_lines >= self.compact_after:
+            self._compact()
+
+    def _compact(self, manifest: Optional[dict] = None):
+        # Write the snapshot to a temp file and swap so a crash never leaves a torn manifest;
+        # the journal is only dropped once the snapshot holds its changes
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest if manifest is None else manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+        os.remove(self.journal_path)
+        self._journal_lines = 0
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    @staticmethod
+    def make_key(model: str, prompt: str, size: str, seed: Optional[int] = None, **params) -> str:
+        """Stable key for a generation request"""
+        payload = json.dumps(
+            {'model': model, 'prompt': prompt, 'size': size, 'seed': seed, 'params': params},
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, model: str, prompt: str, size: str, seed: Optional[int] = None, **params) -> Optional[bytes]:
+        """Return cached image bytes for a request, or None on a miss"""
+        key = self.make_key(model, prompt, size, seed, **params)
+        with self._lock:
+            entry = self.manifest['requests'].get(key)
+        if not entry:
+            return None
+        try:
+            with open(self._object_path(entry['hash']), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        logger.info("Image cache hit for %s (%s)", model, prompt[:60])
+        return data
+
+    def put(self, model: str, prompt: str, size: str, seed: Optional[int], data: bytes, **params) -> str:
+        """Store image bytes for a request and return their content hash"""
+        digest = self.store_object(data)
+        key = self.make_key(model, prompt, size, seed, **params)
+        with self._lock:
+            self._record({'op': 'request', 'key': key, 'entry': {
+                'hash': digest,
+                'model': model,
+                'prompt': prompt,
+                'size': size,
+                'seed': seed,
+                'params': params,
+                'created_at': datetime.now().isoformat()
+            }})
+        return digest
+
+    def store_object(self, data: bytes) -> str:
+        """Write bytes under their content hash (no-op if already present)"""
+        digest = content_hash(data)
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return digest
+
+    def get_uploaded_file(self, bucket_id: str, digest: str) -> Optional[str]:
+        """File ID of a previous upload of these exact bytes to `bucket_id`"""
+        with self._lock:
+            return self.manifest['uploads'].get(bucket_id, {}).get(digest)
+
+    def record_upload(self, bucket_id: str, digest: str, file_id: str):
+        with self._lock:
+            self._record({'op': 'upload', 'bucket_id': bucket_id, 'digest': digest, 'file_id': file_id})
+
+    def forget_upload(self, bucket_id: str, digest: str):
+        """Drop a stale upload record, e.g. when the stored file was deleted"""
+        with self._lock:
+            if digest in self.manifest['uploads'].get(bucket_id, {}):
+                self._record({'op': 'forget', 'bucket_id': bucket_id, 'digest': digest})
+
+
+# Global instance; creates its directory on first write
+image_cache = ImageCache()
@@ -0,0 +1,177 @@
+import fnmatch
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
+from typing import Dict, Iterable, List, Optional
+
+from PIL import Image
+
+logger = logging.getLogger('image_processing')
+
+# Shared avatar encoding settings
+AVATAR_SIZES = (64, 128, 512)
+WEBP_QUALITY = 95
+WEBP_METHOD = 6
+
+
+def resize_square(image: Image.Image, size: int) -> Image.Image:
+    """Center-crop to a square and resize to `size` x `size`"""
+    width, height = image.size
+    side = min(width, height)
+    left = (width - side) // 2
+    top = (height - side) // 2
+    image = image.crop((left, top, left + side, top + side))
+    if side != size:
+        image = image.resize((size, size), Image.LANCZOS)
+    return image
+
+
+def encode_webp_image(
+    image: Image.Image,
+    size: Optional[int] = None,
+    quality: int = WEBP_QUALITY,
+    method: int = WEBP_METHOD
+) -> bytes:
+    """Encode an already decoded image as WebP, optionally resized to a square avatar; `image` is not modified"""
+    if size:
+        image = resize_square(image, size)
+    webp_buffer = BytesIO()
+    image.save(webp_buffer, format="WebP", quality=quality, method=method)
+    return webp_buffer.getvalue()
+
+
+def encode_webp(
+    image_bytes: bytes,
+    size: Optional[int] = None,
+    quality: int = WEBP_QUALITY,
+    method: int = WEBP_METHOD
+) -> bytes:
+    """Convert raw image bytes to WebP, optionally resized to a square avatar"""
+    with Image.open(BytesIO(image_bytes)) as image:
+        return encode_webp_image(image, size=size, quality=quality, method=method)
+
+
+def encode_webp_variants(
+    image_bytes: bytes,
+    sizes: Iterable[int] = AVATAR_SIZES,
+    quality: int = WEBP_QUALITY,
+    method: int = WEBP_METHOD
+) -> Dict[Optional[int], bytes]:
+    """Full-size WebP (key None) plus one square avatar per size, decoding the image once"""
+    with Image.open(BytesIO(image_bytes)) as image:
+        image.load()
+        return {
+            size: encode_webp_image(image, size=size, quality=quality, method=method)
+            for size in (None, *sizes)
+        }
+
+
+def output_paths(src_path: str, out_dir: str, sizes: Iterable[int]) -> Dict[Optional[int], str]:
+    """WebP paths for a source image: full size plus one per avatar size"""
+    stem = os.path.splitext(os.path.basename(src_path))[0]
+    paths = {None: os.path.join(out_dir, f"{stem}.webp")}
+    for size in sizes:
+        paths[size] = os.path.join(out_dir, f"{stem}_{size}.webp")
+    return paths
+
+
+def is_up_to_date(src_path: str, paths: Iterable[str]) -> bool:
+    """True if every output exists and is newer than the source"""
+    src_mtime = os.path.getmtime(src_path)
+    return all(os.path.exists(path) and os.path.getmtime(path) >= src_mtime for path in paths)
+
+
+def convert_file(
+    src_path: str,
+    out_dir: str,
+    sizes: Iterable[int] = AVATAR_SIZES,
+    quality: int = WEBP_QUALITY,
+    method: int = WEBP_METHOD,
+    force: bool = False
+) -> dict:
+    """
+    Convert one image to a full-size WebP plus resized avatar variants.
+
+    Runs in a worker process; returns a JSON-serializable timing record.
+    """
+    start = time.perf_counter()
+    paths = output_paths(src_path, out_dir, sizes)
+    if not force and is_up_to_date(src_path, paths.values()):
+        return {'file': src_path, 'skipped': True, 'seconds': time.perf_counter() - start}
+
+    timings = {}
+    decode_start = time.perf_counter()
+    with Image.open(src_path) as image:
+        # Decoded once; every size is cropped and resized from the same pixels
+        image.load()
+        timings['decode'] = time.perf_counter() - decode_start
+        for size, path in paths.items():
+            size_start = time.perf_counter()
+            webp_bytes = encode_webp_image(image, size=size, quality=quality, method=method)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(webp_bytes)
+            os.replace(tmp_path, path)
+            timings[str(size or 'full')] = time.perf_counter() - size_start
+
+    return {
+        'file': src_path,
+        'skipped': False,
+        'outputs': list(paths.values()),
+        'timings': timings,
+        'seconds': time.perf_counter() - start
+    }
+
+
+def convert_directory(
+    src_dir: str,
+    out_dir: Optional[str] = None,
+    pattern: str = 'profile_*.png',
+    sizes: Iterable[int] = AVATAR_SIZES,
+    workers: Optional[int] = None,
+    quality: int = WEBP_QUALITY,
+    method: int = WEBP_METHOD,
+    force: bool = False,
+    report_path: Optional[str] = None
+) -> List[dict]:
+    """
+    Convert every matching image in `src_dir` using a process pool.
+
+    Files whose outputs are newer than the input are skipped. Per-file timings
+    are returned and, if `report_path` is given, written there as JSON.
+    """
+    out_dir = out_dir or src_dir
+    os.makedirs(out_dir, exist_ok=True)
+    sizes = tuple(sizes)
+    files = sorted(
+        os.path.join(src_dir, name) for name in os.listdir(src_dir)
+        if fnmatch.fnmatch(name, pattern)
+    )
+
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(convert_file, path, out_dir, sizes, quality, method, force): path
+            for path in files
+        }
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logger.error("Failed to convert %s: %s", futures[future], str(e))
+                results.append({'file': futures[future], 'error': str(e)})
+
+    converted = sum(1 for r in results if r.get('skipped') is False)
+    skipped = sum(1 for r in results if r.get('skipped'))
+    logger.info("Converted %d, skipped %d, failed %d images in %.2fs",
+                converted, skipped, len(results) - converted - skipped, time.perf_counter() - start)
+
+    if report_path:
+        with open(report_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    return results
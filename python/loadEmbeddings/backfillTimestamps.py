@@ -0,0 +1,101 @@
+"""
+Backfill the numeric `ts` metadata field on message vectors.
+
+Older vectors only carry the ISO `timestamp` string, which Pinecone range
+filters cannot compare, so time-window queries skip them. This walks every
+record in every namespace of the index (or one namespace), parses `timestamp` and sets `ts`
+in place; vectors are not re-embedded. Records that already have `ts` are
+left alone, so the script can be re-run safely.
+
+    python loadEmbeddings/backfillTimestamps.py --index messages --dry-run
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+
+# Add the parent directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from fakes.factory import make_embeddings, make_record_store
+from retrieval.timestamps import TS_KEY, to_epoch
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s'
+)
+logger = logging.getLogger('backfill_timestamps')
+
+load_dotenv()
+
+
+def backfill(store, namespace: Optional[str] = None, batch_size: int = 100, workers: int = 8,
+             dry_run: bool = False) -> Counter:
+    """Set `ts` from `timestamp` on every record of `namespace` (default: all) that lacks it"""
+    counts = Counter()
+    namespaces = [namespace] if namespace is not None else store.list_namespaces()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for namespace in namespaces:
+            backfill_namespace(store, namespace, batch_size, executor, dry_run, counts)
+    return counts
+
+
+def backfill_namespace(store, namespace: str, batch_size: int, executor: ThreadPoolExecutor, dry_run: bool,
+                       counts: Counter):
+    for page in store.list_ids(namespace=namespace, limit=batch_size):
+        updates = []
+        for id, vector in store.fetch_vectors(list(page), namespace=namespace).items():
+            metadata = vector['metadata']
+            counts['scanned'] += 1
+            if isinstance(metadata.get(TS_KEY), (int, float)):
+                counts['already_set'] += 1
+                continue
+            try:
+                ts = to_epoch(metadata.get('timestamp'))
+            except ValueError:
+                ts = None
+            if ts is None:
+                counts['no_timestamp'] += 1
+                continue
+            updates.append((id, ts))
+
+        failed = 0
+        if not dry_run:
+            # Metadata updates are one request per record in Pinecone
+            futures = [executor.submit(store.update_metadata, id, {TS_KEY: ts}, namespace) for id, ts in updates]
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"Failed to update a record: {e}")
+        counts['failed'] += failed
+        counts['updated'] += len(updates) - failed
+        logger.info(f"Namespace '{namespace}': scanned {counts['scanned']} records, {counts['updated']} "
+                    f"{'to update' if dry_run else 'updated'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill numeric ts metadata on message vectors')
+    parser.add_argument('--index', default=os.getenv('PINECONE_INDEX', 'messages'))
+    parser.add_argument('--namespace', default=None)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--dry-run', action='store_true', help='Count records without updating them')
+    args = parser.parse_args()
+
+    store = make_record_store(args.index, make_embeddings(model="text-embedding-3-large"))
+    started = time.time()
+    counts = backfill(store, args.namespace, args.batch_size, args.workers, args.dry_run)
+    logger.info(f"Done in {time.time() - started:.1f}s: {dict(counts)}")
+
+
+if __name__ == '__main__':
+    main()
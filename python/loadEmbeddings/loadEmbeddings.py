@@ -2,12 +2,17 @@ import os
 from dotenv import load_dotenv
 from appwrite.client import Client
 from appwrite.services.databases import Databases
-from langchain_openai import OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
 from langchain.schema import Document
 import logging
-from datetime import datetime
 from appwrite.query import Query
+import sys
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from fakes.factory import make_embeddings, make_vectorstore
+from retrieval.timestamps import timestamp_metadata
 
 # Configure logging
 logging.basicConfig(
@@ -29,8 +34,8 @@ client.set_key(os.getenv('APPWRITE_API_KEY'))
 database = Databases(client)
 
 # Initialize LangChain components
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
-document_vectorstore = PineconeVectorStore(
+embeddings = make_embeddings(model="text-embedding-3-large")
+document_vectorstore = make_vectorstore(
     index_name=os.getenv('PINECONE_INDEX2'),
     embedding=embeddings
 )
@@ -61,10 +66,8 @@ def load_messages_to_pinecone():
             # Convert messages to documents
             documents = []
             for msg in messages['documents']:
-                # Convert timestamp to ISO format string if it exists
-                timestamp = msg.get('edited_at')
-                if timestamp:
-                    timestamp = datetime.fromisoformat(timestamp).isoformat()
+                # ISO timestamp for display plus numeric `ts` for range filters
+                timestamp = msg.get('edited_at') or msg.get('$createdAt')
                 
                 doc = Document(
                     page_content=msg['content'],
@@ -73,12 +76,12 @@ def load_messages_to_pinecone():
                         'workspace_id': msg['workspace_id'],
                         'sender_id': msg['sender_id'],
                         'sender_name': msg['sender_name'],
-                        'timestamp': timestamp or ''  # Use empty string if no timestamp
+                        **timestamp_metadata(timestamp)
                     }
                 )
                 documents.append(doc)
             
-            # Add documents to Pinecone
+            # Add documents to Pinecone, each in its workspace's namespace
             document_vectorstore.add_documents(documents)
             
             total_loaded += len(documents)
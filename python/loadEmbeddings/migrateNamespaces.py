@@ -0,0 +1,95 @@
+"""
+Move message vectors from the shared default namespace into per-workspace
+namespaces (ws-<workspace_id>), as written and queried with
+VECTOR_NAMESPACES=workspace.
+
+Vectors are copied with their values and metadata, so nothing is
+re-embedded. Each page is deleted from the source namespace only after it
+has been written to its workspace namespace; an interrupted run can be
+restarted. Vectors without a workspace_id are left where they are.
+
+Namespacing is off until VECTOR_NAMESPACES=workspace is set, so cut over
+in this order:
+
+1. Copy without deleting: --keep-source. Readers still use the default
+   namespace.
+2. Set VECTOR_NAMESPACES=workspace for every writer and reader (the bots,
+   the embeddings server and the Appwrite bot function), then restart them.
+3. Run again without --keep-source. This copies what was written in
+   between and empties the default namespace.
+
+    python loadEmbeddings/migrateNamespaces.py --index messages --dry-run
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Add the parent directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from fakes.factory import make_embeddings, make_record_store
+from retrieval.namespaces import NAMESPACE_PREFIX, workspace_namespace
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s'
+)
+logger = logging.getLogger('migrate_namespaces')
+
+load_dotenv()
+
+
+def migrate(store, source: str = '', batch_size: int = 100, keep_source: bool = False,
+            dry_run: bool = False) -> Counter:
+    """Copy every vector in `source` to its workspace namespace; returns counts per workspace and outcome"""
+    counts = Counter()
+    # Collect the ids first: deleting while paginating would shift the pages
+    pages = [list(page) for page in store.list_ids(namespace=source, limit=batch_size)]
+    for page in pages:
+        by_namespace = defaultdict(list)
+        for id, vector in store.fetch_vectors(page, namespace=source).items():
+            namespace = workspace_namespace(vector['metadata'].get('workspace_id'))
+            if namespace is None or namespace == source:
+                counts['skipped'] += 1
+                continue
+            by_namespace[namespace].append({'id': id, 'values': vector['values'], 'metadata': vector['metadata']})
+
+        moved = []
+        for namespace, vectors in by_namespace.items():
+            if not dry_run:
+                store.upsert_vectors(vectors, namespace=namespace)
+            moved.extend(vector['id'] for vector in vectors)
+            counts[namespace] += len(vectors)
+        if moved and not dry_run and not keep_source:
+            store.delete(ids=moved, namespace=source)
+        counts['moved'] += len(moved)
+        logger.info(f"{'Would move' if dry_run else 'Moved'} {counts['moved']} vectors "
+                    f"({counts['skipped']} without a workspace)")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Move vectors into per-workspace Pinecone namespaces')
+    parser.add_argument('--index', default=os.getenv('PINECONE_INDEX', 'messages'))
+    parser.add_argument('--source-namespace', default='', help="Namespace to migrate from (default namespace: '')")
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--keep-source', action='store_true', help='Copy without deleting the source vectors')
+    parser.add_argument('--dry-run', action='store_true', help='Count vectors per workspace without writing')
+    args = parser.parse_args()
+
+    store = make_record_store(args.index, make_embeddings(model="text-embedding-3-large"))
+    started = time.time()
+    counts = migrate(store, args.source_namespace, args.batch_size, args.keep_source, args.dry_run)
+    workspaces = {key: value for key, value in counts.items() if key.startswith(NAMESPACE_PREFIX)}
+    logger.info(f"Done in {time.time() - started:.1f}s: {counts['moved']} vectors into "
+                f"{len(workspaces)} workspace namespaces, {counts['skipped']} left in place")
+
+
+if __name__ == '__main__':
+    main()
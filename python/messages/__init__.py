@@ -0,0 +1 @@
+# messages package
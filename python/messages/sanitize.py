@@ -0,0 +1,99 @@
+"""
+Plain text and mentions of an incoming chat message's HTML.
+
+The editor sends message content as HTML, with mentions as
+<span data-mention="true" data-mention-id=".." data-mention-name="..">
+elements. sanitize_html_content() reads both in one pass of the stdlib's
+streaming HTMLParser, without building a document tree. Its output matches
+the BeautifulSoup(content, 'html.parser') version it replaced, which
+benchmarks/sanitize.py checks. The intended difference is in malformed
+character references, which now follow the HTML5 rules: "&amp" without a
+semicolon is decoded and "&bogus;" is kept as written.
+"""
+import re
+from html import unescape
+from html.parser import HTMLParser
+from typing import List, Tuple
+
+_WHITESPACE = re.compile(r'\s+')
+
+# Elements that never have content, so no end tag is waited for
+VOID_ELEMENTS = frozenset((
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem', 'meta', 'param',
+    'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex', 'nextid', 'spacer',
+))
+# Elements whose text is not part of the message's visible text
+HIDDEN_ELEMENTS = frozenset(('script', 'style', 'template', 'rt', 'rp'))
+
+
+class MessageHTMLParser(HTMLParser):
+    """
+    Collects visible text and mentions while tracking open elements, so that
+    an end tag closes everything opened after its start tag, as a tree
+    builder would. A mention's contents are replaced by @name.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.mentions: List[dict] = []
+        # (tag, opens a mention, hides text) for every open element
+        self._open: List[Tuple[str, bool, bool]] = []
+        self._mention_depth = 0
+        self._hidden_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        attributes = {name: '' if value is None else value for name, value in attrs}
+        is_mention = tag == 'span' and attributes.get('data-mention') == 'true'
+        if is_mention:
+            self.mentions.append({
+                'id': attributes['data-mention-id'],
+                'name': attributes['data-mention-name']
+            })
+            if not self._mention_depth:
+                self.parts.append(f"@{attributes['data-mention-name']}")
+        if tag in VOID_ELEMENTS:
+            return
+        hides = tag in HIDDEN_ELEMENTS
+        self._open.append((tag, is_mention, hides))
+        self._mention_depth += is_mention
+        self._hidden_depth += hides
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        for position in range(len(self._open) - 1, -1, -1):
+            if self._open[position][0] == tag:
+                for _, is_mention, hides in self._open[position:]:
+                    self._mention_depth -= is_mention
+                    self._hidden_depth -= hides
+                del self._open[position:]
+                return
+
+    def handle_data(self, data):
+        if not self._mention_depth and not self._hidden_depth:
+            self.parts.append(data)
+
+    def unknown_decl(self, data):
+        # CDATA sections are kept as text, even where other text is hidden
+        if data.startswith('CDATA[') and not self._mention_depth:
+            self.parts.append(data[len('CDATA['):])
+
+
+def sanitize_html_content(content: str) -> Tuple[str, List[dict]]:
+    """
+    Sanitize HTML content and extract mentions.
+    Returns (sanitized_text, mentions)
+    """
+    if '<' not in content:
+        # Plain text needs no parser
+        text = unescape(content) if '&' in content else content
+        return _WHITESPACE.sub(' ', text).strip(), []
+
+    parser = MessageHTMLParser()
+    parser.feed(content)
+    parser.close()
+    return _WHITESPACE.sub(' ', ''.join(parser.parts)).strip(), parser.mentions
@@ -0,0 +1,131 @@
+import math
+import time
+from typing import List
+
+from .registry import LabelSet
+
+NAMESPACE = 'chattie'
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+# Exported histogram bucket edges in seconds (internal log buckets are folded into these)
+BUCKET_BOUNDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(label_set: LabelSet, extra: tuple = ()) -> str:
+    pairs = list(extra) + list(label_set)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(str(value))}"' for key, value in pairs) + '}'
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _metric_name(name: str) -> str:
+    return f"{NAMESPACE}_{''.join(c if c.isalnum() else '_' for c in name)}"
+
+
+def render_openmetrics(metrics) -> str:
+    """
+    Render a PerformanceMetrics instance in OpenMetrics text format.
+
+    Operation histograms are exported as one family labeled by `operation`,
+    request latency as its own family, and registry counters/gauges as-is.
+    Every observation is in its metric's unlabeled aggregate and, when it
+    had labels, in a labeled series too, so the two are exported as
+    separate families: the *_duration_seconds families hold only the
+    aggregates and the *_labeled_duration_seconds families the per-label
+    breakdown. Summing within either family counts each observation once.
+    """
+    registry = metrics.registry
+    lines: List[str] = []
+
+    # Histograms
+    request_family = _metric_name('request_duration_seconds')
+    operation_family = _metric_name('operation_duration_seconds')
+    labeled_request_family = _metric_name('request_labeled_duration_seconds')
+    labeled_operation_family = _metric_name('operation_labeled_duration_seconds')
+    families = {request_family: [], operation_family: [], labeled_request_family: [], labeled_operation_family: []}
+    for name, label_set, series in registry.series():
+        if name == 'request':
+            family = labeled_request_family if label_set else request_family
+            families[family].append(((), label_set, series.cumulative))
+        else:
+            family = labeled_operation_family if label_set else operation_family
+            families[family].append(((('operation', name),), label_set, series.cumulative))
+
+    for family, entries in families.items():
+        lines.append(f"# TYPE {family} histogram")
+        lines.append(f"# UNIT {family} seconds")
+        for extra, label_set, histogram in entries:
+            cumulative = histogram.cumulative_counts(BUCKET_BOUNDS)
+            for bound, bucket_count in zip(BUCKET_BOUNDS, cumulative):
+                le = (('le', repr(float(bound))),)
+                lines.append(f"{family}_bucket{_labels(label_set, extra + le)} {bucket_count}")
+            lines.append(f"{family}_bucket{_labels(label_set, extra + (('le', '+Inf'),))} {histogram.count}")
+            lines.append(f"{family}_count{_labels(label_set, extra)} {histogram.count}")
+            lines.append(f"{family}_sum{_labels(label_set, extra)} {_number(histogram.total)}")
+
+    # Counters
+    counters = {}
+    for name, label_set, value in registry.counters():
+        counters.setdefault(name, []).append((label_set, value))
+    errors = _metric_name('errors')
+    lines.append(f"# TYPE {errors} counter")
+    for error_type, error_count in sorted(metrics.error_counts.items()):
+        lines.append(f"{errors}_total{_labels((('type', error_type),))} {error_count}")
+    for name, entries in sorted(counters.items()):
+        family = _metric_name(name)
+        lines.append(f"# TYPE {family} counter")
+        for label_set, value in entries:
+            lines.append(f"{family}_total{_labels(label_set)} {_number(value)}")
+
+    # Gauges
+    gauges = {}
+    for name, label_set, value in registry.gauges():
+        gauges.setdefault(name, []).append((label_set, value))
+    rps = _metric_name('requests_per_second')
+    gauges_out = [
+        (rps, [((), metrics.arrivals.rate(time.time(), metrics.window_size))])
+    ] + [(_metric_name(name), entries) for name, entries in sorted(gauges.items())]
+    for family, entries in gauges_out:
+        lines.append(f"# TYPE {family} gauge")
+        for label_set, value in entries:
+            lines.append(f"{family}{_labels(label_set)} {_number(value)}")
+
+    lines.append("# EOF")
+    return '\n'.join(lines) + '\n'
+
+
+async def metrics_handler(request):
+    """aiohttp handler for GET /metrics on the global performance_metrics instance"""
+    from aiohttp import web
+    from .performance_logger import performance_metrics
+
+    return web.Response(
+        body=render_openmetrics(performance_metrics).encode('utf-8'),
+        headers={'Content-Type': CONTENT_TYPE}
+    )
+
+
+def metrics_middleware_factory():
+    """aiohttp middleware that counts request arrivals and tracks in-flight HTTP requests as a gauge"""
+    from aiohttp import web
+    from .performance_logger import performance_metrics
+
+    @web.middleware
+    async def metrics_middleware(request, handler):
+        if request.path == '/metrics':
+            return await handler(request)
+        performance_metrics.record_arrival()
+        with performance_metrics.registry.track_in_flight('http_requests_in_flight'):
+            return await handler(request)
+
+    return metrics_middleware
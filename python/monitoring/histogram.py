@@ -0,0 +1,257 @@
+import math
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional
+
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+
+class LatencyHistogram:
+    """
+    Fixed-memory, log-bucketed latency histogram (HDR-style).
+
+    Bucket i covers [min_value * growth**i, min_value * growth**(i+1)), so the
+    relative error of any reported percentile is bounded by `precision`.
+    Values below `min_value` land in bucket 0 and values above `max_value` in
+    the last bucket. Recording a value is O(1); histograms with the same
+    parameters can be merged by adding their counts.
+    """
+
+    def __init__(self, min_value: float = 1e-5, max_value: float = 3600.0, precision: float = 0.02):
+        self.min_value = min_value
+        self.max_value = max_value
+        self.precision = precision
+        self._log_growth = math.log1p(precision)
+        self.num_buckets = int(math.ceil(math.log(max_value / min_value) / self._log_growth)) + 1
+        self.counts = array('q', [0]) * self.num_buckets
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def _bucket(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        index = int(math.log(value / self.min_value) / self._log_growth)
+        return min(index, self.num_buckets - 1)
+
+    def _bucket_value(self, index: int) -> float:
+        # Geometric midpoint of the bucket
+        return self.min_value * math.exp((index + 0.5) * self._log_growth)
+
+    def record(self, value: float, count: int = 1):
+        self.counts[self._bucket(value)] += count
+        self.count += count
+        self.total += value * count
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def reset(self):
+        self.counts = array('q', [0]) * self.num_buckets
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percentile: float) -> float:
+        if not self.count:
+            return 0.0
+        target = max(1, int(math.ceil(self.count * percentile / 100.0)))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if not bucket_count:
+                continue
+            seen += bucket_count
+            if seen >= target:
+                # Never report outside the observed range
+                return min(max(self._bucket_value(index), self.min), self.max)
+        return self.max
+
+    def percentiles(self, percentiles: Iterable[float] = PERCENTILES) -> Dict[str, float]:
+        """Several percentiles in one pass over the buckets"""
+        result = {}
+        if not self.count:
+            return {_percentile_name(p): 0.0 for p in percentiles}
+        targets = sorted((max(1, int(math.ceil(self.count * p / 100.0))), p) for p in percentiles)
+        seen = 0
+        position = 0
+        for index, bucket_count in enumerate(self.counts):
+            if not bucket_count:
+                continue
+            seen += bucket_count
+            while position < len(targets) and seen >= targets[position][0]:
+                value = min(max(self._bucket_value(index), self.min), self.max)
+                result[_percentile_name(targets[position][1])] = value
+                position += 1
+            if position == len(targets):
+                break
+        return result
+
+    def summary(self) -> dict:
+        """avg/min/max plus p50/p90/p99/p999, as reported in the metrics log"""
+        summary = {
+            'count': self.count,
+            'avg': self.mean,
+            'min': self.min if self.count else 0.0,
+            'max': self.max
+        }
+        summary.update(self.percentiles())
+        return summary
+
+    def cumulative_counts(self, bounds: Iterable[float]) -> List[int]:
+        """
+        Observations <= each bound, for exporting with fixed bucket edges.
+        A log bucket is counted under a bound once its upper edge is <= the bound.
+        """
+        result = []
+        bounds = sorted(bounds)
+        running = 0
+        index = 0
+        for bound in bounds:
+            while index < self.num_buckets and self.min_value * math.exp((index + 1) * self._log_growth) <= bound:
+                running += self.counts[index]
+                index += 1
+            result.append(running)
+        return result
+
+    def merge(self, other: 'LatencyHistogram'):
+        if (other.min_value, other.max_value, other.precision) != (self.min_value, self.max_value, self.precision):
+            raise ValueError("Cannot merge histograms with different bucket layouts")
+        for index, bucket_count in enumerate(other.counts):
+            if bucket_count:
+                self.counts[index] += bucket_count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def to_dict(self) -> dict:
+        """Sparse, JSON-serializable snapshot suitable for shipping between processes"""
+        return {
+            'min_value': self.min_value,
+            'max_value': self.max_value,
+            'precision': self.precision,
+            'count': self.count,
+            'total': self.total,
+            'min': self.min if self.count else None,
+            'max': self.max,
+            'buckets': {str(i): c for i, c in enumerate(self.counts) if c}
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'LatencyHistogram':
+        histogram = cls(data['min_value'], data['max_value'], data['precision'])
+        for index, bucket_count in data['buckets'].items():
+            histogram.counts[int(index)] = bucket_count
+        histogram.count = data['count']
+        histogram.total = data['total']
+        histogram.min = data['min'] if data['min'] is not None else math.inf
+        histogram.max = data['max']
+        return histogram
+
+
+class RateCounter:
+    """
+    Event counter over a sliding window of one-second buckets.
+
+    Each bucket remembers which wall-clock second it holds, so stale buckets
+    are recycled lazily and recording stays O(1).
+    """
+
+    def __init__(self, window_seconds: int = 60):
+        self.window_seconds = window_seconds
+        self.seconds = array('q', [-1]) * window_seconds
+        self.counts = array('q', [0]) * window_seconds
+        self.total = 0
+
+    def record(self, timestamp: Optional[float] = None, count: int = 1):
+        self._add(int(timestamp if timestamp is not None else time.time()), count)
+        self.total += count
+
+    def _add(self, second: int, count: int):
+        slot = second % self.window_seconds
+        if self.seconds[slot] > second:
+            return  # older than the window already covers
+        if self.seconds[slot] != second:
+            self.seconds[slot] = second
+            self.counts[slot] = 0
+        self.counts[slot] += count
+
+    def count_between(self, start_second: int, end_second: int) -> int:
+        """Events in whole seconds [start_second, end_second)"""
+        return sum(
+            c for s, c in zip(self.seconds, self.counts)
+            if start_second <= s < end_second
+        )
+
+    def last_second(self, now: Optional[float] = None) -> int:
+        """Events in the last complete second"""
+        current = int(now if now is not None else time.time())
+        return self.count_between(current - 1, current)
+
+    def rate(self, now: Optional[float] = None, seconds: Optional[int] = None) -> float:
+        """Average events per second over the last `seconds` complete seconds"""
+        seconds = min(seconds or self.window_seconds - 1, self.window_seconds - 1)
+        current = int(now if now is not None else time.time())
+        return self.count_between(current - seconds, current) / seconds
+
+    def to_dict(self) -> dict:
+        return {
+            'window_seconds': self.window_seconds,
+            'total': self.total,
+            'buckets': {str(s): c for s, c in zip(self.seconds, self.counts) if s >= 0 and c}
+        }
+
+    def merge(self, other: 'RateCounter'):
+        for second, bucket_count in zip(other.seconds, other.counts):
+            if second >= 0 and bucket_count:
+                self._add(second, bucket_count)
+        self.total += other.total
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'RateCounter':
+        counter = cls(data['window_seconds'])
+        for second, bucket_count in data['buckets'].items():
+            counter._add(int(second), bucket_count)
+        counter.total = data['total']
+        return counter
+
+
+def merge_snapshots(snapshots: List[dict]) -> dict:
+    """
+    Merge `PerformanceMetrics.snapshot()` outputs from several worker processes
+    into one snapshot with combined histograms, rates and error counts.
+    """
+    histograms: Dict[str, LatencyHistogram] = {}
+    arrivals: Optional[RateCounter] = None
+    errors: Dict[str, int] = {}
+    for snapshot in snapshots:
+        for name, data in snapshot['histograms'].items():
+            histogram = LatencyHistogram.from_dict(data)
+            if name in histograms:
+                histograms[name].merge(histogram)
+            else:
+                histograms[name] = histogram
+        counter = RateCounter.from_dict(snapshot['arrivals'])
+        if arrivals is None:
+            arrivals = counter
+        else:
+            arrivals.merge(counter)
+        for error_type, error_count in snapshot['error_counts'].items():
+            errors[error_type] = errors.get(error_type, 0) + error_count
+    return {
+        'histograms': {name: h.to_dict() for name, h in histograms.items()},
+        'arrivals': arrivals.to_dict() if arrivals else RateCounter().to_dict(),
+        'error_counts': errors
+    }
+
+
+def _percentile_name(percentile: float) -> str:
+    # 50 -> p50, 99.9 -> p999
+    return 'p' + f"{percentile:g}".replace('.', '')
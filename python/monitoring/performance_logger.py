@@ -1,25 +1,37 @@
-from collections import deque
 import time
 from datetime import datetime
 import json
 import asyncio
 import logging
-from typing import Dict, List, Deque
-import statistics
+import logging.handlers
+import queue
+from typing import Dict
 import os
 
+from .histogram import RateCounter
+from .registry import MetricsRegistry, series_name
+from .sink import MetricsSink
+
+REQUEST_METRIC = 'request'
+
+# Operations reported from startup; any other operation is registered on first use
+OPERATIONS = (
+    'total_processing',
+    'db_operations',
+    'vector_store',
+    'llm_processing',
+    'message_queue'
+)
+
 class PerformanceMetrics:
-    def __init__(self, window_size: int = 60):
-        self.window_size = window_size  # Keep last 60 seconds of data
-        self.request_times: Deque[float] = deque(maxlen=window_size)
-        self.operation_times: Dict[str, Deque[float]] = {
-            'total_processing': deque(maxlen=window_size),
-            'db_operations': deque(maxlen=window_size),
-            'vector_store': deque(maxlen=window_size),
-            'llm_processing': deque(maxlen=window_size),
-            'message_queue': deque(maxlen=window_size)
-        }
-        self.requests_per_second: Deque[int] = deque(maxlen=window_size)
+    def __init__(self, window_size: int = 60, max_series_per_metric: int = 500):
+        self.window_size = window_size  # Seconds of arrival history used for RPS
+        # Latency histograms per operation, created on first use and optionally labeled
+        self.registry = MetricsRegistry(max_series_per_metric=max_series_per_metric)
+        self.registry.register(REQUEST_METRIC)
+        for op in OPERATIONS:
+            self.registry.register(op)
+        self.arrivals = RateCounter(window_seconds=window_size + 1)
         self.error_counts: Dict[str, int] = {}
         self.last_update = time.time()
         
@@ -31,66 +43,105 @@ class PerformanceMetrics:
         self.logger.setLevel(logging.INFO)
         self.logger.propagate = False  # Prevent propagation to root logger
         
-        # File handler for continuous metrics
-        metrics_handler = logging.FileHandler('logs/performance_metrics.log')
+        # Rotating file handler for continuous metrics, fed through a queue so
+        # the event loop never blocks on disk I/O
+        metrics_handler = logging.handlers.RotatingFileHandler(
+            'logs/performance_metrics.log',
+            maxBytes=20 * 1024 * 1024,
+            backupCount=5
+        )
         metrics_handler.setFormatter(
             logging.Formatter('%(asctime)s - %(message)s')
         )
-        self.logger.addHandler(metrics_handler)
+        log_queue = queue.SimpleQueue()
+        self.logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        self.log_listener = logging.handlers.QueueListener(log_queue, metrics_handler)
+        self.log_listener.start()
+
+        # Detailed metrics for visualization, written by a background thread with rotation
+        self.sink = MetricsSink('logs/detailed_metrics.json')
+
+    def record_arrival(self):
+        """Count a request towards RPS; called when the request arrives, not when it completes"""
+        self.arrivals.record(time.time())
 
-    def add_request_time(self, duration: float):
+    def add_request_time(self, duration: float, **labels):
         """Add a new request processing time"""
-        self.request_times.append(duration)
+        self.registry.observe(REQUEST_METRIC, duration, **labels)
 
-    def add_operation_time(self, operation: str, duration: float):
-        """Add processing time for a specific operation"""
-        if operation in self.operation_times:
-            self.operation_times[operation].append(duration)
+    def add_operation_time(self, operation: str, duration: float, **labels):
+        """
+        Add processing time for an operation. Unknown operations are created on
+        first use; labels (workspace_id, persona_id, command, model, ...) add a
+        per-label-set series next to the operation's aggregate.
+        """
+        self.registry.observe(operation, duration, **labels)
 
     def log_error(self, error_type: str):
         """Log an error occurrence"""
         self.error_counts[error_type] = self.error_counts.get(error_type, 0) + 1
 
     def calculate_metrics(self) -> dict:
-        """Calculate current performance metrics"""
+        """Calculate performance metrics for the interval since the last call"""
         current_time = time.time()
-        
-        # Calculate requests per second
-        requests_last_second = len([t for t in self.request_times 
-                                  if current_time - t <= 1])
-        self.requests_per_second.append(requests_last_second)
+        request_times = self.registry.aggregate(REQUEST_METRIC).interval
+
+        operation_times = {}
+        labeled_operation_times = []
+        for name, label_set, series in self.registry.series():
+            if name == REQUEST_METRIC:
+                continue
+            if not label_set:
+                operation_times[name] = series.interval.summary()
+            elif series.interval.count:
+                labeled_operation_times.append({
+                    'operation': name,
+                    'labels': dict(label_set),
+                    **series.interval.summary()
+                })
 
         metrics = {
             'timestamp': datetime.now().isoformat(),
-            'requests_per_second': requests_last_second,
-            'avg_request_time': statistics.mean(self.request_times) if self.request_times else 0,
-            'operation_times': {
-                op: {
-                    'avg': statistics.mean(times) if times else 0,
-                    'min': min(times) if times else 0,
-                    'max': max(times) if times else 0
-                }
-                for op, times in self.operation_times.items()
-            },
+            'requests_per_second': self.arrivals.last_second(current_time),
+            'avg_request_time': request_times.mean,
+            'request_time': request_times.summary(),
+            'operation_times': operation_times,
+            'labeled_operation_times': labeled_operation_times,
             'error_counts': self.error_counts.copy(),
-            'avg_rps_window': statistics.mean(self.requests_per_second) if self.requests_per_second else 0
+            'avg_rps_window': self.arrivals.rate(current_time, self.window_size)
         }
+
+        # Start a fresh reporting interval
+        self.registry.reset_interval()
+        self.last_update = current_time
         
         return metrics
 
+    def snapshot(self) -> dict:
+        """
+        Cumulative histograms and arrival counts in a mergeable form.
+        Combine snapshots from several worker processes with `merge_snapshots`.
+        """
+        return {
+            'histograms': {
+                series_name(name, label_set): series.cumulative.to_dict()
+                for name, label_set, series in self.registry.series()
+            },
+            'arrivals': self.arrivals.to_dict(),
+            'error_counts': self.error_counts.copy()
+        }
+
     async def start_monitoring(self):
         """Start continuous monitoring and logging"""
         while True:
             try:
                 metrics = self.calculate_metrics()
                 
-                # Log metrics to files only
+                # Log metrics to files only; both writes are handed to background threads
                 self.logger.info(json.dumps(metrics))
                 
                 # Save detailed metrics to a separate file for visualization
-                with open('logs/detailed_metrics.json', 'a') as f:
-                    json.dump(metrics, f)
-                    f.write('\n')
+                self.sink.write(metrics)
                 
                 await asyncio.sleep(1)  # Update every second
                 
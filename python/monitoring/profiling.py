@@ -0,0 +1,167 @@
+import cProfile
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional
+
+logger = logging.getLogger('profiling')
+
+_SAFE_ID = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+class StackSampler:
+    """
+    Statistical wall-clock profiler for one thread.
+
+    A daemon thread samples the target thread's stack every `interval`
+    seconds and counts identical stacks, which are written in collapsed
+    ("folded") format for flame graph tools. Time spent waiting on I/O shows
+    up under the event loop's select call.
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = 0.005):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        if stack:
+            self.samples[';'.join(reversed(stack))] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def write_collapsed(self, path: str):
+        with open(path, 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class RequestProfiler:
+    """
+    Opt-in profiling of individual requests.
+
+    A request is profiled when it carries the `header` with the configured
+    `token`, or is picked at `sample_rate`. Without a token the header is
+    ignored, so clients cannot force profiling. Mode 'cprofile' saves
+    deterministic pstats to <output_dir>/<request id>.prof; mode 'sample'
+    saves collapsed stacks to <request id>.folded. The file is written on a
+    background thread. Only one request is profiled at a time; a request
+    that would overlap is skipped. Requests that are not profiled only pay
+    for a header lookup.
+
+    Both modes profile the event-loop thread, not the request. Work for
+    other requests that runs on the loop while the profiled one is awaiting
+    is attributed to it. Profiles are only clean when the server is
+    otherwise idle.
+    """
+
+    def __init__(self, output_dir: str = 'logs/profiles', mode: str = 'cprofile', sample_rate: float = 0.0,
+                 header: str = 'X-Profile', token: Optional[str] = None, interval: float = 0.005):
+        if mode not in ('cprofile', 'sample'):
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        self.output_dir = output_dir
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self.header = header
+        self.token = token
+        self.interval = interval
+        self._active = threading.Lock()
+
+    def should_profile(self, headers) -> bool:
+        value = headers.get(self.header)
+        if value is not None:
+            return self.token is not None and value == self.token
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def request_id(self, headers) -> str:
+        request_id = headers.get('X-Request-Id') or uuid.uuid4().hex
+        return _SAFE_ID.sub('_', request_id)[:64]
+
+    @contextmanager
+    def maybe_profile(self, request):
+        """Profile the enclosed block if `request` opts in; yields the profile path or None"""
+        if not self.should_profile(request.headers) or not self._active.acquire(blocking=False):
+            yield None
+            return
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            request_id = self.request_id(request.headers)
+            with self.profile(request_id) as path:
+                yield path
+        finally:
+            self._active.release()
+
+    @contextmanager
+    def profile(self, request_id: str):
+        start = time.perf_counter()
+        if self.mode == 'cprofile':
+            path = os.path.join(self.output_dir, f"{request_id}.prof")
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield path
+            finally:
+                profiler.disable()
+                self._write(profiler.dump_stats, path)
+        else:
+            path = os.path.join(self.output_dir, f"{request_id}.folded")
+            sampler = StackSampler(interval=self.interval)
+            sampler.start()
+            try:
+                yield path
+            finally:
+                sampler.stop()
+                self._write(sampler.write_collapsed, path)
+        logger.info(f"Profiled request {request_id} ({time.perf_counter() - start:.2f}s) -> {path}")
+
+    @staticmethod
+    def _write(write, path: str):
+        """Write a finished profile off the event loop"""
+        def run():
+            try:
+                write(path)
+            except OSError as e:
+                logger.error(f"Failed to write profile {path}: {e}")
+        threading.Thread(target=run, name='profile-writer', daemon=True).start()
+
+
+def profiler_from_env() -> RequestProfiler:
+    """
+    Build a request profiler from environment variables:
+    PROFILE_MODE (cprofile or sample), PROFILE_SAMPLE_RATE, PROFILE_DIR,
+    PROFILE_HEADER and PROFILE_TOKEN. The header only triggers profiling
+    when PROFILE_TOKEN is set.
+    """
+    return RequestProfiler(
+        output_dir=os.getenv('PROFILE_DIR', 'logs/profiles'),
+        mode=os.getenv('PROFILE_MODE', 'cprofile'),
+        sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', '0')),
+        header=os.getenv('PROFILE_HEADER', 'X-Profile'),
+        token=os.getenv('PROFILE_TOKEN') or None
+    )
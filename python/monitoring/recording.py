@@ -0,0 +1,81 @@
+import json
+import logging
+import os
+import random
+import time
+from typing import Optional
+
+from .sink import MetricsSink, load_history
+
+logger = logging.getLogger('recording')
+
+
+class WebhookRecorder:
+    """
+    Records incoming webhook payloads with their arrival time for later replay.
+
+    Each request becomes one compact NDJSON line, {"t": epoch seconds,
+    "path": request path, "body": parsed JSON payload}, written through a
+    MetricsSink so recording never blocks the handler. Headers are not kept.
+    A disabled recorder (no path) costs one attribute check per request.
+    """
+
+    def __init__(self, path: Optional[str] = None, sample_rate: float = 1.0,
+                 max_bytes: int = 100 * 1024 * 1024, backup_count: int = 10):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.sink = MetricsSink(path, max_bytes=max_bytes, rotate_seconds=None, backup_count=backup_count,
+                                retention_seconds=None) if path else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.sink is not None
+
+    def record(self, path: str, body: bytes, received: Optional[float] = None):
+        if not self.enabled or (self.sample_rate < 1.0 and random.random() >= self.sample_rate):
+            return
+        try:
+            payload = json.loads(body)
+        except (ValueError, UnicodeDecodeError):
+            payload = body.decode('utf-8', 'replace')
+        self.sink.write({'t': round(received or time.time(), 3), 'path': path, 'body': payload})
+
+    def close(self):
+        if self.sink is not None:
+            self.sink.close()
+
+
+def recording_middleware_factory(recorder: WebhookRecorder):
+    """aiohttp middleware that records POST bodies before they reach the handler"""
+    from aiohttp import web
+
+    @web.middleware
+    async def recording_middleware(request, handler):
+        if recorder.enabled and request.method == 'POST':
+            received = time.time()
+            try:
+                # aiohttp caches the body, so the handler can still read it
+                recorder.record(request.path, await request.read(), received)
+            except Exception as e:
+                logger.warning(f"Could not record webhook: {e}")
+        return await handler(request)
+
+    return recording_middleware
+
+
+def recorder_from_env() -> WebhookRecorder:
+    """
+    Build a webhook recorder from environment variables: WEBHOOK_RECORD_FILE
+    (recording is off when unset) and WEBHOOK_RECORD_SAMPLE_RATE.
+    """
+    return WebhookRecorder(
+        path=os.getenv('WEBHOOK_RECORD_FILE') or None,
+        sample_rate=float(os.getenv('WEBHOOK_RECORD_SAMPLE_RATE', '1'))
+    )
+
+
+def load_recording(path: str) -> list:
+    """Recorded requests from the file and its rotated backups, in arrival order"""
+    records = [record for record in load_history(path) if 't' in record and 'body' in record]
+    records.sort(key=lambda record: record['t'])
+    return records
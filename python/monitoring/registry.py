@@ -0,0 +1,163 @@
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from .histogram import LatencyHistogram
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+# Label values used once a metric has reached its series limit
+OVERFLOW_VALUE = '__other__'
+
+
+def make_label_set(labels: dict) -> LabelSet:
+    """Normalize labels to a hashable, order-independent key; None values are dropped"""
+    return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+
+def series_name(name: str, label_set: LabelSet) -> str:
+    """Prometheus-style series id, e.g. llm_processing{model="gpt-4o-mini"}"""
+    if not label_set:
+        return name
+    rendered = ','.join(f'{key}="{value}"' for key, value in label_set)
+    return f"{name}{{{rendered}}}"
+
+
+class HistogramSeries:
+    """
+    Cumulative histogram plus one for the current reporting interval.
+    Recording and resetting take the series' lock, since the embeddings
+    server records from several threads.
+    """
+
+    __slots__ = ('cumulative', 'interval', '_lock')
+
+    def __init__(self):
+        self.cumulative = LatencyHistogram()
+        self.interval = LatencyHistogram()
+        self._lock = threading.Lock()
+
+    def record(self, value: float):
+        with self._lock:
+            self.cumulative.record(value)
+            self.interval.record(value)
+
+    def reset_interval(self):
+        with self._lock:
+            self.interval.reset()
+
+
+class MetricsRegistry:
+    """
+    Registry of labeled latency histograms, counters and gauges, created on first use.
+
+    Every histogram observation is recorded in the metric's unlabeled aggregate
+    series and, when labels are given, in the labeled series as well. To keep
+    memory bounded, each metric holds at most `max_series_per_metric` labeled
+    series; further label sets are folded into a single overflow series whose
+    label values are all `__other__`.
+    """
+
+    def __init__(self, max_series_per_metric: int = 500):
+        self.max_series_per_metric = max_series_per_metric
+        self._histograms: Dict[str, Dict[LabelSet, HistogramSeries]] = {}
+        self._counters: Dict[str, Dict[LabelSet, float]] = {}
+        self._gauges: Dict[str, Dict[LabelSet, float]] = {}
+        self._gauge_callbacks: Dict[str, Callable[[], float]] = {}
+        self.dropped_label_sets: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _limit(self, name: str, metric: dict, label_set: LabelSet) -> LabelSet:
+        """Fold new label sets into the overflow series once a metric is full"""
+        if label_set and label_set not in metric and len(metric) > self.max_series_per_metric:
+            self.dropped_label_sets[name] = self.dropped_label_sets.get(name, 0) + 1
+            return tuple((key, OVERFLOW_VALUE) for key, _ in label_set)
+        return label_set
+
+    def _series(self, name: str, label_set: LabelSet) -> HistogramSeries:
+        metric = self._histograms.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._histograms.setdefault(name, {(): HistogramSeries()})
+        series = metric.get(label_set)
+        if series is not None:
+            return series
+        with self._lock:
+            label_set = self._limit(name, metric, label_set)
+            return metric.setdefault(label_set, HistogramSeries())
+
+    def register(self, name: str):
+        """Create a metric up front so it is reported even before its first observation"""
+        self._series(name, ())
+
+    def observe(self, name: str, value: float, **labels):
+        """Record a duration for `name`, creating the metric on first use"""
+        self._series(name, ()).record(value)
+        label_set = make_label_set(labels)
+        if label_set:
+            self._series(name, label_set).record(value)
+
+    def names(self) -> Iterator[str]:
+        return iter(list(self._histograms))
+
+    def series(self, name: Optional[str] = None) -> Iterator[Tuple[str, LabelSet, HistogramSeries]]:
+        """Iterate (metric name, label set, series), optionally for a single metric"""
+        names = [name] if name is not None else list(self._histograms)
+        for metric_name in names:
+            for label_set, series in list(self._histograms.get(metric_name, {}).items()):
+                yield metric_name, label_set, series
+
+    def aggregate(self, name: str) -> HistogramSeries:
+        """The unlabeled series for a metric"""
+        return self._series(name, ())
+
+    def reset_interval(self):
+        for _, _, series in self.series():
+            series.reset_interval()
+
+    def inc(self, name: str, amount: float = 1.0, **labels):
+        """Increment a monotonic counter"""
+        with self._lock:
+            metric = self._counters.setdefault(name, {})
+            label_set = self._limit(name, metric, make_label_set(labels))
+            metric[label_set] = metric.get(label_set, 0.0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            metric = self._gauges.setdefault(name, {})
+            label_set = self._limit(name, metric, make_label_set(labels))
+            metric[label_set] = value
+
+    def add_gauge(self, name: str, amount: float, **labels):
+        with self._lock:
+            metric = self._gauges.setdefault(name, {})
+            label_set = self._limit(name, metric, make_label_set(labels))
+            metric[label_set] = metric.get(label_set, 0.0) + amount
+
+    def gauge_callback(self, name: str, callback: Callable[[], float]):
+        """Register a gauge whose value is read at collection time (e.g. queue depth)"""
+        self._gauge_callbacks[name] = callback
+
+    @contextmanager
+    def track_in_flight(self, name: str, **labels):
+        """Gauge of operations currently in progress"""
+        self.add_gauge(name, 1, **labels)
+        try:
+            yield
+        finally:
+            self.add_gauge(name, -1, **labels)
+
+    def counters(self) -> Iterator[Tuple[str, LabelSet, float]]:
+        with self._lock:
+            items = [(name, ls, v) for name, metric in self._counters.items() for ls, v in metric.items()]
+        return iter(items)
+
+    def gauges(self) -> Iterator[Tuple[str, LabelSet, float]]:
+        with self._lock:
+            items = [(name, ls, v) for name, metric in self._gauges.items() for ls, v in metric.items()]
+        for name, callback in list(self._gauge_callbacks.items()):
+            try:
+                items.append((name, (), float(callback())))
+            except Exception:
+                continue
+        return iter(items)
@@ -0,0 +1,206 @@
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+
+class MetricsSink:
+    """
+    Non-blocking newline-delimited JSON writer for metrics records.
+
+    `write()` only enqueues the record; a daemon thread serializes and appends
+    records in batches. The active file is rotated once it exceeds `max_bytes`
+    or is older than `rotate_seconds`, and rotated files beyond `backup_count`
+    or older than `retention_seconds` are deleted. When the queue is full,
+    records are dropped (and counted) rather than stalling the caller.
+    """
+
+    def __init__(
+        self,
+        path: str = 'logs/detailed_metrics.json',
+        max_bytes: int = 50 * 1024 * 1024,
+        rotate_seconds: Optional[float] = 24 * 3600,
+        backup_count: int = 7,
+        retention_seconds: Optional[float] = 7 * 24 * 3600,
+        max_queue: int = 10000
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backup_count = backup_count
+        self.retention_seconds = retention_seconds
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._file = None
+        self._opened_at = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='metrics-sink', daemon=True)
+                self._thread.start()
+
+    def write(self, record: dict):
+        """Queue a record for writing; never blocks"""
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout: float = 5.0):
+        """Flush queued records and stop the writer thread"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._opened_at = time.time()
+
+    def _should_rotate(self) -> bool:
+        if self._file.tell() >= self.max_bytes:
+            return True
+        return self.rotate_seconds is not None and time.time() - self._opened_at >= self.rotate_seconds
+
+    def _rotate(self):
+        self._file.close()
+        suffix = datetime.now().strftime('%Y%m%d-%H%M%S')
+        rotated = f"{self.path}.{suffix}"
+        if os.path.exists(rotated):
+            rotated = f"{rotated}.{int(time.time() * 1000) % 1000:03d}"
+        os.replace(self.path, rotated)
+        self._prune()
+        self._open()
+
+    def _prune(self):
+        backups = sorted(glob.glob(f"{glob.escape(self.path)}.*"), key=os.path.getmtime, reverse=True)
+        now = time.time()
+        for index, backup in enumerate(backups):
+            expired = self.retention_seconds is not None and now - os.path.getmtime(backup) > self.retention_seconds
+            if index >= self.backup_count or expired:
+                try:
+                    os.remove(backup)
+                except OSError:
+                    pass
+
+    def _run(self):
+        self._open()
+        running = True
+        while running:
+            record = self._queue.get()
+            batch = [record]
+            # Drain whatever else is queued so one write/flush covers the batch
+            while len(batch) < 1000:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                for item in batch:
+                    if item is None:
+                        running = False
+                        continue
+                    self._file.write(json.dumps(item, separators=(',', ':'), default=str))
+                    self._file.write('\n')
+                self._file.flush()
+                if self._should_rotate():
+                    self._rotate()
+            except Exception:
+                # Never let a disk problem kill the writer thread
+                self.dropped += len(batch)
+        self._file.close()
+
+
+class MetricsTailReader:
+    """
+    Incrementally reads newly appended records from a newline-delimited JSON file.
+
+    Keeps the byte offset of the last complete line, so each poll only reads
+    what was appended since. Rotation (new inode) or truncation restarts from
+    the beginning of the new file.
+    """
+
+    def __init__(self, path: str = 'logs/detailed_metrics.json', start_lines: int = 0, chunk_size: int = 64 * 1024):
+        self.path = path
+        self.offset = 0
+        self.inode = None
+        self._partial = b''
+        self._start_lines = start_lines
+        self._chunk_size = chunk_size
+
+    def _seek_last_lines(self, f, size: int) -> int:
+        """Offset at which the last `start_lines` complete lines begin"""
+        position = size
+        newlines = 0
+        while position > 0:
+            read_size = min(self._chunk_size, position)
+            position -= read_size
+            f.seek(position)
+            chunk = f.read(read_size)
+            newlines += chunk.count(b'\n')
+            if newlines > self._start_lines:
+                # Walk forward to the line boundary we need
+                excess = newlines - self._start_lines
+                index = -1
+                for _ in range(excess):
+                    index = chunk.index(b'\n', index + 1)
+                return position + index + 1
+        return 0
+
+    def read_new(self) -> list:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+
+        if self.inode != stat.st_ino or stat.st_size < self.offset:
+            # First read, rotated or truncated file
+            first_read = self.inode is None
+            self.inode = stat.st_ino
+            self.offset = 0
+            self._partial = b''
+            if first_read and self._start_lines:
+                with open(self.path, 'rb') as f:
+                    self.offset = self._seek_last_lines(f, stat.st_size)
+
+        if stat.st_size == self.offset:
+            return []
+
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read(stat.st_size - self.offset)
+        self.offset += len(data)
+
+        data = self._partial + data
+        lines = data.split(b'\n')
+        self._partial = lines.pop()  # incomplete trailing line, if any
+
+        records = []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        return records
+
+
+def load_history(path: str = 'logs/detailed_metrics.json') -> list:
+    """All records from the active file and its rotated backups, oldest first"""
+    files = sorted(glob.glob(f"{glob.escape(path)}.*"), key=os.path.getmtime) + [path]
+    records = []
+    for file_path in files:
+        if os.path.exists(file_path):
+            records.extend(MetricsTailReader(file_path).read_new())
+    return records
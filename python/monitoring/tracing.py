@@ -0,0 +1,316 @@
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import List, Optional
+
+from .sink import MetricsSink
+
+logger = logging.getLogger('tracing')
+
+
+class Span:
+    """A timed operation within a trace; timestamps are in nanoseconds since the epoch"""
+
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'start_ns', 'end_ns', 'attributes', 'error')
+
+    def __init__(self, trace: 'Trace', name: str, parent_id: Optional[str], attributes: dict):
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    @property
+    def duration(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e9 if self.end_ns else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start_ns / 1e9,
+            'duration': self.duration,
+            'attributes': self.attributes,
+            'error': self.error
+        }
+
+
+class _NoopSpan:
+    """Returned when tracing is disabled or outside a trace, so call sites need no checks"""
+
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """All spans recorded for one request"""
+
+    __slots__ = ('trace_id', 'sampled', 'spans')
+
+    def __init__(self, sampled: bool):
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.sampled = sampled
+        self.spans: List[Span] = []
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar('current_span', default=None)
+
+
+class FileSpanExporter:
+    """Appends one JSON record per trace to a rotating NDJSON file"""
+
+    def __init__(self, path: str = 'logs/traces.json'):
+        self.sink = MetricsSink(path)
+
+    def export(self, service: str, trace: Trace):
+        root = trace.spans[0]
+        self.sink.write({
+            'trace_id': trace.trace_id,
+            'service': service,
+            'name': root.name,
+            'start': root.start_ns / 1e9,
+            'duration': root.duration,
+            'spans': [span.to_dict() for span in trace.spans]
+        })
+
+    def close(self):
+        self.sink.close()
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+class OTLPSpanExporter:
+    """
+    Ships traces to an OpenTelemetry collector using OTLP/HTTP with JSON encoding.
+
+    Traces are queued and posted in batches from a daemon thread; when the
+    queue is full, traces are dropped rather than slowing down requests.
+    """
+
+    def __init__(self, endpoint: str = 'http://localhost:4318', batch_size: int = 100,
+                 flush_interval: float = 2.0, max_queue: int = 2000, timeout: float = 5.0):
+        self.url = endpoint.rstrip('/') + '/v1/traces'
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name='otlp-exporter', daemon=True)
+        self._thread.start()
+
+    def export(self, service: str, trace: Trace):
+        try:
+            self._queue.put_nowait((service, trace))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout: float = 5.0):
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _encode_span(self, trace: Trace, span: Span) -> dict:
+        encoded = {
+            'traceId': trace.trace_id,
+            'spanId': span.span_id,
+            'name': span.name,
+            'kind': 1,  # SPAN_KIND_INTERNAL
+            'startTimeUnixNano': str(span.start_ns),
+            'endTimeUnixNano': str(span.end_ns),
+            'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in span.attributes.items()],
+            'status': {'code': 2, 'message': span.error} if span.error else {'code': 1}
+        }
+        if span.parent_id:
+            encoded['parentSpanId'] = span.parent_id
+        return encoded
+
+    def _post(self, batch: list):
+        by_service = {}
+        for service, trace in batch:
+            by_service.setdefault(service, []).extend(self._encode_span(trace, s) for s in trace.spans)
+        body = {
+            'resourceSpans': [
+                {
+                    'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': service}}]},
+                    'scopeSpans': [{'scope': {'name': 'chattie'}, 'spans': spans}]
+                }
+                for service, spans in by_service.items()
+            ]
+        }
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(body).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+    def _run(self):
+        running = True
+        while running:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+            if not batch:
+                continue
+            try:
+                self._post(batch)
+            except Exception as e:
+                self.dropped += len(batch)
+                logger.warning(f"Failed to export {len(batch)} traces to {self.url}: {str(e)}")
+
+
+class Tracer:
+    """
+    Minimal in-process tracer built on context variables.
+
+    `trace()` opens the root span of a request and `span()` opens a child of
+    whatever span is current, which works across awaits and tasks created
+    inside the request. A trace is exported when it was head-sampled
+    (`sample_rate`) or when the root span took at least `slow_threshold`
+    seconds, so slow requests are kept even at low sample rates. With no
+    exporter every call returns a shared no-op span.
+    """
+
+    def __init__(self, service: str, exporter=None, sample_rate: float = 0.1,
+                 slow_threshold: Optional[float] = 2.0):
+        self.service = service
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    @contextmanager
+    def trace(self, name: str, **attributes):
+        """Root span for one request; nested calls become children of the current trace"""
+        if self.exporter is None:
+            yield NOOP_SPAN
+            return
+        parent = _current_span.get()
+        if parent is not None:
+            with self.span(name, **attributes) as span:
+                yield span
+            return
+
+        trace = Trace(sampled=random.random() < self.sample_rate)
+        root = Span(trace, name, None, attributes)
+        trace.spans.append(root)
+        token = _current_span.set(root)
+        try:
+            yield root
+        except BaseException as e:
+            root.error = type(e).__name__
+            raise
+        finally:
+            root.end_ns = time.time_ns()
+            _current_span.reset(token)
+            slow = self.slow_threshold is not None and root.duration >= self.slow_threshold
+            if trace.sampled or slow:
+                try:
+                    self.exporter.export(self.service, trace)
+                except Exception as e:
+                    logger.warning(f"Failed to export trace {trace.trace_id}: {str(e)}")
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Child span of the current span; a no-op outside a trace"""
+        parent = _current_span.get()
+        if parent is None:
+            yield NOOP_SPAN
+            return
+        span = Span(parent.trace, name, parent.span_id, attributes)
+        parent.trace.spans.append(span)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+
+    def traced(self, name: Optional[str] = None):
+        """Decorator wrapping a sync or async function in a span"""
+        def decorator(func):
+            span_name = name or func.__name__
+            if inspect.iscoroutinefunction(func):
+                @wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(span_name):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+def current_span():
+    """The active span, or a no-op span outside a trace"""
+    return _current_span.get() or NOOP_SPAN
+
+
+def tracer_from_env(service: str) -> Tracer:
+    """
+    Build a tracer from environment variables:
+    TRACE_EXPORTER (none, file or otlp), TRACE_SAMPLE_RATE, TRACE_SLOW_SECONDS,
+    TRACE_FILE and OTEL_EXPORTER_OTLP_ENDPOINT.
+    """
+    exporter_name = os.getenv('TRACE_EXPORTER', 'file').lower()
+    if exporter_name == 'otlp':
+        exporter = OTLPSpanExporter(os.getenv('OTEL_EXPORTER_OTLP_ENDPOINT', 'http://localhost:4318'))
+    elif exporter_name == 'file':
+        exporter = FileSpanExporter(os.getenv('TRACE_FILE', 'logs/traces.json'))
+    else:
+        exporter = None
+    slow = os.getenv('TRACE_SLOW_SECONDS', '2.0')
+    return Tracer(
+        service,
+        exporter=exporter,
+        sample_rate=float(os.getenv('TRACE_SAMPLE_RATE', '0.1')),
+        slow_threshold=float(slow) if slow else None
+    )
@@ -1,37 +1,62 @@
-import json
+import argparse
+import sys
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
 import numpy as np
 from collections import deque
-import time
-from datetime import datetime, timedelta
+from datetime import datetime
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from monitoring.sink import MetricsTailReader, load_history
+
+METRICS_PATH = 'logs/detailed_metrics.json'
+OPERATIONS = ['total_processing', 'db_operations', 'vector_store', 'llm_processing', 'message_queue']
+
+
+def downsample(timestamps: np.ndarray, values: np.ndarray, points: int, how: str = 'mean'):
+    """
+    Aggregate a long series into at most `points` equal-count bins with NumPy.
+
+    Returns (bin start timestamps, aggregated values); `how` is 'mean' or 'max'.
+    """
+    if len(values) <= points:
+        return timestamps, values
+    starts = np.linspace(0, len(values), points, endpoint=False).astype(np.int64)
+    if how == 'max':
+        aggregated = np.maximum.reduceat(values, starts)
+    else:
+        sums = np.add.reduceat(values, starts)
+        counts = np.diff(np.append(starts, len(values)))
+        aggregated = sums / counts
+    return timestamps[starts], aggregated
+
 
 class MetricsVisualizer:
-    def __init__(self, window_size=60):
+    def __init__(self, window_size=60, path=METRICS_PATH):
         self.window_size = window_size
-        
+        self.reader = MetricsTailReader(path, start_lines=window_size)
+
         # Initialize data structures
         self.timestamps = deque(maxlen=window_size)
         self.rps = deque(maxlen=window_size)
         self.avg_request_time = deque(maxlen=window_size)
         self.operation_times = {
-            'total_processing': deque(maxlen=window_size),
-            'db_operations': deque(maxlen=window_size),
-            'vector_store': deque(maxlen=window_size),
-            'llm_processing': deque(maxlen=window_size),
-            'message_queue': deque(maxlen=window_size)
+            op: deque(maxlen=window_size) for op in OPERATIONS
         }
-        
+
         # Set up the plot
         plt.style.use('dark_background')
         self.fig = plt.figure(figsize=(15, 10))
         self.fig.suptitle('Bot Performance Metrics', fontsize=16)
-        
+
         # Create subplots
         self.ax1 = plt.subplot(221)  # Requests per second
         self.ax2 = plt.subplot(222)  # Average request time
         self.ax3 = plt.subplot(212)  # Operation times
-        
+
         # Initialize lines
         self.rps_line, = self.ax1.plot([], [], 'g-', label='Requests/sec')
         self.avg_time_line, = self.ax2.plot([], [], 'b-', label='Avg Request Time (s)')
@@ -39,70 +64,108 @@ class MetricsVisualizer:
             op: self.ax3.plot([], [], label=op.replace('_', ' ').title())[0]
             for op in self.operation_times.keys()
         }
-        
+
         # Set up axes
         self.ax1.set_title('Requests per Second')
         self.ax2.set_title('Average Request Time')
         self.ax3.set_title('Operation Times')
-        
+
         for ax in [self.ax1, self.ax2, self.ax3]:
             ax.grid(True, alpha=0.3)
             ax.legend()
-    
+
+    def add_record(self, metrics: dict):
+        self.timestamps.append(datetime.fromisoformat(metrics['timestamp']))
+        self.rps.append(metrics['requests_per_second'])
+        self.avg_request_time.append(metrics['avg_request_time'])
+        for op, times in self.operation_times.items():
+            times.append(metrics['operation_times'].get(op, {}).get('avg', 0))
+
     def update_plot(self, frame):
         try:
-            # Read the latest metrics
-            with open('logs/detailed_metrics.json', 'r') as f:
-                lines = f.readlines()
-                if lines:
-                    latest_metrics = json.loads(lines[-1])
-                    
-                    # Update data
-                    self.timestamps.append(datetime.fromisoformat(latest_metrics['timestamp']))
-                    self.rps.append(latest_metrics['requests_per_second'])
-                    self.avg_request_time.append(latest_metrics['avg_request_time'])
-                    
-                    for op, times in latest_metrics['operation_times'].items():
-                        self.operation_times[op].append(times['avg'])
-                    
-                    # Update plots
-                    x_data = np.arange(len(self.timestamps))
-                    
-                    # Update RPS plot
-                    self.rps_line.set_data(x_data, self.rps)
-                    self.ax1.relim()
-                    self.ax1.autoscale_view()
-                    
-                    # Update average time plot
-                    self.avg_time_line.set_data(x_data, self.avg_request_time)
-                    self.ax2.relim()
-                    self.ax2.autoscale_view()
-                    
-                    # Update operation times plot
-                    for op, line in self.operation_lines.items():
-                        line.set_data(x_data, self.operation_times[op])
-                    self.ax3.relim()
-                    self.ax3.autoscale_view()
-                    
-                    # Update x-axis limits for all plots
-                    for ax in [self.ax1, self.ax2, self.ax3]:
-                        ax.set_xlim(max(0, len(self.timestamps) - self.window_size), len(self.timestamps))
-            
+            # Read only the records appended since the last frame
+            new_records = self.reader.read_new()
+            for metrics in new_records:
+                self.add_record(metrics)
+
+            if new_records:
+                # Update plots
+                x_data = np.arange(len(self.timestamps))
+
+                # Update RPS plot
+                self.rps_line.set_data(x_data, self.rps)
+                self.ax1.relim()
+                self.ax1.autoscale_view()
+
+                # Update average time plot
+                self.avg_time_line.set_data(x_data, self.avg_request_time)
+                self.ax2.relim()
+                self.ax2.autoscale_view()
+
+                # Update operation times plot
+                for op, line in self.operation_lines.items():
+                    line.set_data(x_data, self.operation_times[op])
+                self.ax3.relim()
+                self.ax3.autoscale_view()
+
+                # Update x-axis limits for all plots
+                for ax in [self.ax1, self.ax2, self.ax3]:
+                    ax.set_xlim(max(0, len(self.timestamps) - self.window_size), len(self.timestamps))
+
             return self.rps_line, self.avg_time_line, *self.operation_lines.values()
-        
+
         except Exception as e:
             print(f"Error updating plot: {str(e)}")
             return self.rps_line, self.avg_time_line, *self.operation_lines.values()
-    
+
     def start(self):
         anim = FuncAnimation(
-            self.fig, 
+            self.fig,
             self.update_plot,
             interval=1000,  # Update every second
             blit=True
         )
         plt.show()
 
+    def replay(self, points: int = 500):
+        """Plot the whole recorded history, down-sampled to `points` per series"""
+        records = load_history(self.reader.path)
+        if not records:
+            print("No metrics recorded yet")
+            return
+
+        timestamps = np.array([datetime.fromisoformat(r['timestamp']) for r in records], dtype='datetime64[ms]')
+        rps = np.array([r['requests_per_second'] for r in records], dtype=np.float64)
+        avg_time = np.array([r['avg_request_time'] for r in records], dtype=np.float64)
+
+        x, y = downsample(timestamps, rps, points)
+        self.rps_line.set_data(x, y)
+        x, y = downsample(timestamps, avg_time, points)
+        self.avg_time_line.set_data(x, y)
+        for op, line in self.operation_lines.items():
+            values = np.array(
+                [r['operation_times'].get(op, {}).get('avg', 0) for r in records],
+                dtype=np.float64
+            )
+            x, y = downsample(timestamps, values, points)
+            line.set_data(x, y)
+
+        self.fig.suptitle(f'Bot Performance Metrics ({len(records)} records)', fontsize=16)
+        for ax in [self.ax1, self.ax2, self.ax3]:
+            ax.relim()
+            ax.autoscale_view()
+        self.fig.autofmt_xdate()
+        plt.show()
+
 if __name__ == "__main__":
-    visualizer = MetricsVisualizer()
-    visualizer.start() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Visualize bot performance metrics")
+    parser.add_argument('--path', default=METRICS_PATH)
+    parser.add_argument('--replay', action='store_true', help="Plot the full recorded history instead of tailing")
+    parser.add_argument('--points', type=int, default=500, help="Max points per series in replay mode")
+    args = parser.parse_args()
+
+    visualizer = MetricsVisualizer(path=args.path)
+    if args.replay:
+        visualizer.replay(points=args.points)
+    else:
+        visualizer.start()
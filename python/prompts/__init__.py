@@ -0,0 +1 @@
+# prompts package
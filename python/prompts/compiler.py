@@ -0,0 +1,89 @@
+"""
+Chat prompts split into a cached static prefix and a per-request part.
+
+A CompiledPrompt renders its system block (a persona's profile, a
+command's instructions) once per cache key and sends it verbatim as the
+first message, so every request for the same persona begins with the
+same tokens and the provider's prompt caching covers it. Only the
+per-request message (retrieved context, sender, query) is formatted per
+call. Persona blocks are keyed by the persona's id and version
+($updatedAt), so editing a persona renders a new prefix.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, List, Optional
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+PERSONA_SYSTEM = """You are {name}, {role}. Your personality is: {personality}
+Your conversation style is: {conversation_style}
+Your knowledge areas are: {knowledge_base}
+Your opinions are: {opinions}
+You disagree with: {disagreements}"""
+
+
+def persona_key(persona: dict, *extra: Hashable) -> tuple:
+    """Cache key of a persona's rendered block: its id and version, plus anything else the block depends on"""
+    version = persona.get('$updatedAt')
+    if version is None:
+        # Personas loaded from files have no version; any edit changes the digest
+        version = hashlib.blake2b(json.dumps(persona, sort_keys=True, default=str).encode('utf-8'),
+                                  digest_size=8).hexdigest()
+    return (persona.get('$id') or persona.get('name'), version, *extra)
+
+
+def persona_fields(persona: dict) -> dict:
+    """Persona attributes as the prompt shows them, with list fields joined"""
+    return {
+        'name': persona['name'],
+        'role': persona['role'],
+        'personality': persona['personality'],
+        'conversation_style': persona['conversation_style'],
+        'knowledge_base': ", ".join(persona['knowledge_base']),
+        'opinions': ", ".join(persona.get('opinions', [])),
+        'disagreements': ", ".join(persona.get('disagreements', [])),
+        'debate_style': persona.get('debate_style', ''),
+    }
+
+
+class CompiledPrompt:
+    """
+    A system template rendered once per key and a request template filled
+    in per call. render() returns [SystemMessage(prefix), HumanMessage(request)].
+    """
+
+    def __init__(self, system_template: str, request_template: str, cache_size: int = 1024):
+        self.system_template = system_template
+        self.request_template = request_template
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._prefixes: 'OrderedDict[Hashable, str]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def prefix(self, key: Hashable = None, fields: Optional[Callable[[], dict]] = None) -> str:
+        """The rendered system block for `key`; `fields` supplies its values and is only called on a miss"""
+        with self._lock:
+            cached = self._prefixes.get(key)
+            if cached is not None:
+                self._prefixes.move_to_end(key)
+                self.hits += 1
+                return cached
+        rendered = self.system_template.format(**(fields() if fields else {}))
+        with self._lock:
+            self.misses += 1
+            self._prefixes[key] = rendered
+            while len(self._prefixes) > self.cache_size:
+                self._prefixes.popitem(last=False)
+        return rendered
+
+    def render(self, key: Hashable = None, fields: Optional[Callable[[], dict]] = None,
+               **request: str) -> List[BaseMessage]:
+        return [SystemMessage(content=self.prefix(key, fields)),
+                HumanMessage(content=self.request_template.format(**request))]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'prefixes': len(self._prefixes), 'hits': self.hits, 'misses': self.misses}
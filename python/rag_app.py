@@ -50,11 +50,13 @@ from appwrite.permission import Permission
 from appwrite.role import Role
 from appwrite.query import Query
 # Pinecone and LangChain
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
+from langchain_openai import ChatOpenAI
+from langchain_core.vectorstores import VectorStore
 from langchain.prompts import PromptTemplate
 from langchain.schema import Document
 
+from fakes.factory import make_embeddings, make_vectorstore
+
 # Load environment variables
 load_dotenv()
 
@@ -197,7 +199,7 @@ async def store_messages_in_appwrite(messages: list, database: Databases) -> Non
             logger.error(f"Error storing message: {msg}. Exception: {str(e)}")
 
 
-async def embed_and_store_in_pinecone(messages: list, vectorstore: PineconeVectorStore, database: Databases) -> None:
+async def embed_and_store_in_pinecone(messages: list, vectorstore: VectorStore, database: Databases) -> None:
     """
     Embed each synthetic message and store it in Pinecone.
     Using the 'langchain.embeddings.OpenAIEmbeddings' and 'langchain.vectorstores.Pinecone'.
@@ -241,25 +243,26 @@ async def embed_and_store_in_pinecone(messages: list, vectorstore: PineconeVecto
     logger.info(f"Successfully added {len(docs)} message embeddings to Pinecone and updated Appwrite.")
 
 
-async def retrieve_context(query: str, vectorstore: PineconeVectorStore, k: int = 3) -> list:
+async def retrieve_context(query: str, vectorstore: VectorStore, workspace_id: str, k: int = 3) -> list:
     """
-    Retrieves the top-k most relevant documents from Pinecone for the given query.
+    Retrieves the top-k most relevant documents of a workspace from Pinecone for the given query.
     Returns a list of Document objects with their metadata.
     """
     logger.info(f"Retrieving top {k} documents relevant to query: '{query}'")
-    retriever = vectorstore.as_retriever(search_kwargs={"k": k})
+    retriever = vectorstore.as_retriever(search_kwargs={"k": k, "filter": {"workspace_id": workspace_id}})
     relevant_docs = retriever.get_relevant_documents(query)
     return relevant_docs
 
 
-async def generate_rag_response(query: str, vectorstore: PineconeVectorStore, model_name: str = "gpt-4") -> str:
+async def generate_rag_response(query: str, vectorstore: VectorStore, workspace_id: str,
+                                model_name: str = "gpt-4") -> str:
     """
     Generates a response by retrieving relevant context from the Pinecone store
     and passing it along to an LLM (OpenAI GPT-4 via ChatOpenAI).
     Example is minimal – tailor the prompt or system instructions to your use case.
     """
     # Retrieve relevant context
-    relevant_docs = await retrieve_context(query, vectorstore, k=3)
+    relevant_docs = await retrieve_context(query, vectorstore, workspace_id, k=3)
     
     # Format retrieved context nicely
     context_passage = "\n\n".join(
@@ -327,12 +330,12 @@ async def demo_rag_pipeline():
 
     # 2. Setup Pinecone and embeddings
     logger.info(f"Initializing OpenAI embeddings...")
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+    embeddings = make_embeddings(model="text-embedding-3-large")
 
     # Initialize vector store
     logger.info(f"Initializing Pinecone with index '{PINECONE_INDEX_NAME}'...")
     try:
-        vectorstore = PineconeVectorStore(
+        vectorstore = make_vectorstore(
             index_name="messages",
             embedding=embeddings
         )
@@ -358,7 +361,7 @@ async def demo_rag_pipeline():
     user_query = "What's an interesting perspective on the synthetic conversation so far?"
 
     # 7. Generate RAG response
-    rag_answer = await generate_rag_response(user_query, vectorstore, model_name="gpt-4")
+    rag_answer = await generate_rag_response(user_query, vectorstore, DEMO_WORKSPACE_ID, model_name="gpt-4")
     logger.info(f"RAG-based response:\n{rag_answer}")
 
     # 8. Optionally, store the AI response back to Appwrite
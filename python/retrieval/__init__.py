@@ -0,0 +1 @@
+# retrieval package
@@ -0,0 +1,190 @@
+import logging
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+logger = logging.getLogger('chunking')
+
+# text-embedding-3 tokenizer; chunk sizes are in its tokens
+ENCODING = 'cl100k_base'
+CHUNK_TOKENS = 512
+CHUNK_OVERLAP = 64
+# Rough characters per token, used when tiktoken is not installed
+CHARS_PER_TOKEN = 4
+
+_encoding = None
+_splitter = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(ENCODING)
+        except ImportError:
+            logger.warning("tiktoken is not installed; estimating token counts from message length")
+            _encoding = False
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _get_splitter():
+    global _splitter
+    if _splitter is None:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        if _get_encoding():
+            _splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+                encoding_name=ENCODING, chunk_size=CHUNK_TOKENS, chunk_overlap=CHUNK_OVERLAP
+            )
+        else:
+            _splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_TOKENS * CHARS_PER_TOKEN,
+                                                       chunk_overlap=CHUNK_OVERLAP * CHARS_PER_TOKEN)
+    return _splitter
+
+
+def needs_split(text: str, max_tokens: int = CHUNK_TOKENS) -> bool:
+    # A token is at least one character, so short texts skip the tokenizer
+    return len(text) > max_tokens and count_tokens(text) > max_tokens
+
+
+def chunk_ids(parent_id: str, count: int) -> List[str]:
+    return [f'{parent_id}#{position}' for position in range(count)]
+
+
+def _chunk_positions(text: str, chunks: List[str]) -> List[dict]:
+    """
+    chunk_start (offset in `text`, -1 if not found) for each chunk, plus
+    chunk_gap: the whitespace the splitter stripped between it and the
+    previous chunk when they do not overlap
+    """
+    positions = []
+    previous = -1
+    end = 0
+    for chunk in chunks:
+        start = text.find(chunk, previous + 1)
+        position = {'chunk_start': start}
+        if start > end and positions:
+            position['chunk_gap'] = text[end:start]
+        if start >= 0:
+            previous = start
+            end = max(end, start + len(chunk))
+        positions.append(position)
+    return positions
+
+
+def chunk_message(text: str, metadata: dict,
+                  message_id: Optional[str] = None) -> Tuple[List[str], List[dict], Optional[List[str]]]:
+    """
+    (texts, metadatas, ids) to embed for one message. Messages within
+    CHUNK_TOKENS are embedded whole, under the message id; longer ones are
+    split into overlapping chunks that carry parent_id, chunk, chunks,
+    chunk_start and chunk_gap metadata (see merge_chunks) and get ids
+    <parent_id>#<n> (the parent id is generated when the message has none).
+    """
+    if not needs_split(text):
+        return [text], [metadata], [message_id] if message_id else None
+
+    parent_id = message_id or str(uuid.uuid4())
+    chunks = _get_splitter().split_text(text)
+    metadatas = [
+        {**metadata, 'parent_id': parent_id, 'chunk': position, 'chunks': len(chunks), **offsets}
+        for position, offsets in enumerate(_chunk_positions(text, chunks))
+    ]
+    logger.debug(f"Split message {parent_id} into {len(chunks)} chunks")
+    return chunks, metadatas, chunk_ids(parent_id, len(chunks))
+
+
+def merge_chunks(chunks: List[Document]) -> str:
+    """
+    A parent's text from its chunks, in chunk order, with the overlap
+    between neighbours kept once. Gaps left by missing chunks, and chunks
+    indexed before chunk_start was recorded, are joined with newlines.
+    """
+    chunks = sorted(chunks, key=lambda chunk: chunk.metadata.get('chunk', 0))
+    text = ''
+    # Parent offset of text[0], so a chunk's chunk_start maps into `text`; None when unknown
+    origin = None
+    previous = None
+    for chunk in chunks:
+        position = chunk.metadata.get('chunk', 0)
+        # Pinecone returns numeric metadata as floats
+        start = chunk.metadata.get('chunk_start')
+        start = int(start) if start is not None and start >= 0 else None
+        if not text:
+            text, origin = chunk.page_content, start
+        elif position == previous + 1 and origin is not None and start is not None:
+            offset = start - origin
+            if offset > len(text):
+                text += chunk.metadata.get('chunk_gap') or ' ' * (offset - len(text))
+            text = text[:offset] + chunk.page_content
+        else:
+            text += '\n'
+            origin = start - len(text) if start is not None else None
+            text += chunk.page_content
+        previous = position
+    return text
+
+
+# fetch(ids, workspace_id) -> the stored chunk Documents among `ids`
+ChunkFetcher = Callable[[List[str], Optional[str]], List[Document]]
+
+
+def _fetch_missing(groups: Dict[str, List[Document]], fetch: ChunkFetcher):
+    """Add the chunks of each parent that the search did not return"""
+    by_workspace = {}
+    for parent_id, chunks in groups.items():
+        count = int(chunks[0].metadata.get('chunks') or 0)
+        present = {chunk.metadata.get('chunk') for chunk in chunks}
+        missing = [id for position, id in enumerate(chunk_ids(parent_id, count)) if position not in present]
+        if missing:
+            by_workspace.setdefault(chunks[0].metadata.get('workspace_id'), []).extend(missing)
+    for workspace_id, ids in by_workspace.items():
+        try:
+            fetched = fetch(ids, workspace_id)
+        except Exception as e:
+            logger.warning(f"Could not fetch {len(ids)} chunks, using the retrieved ones only: {e}")
+            continue
+        for doc in fetched:
+            groups[doc.metadata['parent_id']].append(doc)
+
+
+def collapse_chunks(candidates: List[Tuple[Document, float]],
+                    fetch: Optional[ChunkFetcher] = None) -> List[Tuple[Document, float]]:
+    """
+    One entry per parent message, at the rank of its best-scoring chunk,
+    holding the whole parent text. Chunks the search did not return are
+    loaded by id with `fetch` (e.g. TieredVectorStore.fetch_documents);
+    without it the parent is rebuilt from the retrieved chunks only.
+    Unchunked messages pass through unchanged.
+    """
+    groups = {}
+    for doc, _ in candidates:
+        parent_id = doc.metadata.get('parent_id')
+        if parent_id is not None:
+            groups.setdefault(parent_id, []).append(doc)
+    if fetch is not None and groups:
+        _fetch_missing(groups, fetch)
+
+    collapsed = []
+    emitted = set()
+    for doc, score in candidates:
+        parent_id = doc.metadata.get('parent_id')
+        if parent_id is None:
+            collapsed.append((doc, score))
+            continue
+        if parent_id in emitted:
+            continue
+        emitted.add(parent_id)
+        metadata = {key: value for key, value in doc.metadata.items()
+                    if key not in ('chunk', 'chunk_start', 'chunk_gap')}
+        collapsed.append((Document(id=parent_id, page_content=merge_chunks(groups[parent_id]), metadata=metadata),
+                          score))
+    return collapsed
@@ -0,0 +1,66 @@
+from typing import Optional
+
+_COMPARISONS = {
+    '$gt': lambda a, b: a > b,
+    '$gte': lambda a, b: a >= b,
+    '$lt': lambda a, b: a < b,
+    '$lte': lambda a, b: a <= b,
+}
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _match_operator(value, operator: str, operand) -> bool:
+    # List-of-strings metadata matches $eq/$in when any element does, as in Pinecone
+    values = value if isinstance(value, list) else [value]
+    if operator == '$eq':
+        return value is not None and operand in values
+    if operator == '$ne':
+        return operand not in values
+    if operator == '$in':
+        return value is not None and any(v in operand for v in values)
+    if operator == '$nin':
+        return not any(v in operand for v in values)
+    if operator == '$exists':
+        return (value is not None) == bool(operand)
+    if operator in _COMPARISONS:
+        # Pinecone only supports range operators on numbers
+        return _is_number(value) and _is_number(operand) and _COMPARISONS[operator](value, operand)
+    raise ValueError(f"Unsupported filter operator: {operator}")
+
+
+def matches_filter(metadata: dict, filter: Optional[dict]) -> bool:
+    """
+    Evaluate a Pinecone metadata filter against one record's metadata.
+
+    Supports $eq, $ne, $in, $nin, $exists, $gt, $gte, $lt, $lte, $and and $or;
+    a bare value is shorthand for $eq and sibling keys are ANDed.
+    """
+    if not filter:
+        return True
+    for key, condition in filter.items():
+        if key == '$and':
+            if not all(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif key == '$or':
+            if not any(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            if not all(_match_operator(value, op, operand) for op, operand in condition.items()):
+                return False
+        elif not _match_operator(metadata.get(key), '$eq', condition):
+            return False
+    return True
+
+
+def equality_value(filter: Optional[dict], key: str):
+    """The value `key` must equal for `filter` to match (bare or $eq at the top level), else None"""
+    if not filter:
+        return None
+    condition = filter.get(key)
+    if isinstance(condition, dict):
+        condition = condition.get('$eq') if set(condition) == {'$eq'} else None
+    return condition if isinstance(condition, (str, int)) and not isinstance(condition, bool) else None
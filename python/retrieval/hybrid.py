@@ -0,0 +1,123 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from pydantic import ConfigDict
+
+from .chunking import collapse_chunks
+from .timestamps import with_time_window
+
+logger = logging.getLogger('hybrid_retriever')
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='hybrid-lexical')
+
+
+def fusion_key(doc: Document) -> tuple:
+    """Identity of a message across backends: its channel and whitespace-normalized text"""
+    return doc.metadata.get('channel_id'), ' '.join(doc.page_content.lower().split())
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], weights: Optional[List[float]] = None,
+                           k: int = 60) -> List[Tuple[Document, float]]:
+    """
+    Merge ranked lists with reciprocal-rank fusion: each list contributes
+    weight / (k + rank) for every document it returns. The first occurrence
+    of a document supplies the returned Document.
+    """
+    weights = weights or [1.0] * len(rankings)
+    scores: Dict[tuple, float] = {}
+    documents: Dict[tuple, Document] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc in enumerate(ranking, start=1):
+            key = fusion_key(doc)
+            scores[key] = scores.get(key, 0.0) + weight / (k + rank)
+            documents.setdefault(key, doc)
+    return sorted(((documents[key], score) for key, score in scores.items()), key=lambda item: item[1], reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Queries a lexical index and a vector store in parallel and fuses the two
+    rankings with reciprocal-rank fusion.
+
+    Exact names and rare keywords come from the lexical side, paraphrases
+    from the vector side. Each side fetches `fetch_k` candidates; a failing
+    lexical backend degrades to vector-only results. Accepts the same
+    `k=` and `filter=` keyword arguments as the vector store's retriever,
+    plus `since=`, `until=` and `last=` time windows (retrieval.timestamps).
+    Chunks of a long message are returned once, merged into their parent.
+    Until the lexical index is ready for a search's scope (has loaded its
+    corpus), that search is vector-only; see `lexical_active_for`.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: VectorStore
+    lexical: Any
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+    vector_weight: float = 1.0
+    lexical_weight: float = 1.0
+
+    def _vector_search(self, query: str, fetch: int, filter: Optional[dict]) -> List[Document]:
+        return self.vectorstore.similarity_search(query, k=fetch, filter=filter)
+
+    def lexical_active_for(self, filter: Optional[dict]) -> bool:
+        """Whether searches with `filter` use the lexical side; may start loading its scope"""
+        return self.lexical.ready_for(filter)
+
+    def _lexical_search(self, query: str, fetch: int, filter: Optional[dict]) -> List[Document]:
+        if not self.lexical_active_for(filter):
+            logger.debug("Lexical index has not loaded this scope yet, using vector results only")
+            return []
+        try:
+            return [
+                Document(id=id, page_content=text, metadata=dict(metadata))
+                for id, text, metadata, _ in self.lexical.search(query, k=fetch, filter=filter)
+            ]
+        except Exception as e:
+            logger.warning(f"Lexical search failed, using vector results only: {e}")
+            return []
+
+    def _fuse(self, vector_docs: List[Document], lexical_docs: List[Document], k: int) -> List[Tuple[Document, float]]:
+        fused = reciprocal_rank_fusion([vector_docs, lexical_docs], [self.vector_weight, self.lexical_weight],
+                                       self.rrf_k)
+        return collapse_chunks(fused, getattr(self.vectorstore, 'fetch_documents', None))[:k]
+
+    def search_with_scores(self, query: str, k: Optional[int] = None, filter: Optional[dict] = None,
+                           since=None, until=None, last=None) -> List[Tuple[Document, float]]:
+        """Top-k fused (document, RRF score) pairs"""
+        k = k or self.k
+        filter = with_time_window(filter, since, until, last)
+        fetch = max(self.fetch_k, k)
+        lexical = _executor.submit(self._lexical_search, query, fetch, filter)
+        vector_docs = self._vector_search(query, fetch, filter)
+        return self._fuse(vector_docs, lexical.result(), k)
+
+    async def asearch_with_scores(self, query: str, k: Optional[int] = None, filter: Optional[dict] = None,
+                                  since=None, until=None, last=None) -> List[Tuple[Document, float]]:
+        k = k or self.k
+        filter = with_time_window(filter, since, until, last)
+        fetch = max(self.fetch_k, k)
+        vector_docs, lexical_docs = await asyncio.gather(
+            asyncio.to_thread(self._vector_search, query, fetch, filter),
+            asyncio.to_thread(self._lexical_search, query, fetch, filter)
+        )
+        # Collapsing may fetch a long message's other chunks from the index
+        return await asyncio.to_thread(self._fuse, vector_docs, lexical_docs, k)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+                                k: Optional[int] = None, filter: Optional[dict] = None,
+                                since=None, until=None, last=None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.search_with_scores(query, k, filter, since, until, last)]
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager, k: Optional[int] = None,
+                                       filter: Optional[dict] = None, since=None, until=None, last=None,
+                                       **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in await self.asearch_with_scores(query, k, filter, since, until, last)]
@@ -0,0 +1,413 @@
+import json
+import logging
+import math
+import queue
+import re
+import threading
+import time
+import urllib.request
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .filters import equality_value, matches_filter
+from .timestamps import timestamp_metadata
+
+logger = logging.getLogger('lexical')
+
+# (id, text, metadata, score)
+Hit = Tuple[str, str, dict, float]
+# Pages of (id, text, metadata) records for a workspace id
+Loader = Callable[[str], Iterable[List[Tuple[str, str, dict]]]]
+
+_TOKEN = re.compile(r"\w+")
+_TAG = re.compile(r'<[^>]+>')
+STOPWORDS = frozenset(
+    'a an and are as at be but by did do does for from had has have he her his how i if in is it its me my no '
+    'not of on or our say said she so than that the their them then there they this to was we were what when '
+    'where which who why will with you your'.split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def _scope_members(index: dict, filter: Optional[dict]) -> Optional[set]:
+    channel_id = equality_value(filter, 'channel_id')
+    if channel_id is not None:
+        return index['channel'].get(channel_id, set())
+    workspace_id = equality_value(filter, 'workspace_id')
+    if workspace_id is not None:
+        return index['workspace'].get(workspace_id, set())
+    return None
+
+
+class BM25Index:
+    """
+    Incremental in-memory BM25 inverted index over message text.
+
+    The sender name is indexed alongside the content, so "what did dynamo
+    say about housing" matches dynamo's messages even when the text never
+    repeats the name. Documents are kept per channel and workspace so scoped
+    queries only score their own postings.
+
+    Workspaces are loaded lazily: the first query scoped to a workspace
+    starts a background load of its messages from `loader`, and the
+    workspace is searched once that load has finished (`ready_for`). Writes
+    are indexed only for workspaces that are loaded or loading. At most
+    `max_documents` are held; least recently queried workspaces are evicted
+    past that, and a workspace larger than the cap is never loaded. Failed
+    loads are retried after `retry_after` seconds.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, name_field: str = 'sender_name',
+                 loader: Optional[Loader] = None, max_documents: int = 100000, retry_after: float = 60.0):
+        self.k1 = k1
+        self.b = b
+        self.name_field = name_field
+        self.loader = loader
+        self.max_documents = max_documents
+        self.retry_after = retry_after
+        self._postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self._docs: Dict[int, tuple] = {}
+        self._ids: Dict[str, int] = {}
+        self._scopes = {'channel': defaultdict(set), 'workspace': defaultdict(set)}
+        self._next = 0
+        self._total_length = 0
+        self._lock = threading.RLock()
+        # Loaded workspaces, least recently queried first
+        self._workspaces: OrderedDict = OrderedDict()
+        self._loading: Dict[str, threading.Event] = {}
+        # Workspace -> monotonic time before which it is not loaded again
+        self._skipped: Dict[str, float] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='lexical-load')
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def ready_for(self, filter: Optional[dict]) -> bool:
+        """
+        Whether a search with `filter` sees the whole corpus it is scoped to.
+        Only workspace-scoped searches can; the first one for a workspace
+        starts its load and returns False.
+        """
+        workspace_id = equality_value(filter, 'workspace_id')
+        if workspace_id is None:
+            return False
+        with self._lock:
+            if workspace_id in self._workspaces:
+                self._workspaces.move_to_end(workspace_id)
+                return True
+            if (self.loader is not None and workspace_id not in self._loading
+                    and time.monotonic() >= self._skipped.get(workspace_id, 0.0)):
+                self._loading[workspace_id] = threading.Event()
+                self._executor.submit(self._load, workspace_id)
+            return False
+
+    def wait_until_ready(self, workspace_id: str, timeout: Optional[float] = None) -> bool:
+        """Start loading a workspace if needed and wait for it; returns whether it is searchable"""
+        if self.ready_for({'workspace_id': workspace_id}):
+            return True
+        with self._lock:
+            loading = self._loading.get(workspace_id)
+        if loading is not None:
+            loading.wait(timeout)
+        with self._lock:
+            return workspace_id in self._workspaces
+
+    def _load(self, workspace_id: str):
+        started = time.monotonic()
+        loaded = 0
+        try:
+            for records in self.loader(workspace_id):
+                loaded += len(records)
+                if loaded > self.max_documents:
+                    logger.warning(f"Workspace {workspace_id} has more than {self.max_documents} messages; "
+                                   f"its searches stay vector-only")
+                    self._abandon(workspace_id, math.inf)
+                    return
+                with self._lock:
+                    for id, text, metadata in records:
+                        self._add(id, text, dict(metadata))
+        except Exception as e:
+            logger.warning(f"Could not load workspace {workspace_id} into the lexical index after {loaded}: {e}")
+            self._abandon(workspace_id, time.monotonic() + self.retry_after)
+            return
+        with self._lock:
+            self._workspaces[workspace_id] = True
+            self._loading.pop(workspace_id).set()
+            self._evict()
+        logger.info(f"Loaded {loaded} messages of workspace {workspace_id} into the lexical index "
+                    f"in {time.monotonic() - started:.1f}s")
+
+    def _abandon(self, workspace_id: str, until: float):
+        with self._lock:
+            self._remove_workspace(workspace_id)
+            self._skipped[workspace_id] = until
+            self._loading.pop(workspace_id).set()
+
+    def _remove_workspace(self, workspace_id: str):
+        for doc in list(self._scopes['workspace'].get(workspace_id, ())):
+            self._remove(self._docs[doc][0])
+        self._scopes['workspace'].pop(workspace_id, None)
+
+    def _evict(self):
+        """Drop least recently queried workspaces until the index fits, keeping the most recent one"""
+        while len(self._docs) > self.max_documents and len(self._workspaces) > 1:
+            workspace_id, _ = self._workspaces.popitem(last=False)
+            self._remove_workspace(workspace_id)
+            logger.info(f"Evicted workspace {workspace_id} from the lexical index")
+
+    def _indexed(self, metadata: dict) -> bool:
+        workspace_id = metadata.get('workspace_id')
+        return workspace_id in self._workspaces or workspace_id in self._loading
+
+    def _add(self, id: str, text: str, metadata: dict):
+        self._remove(id)
+        terms = tokenize(text) + tokenize(str(metadata.get(self.name_field) or ''))
+        counts = defaultdict(int)
+        for term in terms:
+            counts[term] += 1
+        doc = self._next
+        self._next += 1
+        for term, count in counts.items():
+            self._postings[term][doc] = count
+        self._docs[doc] = (id, text, metadata, len(terms), tuple(counts))
+        self._ids[id] = doc
+        self._total_length += len(terms)
+        for kind, key in (('channel', 'channel_id'), ('workspace', 'workspace_id')):
+            if metadata.get(key) is not None:
+                self._scopes[kind][metadata[key]].add(doc)
+
+    def _remove(self, id: str):
+        doc = self._ids.pop(id, None)
+        if doc is None:
+            return
+        _, _, metadata, length, terms = self._docs.pop(doc)
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(doc, None)
+            if not postings:
+                del self._postings[term]
+        self._total_length -= length
+        for kind, key in (('channel', 'channel_id'), ('workspace', 'workspace_id')):
+            members = self._scopes[kind].get(metadata.get(key))
+            if members is not None:
+                members.discard(doc)
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[dict]):
+        with self._lock:
+            for id, text, metadata in zip(ids, texts, metadatas):
+                metadata = dict(metadata or {})
+                if self._indexed(metadata):
+                    self._add(id, text, metadata)
+            self._evict()
+
+    def delete(self, ids: Optional[List[str]] = None, filter: Optional[dict] = None):
+        with self._lock:
+            for id in ids or []:
+                self._remove(id)
+            if filter:
+                members = _scope_members(self._scopes, filter)
+                docs = list(members) if members is not None else list(self._docs)
+                for doc in docs:
+                    id, _, metadata, *_ = self._docs[doc]
+                    if matches_filter(metadata, filter):
+                        self._remove(id)
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._docs.clear()
+            self._ids.clear()
+            self._scopes = {'channel': defaultdict(set), 'workspace': defaultdict(set)}
+            self._total_length = 0
+            self._workspaces.clear()
+
+    def search(self, query: str, k: int = 4, filter: Optional[dict] = None) -> List[Hit]:
+        terms = tokenize(query)
+        with self._lock:
+            count = len(self._docs)
+            if not terms or not count:
+                return []
+            members = _scope_members(self._scopes, filter)
+            average_length = self._total_length / count
+            scores = defaultdict(float)
+            for term in set(terms):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc, frequency in postings.items():
+                    if members is not None and doc not in members:
+                        continue
+                    length = self._docs[doc][3]
+                    norm = frequency + self.k1 * (1 - self.b + self.b * length / average_length)
+                    scores[doc] += idf * frequency * (self.k1 + 1) / norm
+
+            # Check the rest of the filter in score order and stop once k documents match
+            hits = []
+            for doc, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+                id, text, metadata, *_ = self._docs[doc]
+                if matches_filter(metadata, filter):
+                    hits.append((id, text, metadata, score))
+                    if len(hits) == k:
+                        break
+            return hits
+
+
+def to_meilisearch_filter(filter: Optional[dict]) -> Optional[str]:
+    """Translate a Pinecone-style metadata filter into a Meilisearch filter expression"""
+    if not filter:
+        return None
+    clauses = []
+    for key, condition in filter.items():
+        if key in ('$and', '$or'):
+            parts = [f"({to_meilisearch_filter(clause)})" for clause in condition if clause]
+            if parts:
+                clauses.append(f"({f' {key[1:].upper()} '.join(parts)})")
+            continue
+        if not isinstance(condition, dict):
+            condition = {'$eq': condition}
+        for operator, operand in condition.items():
+            if operator == '$eq':
+                clauses.append(f"{key} = {json.dumps(operand)}")
+            elif operator == '$ne':
+                clauses.append(f"{key} != {json.dumps(operand)}")
+            elif operator == '$in':
+                clauses.append(f"{key} IN [{', '.join(json.dumps(v) for v in operand)}]")
+            elif operator == '$nin':
+                clauses.append(f"{key} NOT IN [{', '.join(json.dumps(v) for v in operand)}]")
+            elif operator == '$exists':
+                clauses.append(f"{key} EXISTS" if operand else f"{key} NOT EXISTS")
+            elif operator in ('$gt', '$gte', '$lt', '$lte'):
+                symbol = {'$gt': '>', '$gte': '>=', '$lt': '<', '$lte': '<='}[operator]
+                clauses.append(f"{key} {symbol} {json.dumps(operand)}")
+            else:
+                raise ValueError(f"Unsupported filter operator: {operator}")
+    return ' AND '.join(clauses)
+
+
+class MeilisearchIndex:
+    """
+    Lexical search against the Meilisearch index kept in sync with the
+    Appwrite messages collection by the "Sync with Meilisearch" function.
+
+    New messages are also pushed as they are written, batched from a daemon
+    thread, so they are searchable before the next full sync. Filtered
+    attributes (channel_id, workspace_id, sender_id, sender_name, ts) must
+    be declared filterable in the index settings.
+    """
+
+    def __init__(self, endpoint: str, api_key: str, index: str = 'messages', timeout: float = 2.0,
+                 batch_size: int = 100, flush_interval: float = 1.0, max_queue: int = 10000):
+        self.base = f"{endpoint.rstrip('/')}/indexes/{index}"
+        self.api_key = api_key
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name='meilisearch-writer', daemon=True)
+        self._thread.start()
+
+    def _request(self, method: str, path: str, body=None) -> dict:
+        request = urllib.request.Request(
+            self.base + path,
+            data=json.dumps(body).encode('utf-8') if body is not None else None,
+            headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {self.api_key}'},
+            method=method
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read() or b'{}')
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[dict]):
+        for id, text, metadata in zip(ids, texts, metadatas):
+            try:
+                self._queue.put_nowait({**(metadata or {}), '$id': id, 'content': text})
+            except queue.Full:
+                self.dropped += 1
+
+    def delete(self, ids: Optional[List[str]] = None, filter: Optional[dict] = None):
+        if ids:
+            self._request('POST', '/documents/delete-batch', list(ids))
+        if filter:
+            self._request('POST', '/documents/delete', {'filter': to_meilisearch_filter(filter)})
+
+    def clear(self):
+        self._request('DELETE', '/documents')
+
+    def ready_for(self, filter: Optional[dict]) -> bool:
+        # The synced index already holds the whole collection
+        return True
+
+    def wait_until_ready(self, workspace_id: Optional[str] = None, timeout: Optional[float] = None) -> bool:
+        return True
+
+    def search(self, query: str, k: int = 4, filter: Optional[dict] = None) -> List[Hit]:
+        body = {'q': query, 'limit': k, 'showRankingScore': True}
+        expression = to_meilisearch_filter(filter)
+        if expression:
+            body['filter'] = expression
+        hits = []
+        for hit in self._request('POST', '/search', body).get('hits', []):
+            metadata = {key: value for key, value in hit.items() if not key.startswith(('$', '_')) and key != 'content'}
+            text = _TAG.sub('', hit.get('content') or '').strip()
+            hits.append((hit.get('$id'), text, metadata, hit.get('_rankingScore', 0.0)))
+        return hits
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self._request('POST', '/documents?primaryKey=%24id', batch)
+            except Exception as e:
+                logger.warning(f"Could not push {len(batch)} documents to Meilisearch: {e}")
+
+
+# Attributes of the Appwrite messages collection that make up a lexical document
+MESSAGE_FIELDS = ['content', 'channel_id', 'workspace_id', 'sender_id', 'sender_name', 'thread_id', 'edited_at']
+
+
+def message_record(document: dict) -> Tuple[str, str, dict]:
+    """(id, text, metadata) of an Appwrite message, with the metadata embed_message gives its vector"""
+    metadata = {key: document[key] for key in ('channel_id', 'workspace_id', 'sender_id', 'sender_name', 'thread_id')
+                if document.get(key) is not None}
+    metadata.update(timestamp_metadata(document.get('edited_at') or document.get('$createdAt')))
+    return document['$id'], document.get('content') or '', metadata
+
+
+def appwrite_message_pages(database, workspace_id: Optional[str] = None,
+                           page_size: int = 100) -> Iterable[List[dict]]:
+    """Pages of the messages collection (optionally one workspace's), in $id cursor order"""
+    from appwrite.query import Query
+    queries = [Query.select(MESSAGE_FIELDS)]
+    if workspace_id:
+        queries.append(Query.equal('workspace_id', workspace_id))
+    last_id = None
+    while True:
+        page = queries + [Query.limit(page_size)]
+        if last_id is not None:
+            page.append(Query.cursor_after(last_id))
+        documents = database.list_documents(database_id='main', collection_id='messages',
+                                            queries=page)['documents']
+        if documents:
+            yield documents
+            last_id = documents[-1]['$id']
+        if len(documents) < page_size:
+            return
+
+
+def appwrite_loader(database, page_size: int = 100) -> Loader:
+    """BM25Index loader reading a workspace's messages from the Appwrite messages collection"""
+    def load(workspace_id: str) -> Iterable[List[Tuple[str, str, dict]]]:
+        for documents in appwrite_message_pages(database, workspace_id, page_size):
+            yield [message_record(document) for document in documents if document.get('content')]
+    return load
@@ -0,0 +1,410 @@
+import heapq
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .filters import equality_value, matches_filter
+from .quantization import Float32Codec, get_codec
+
+logger = logging.getLogger('local_index')
+
+# (id, text, metadata, cosine score)
+Hit = Tuple[str, str, dict, float]
+
+
+def normalize(vectors) -> np.ndarray:
+    matrix = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def scope_of(filter: Optional[dict]) -> Optional[tuple]:
+    """('channel', id) or ('workspace', id) a filtered query is confined to, or None if unscoped"""
+    channel_id = equality_value(filter, 'channel_id')
+    if channel_id is not None:
+        return 'channel', channel_id
+    workspace_id = equality_value(filter, 'workspace_id')
+    if workspace_id is not None:
+        return 'workspace', workspace_id
+    return None
+
+
+class BruteForcePartition:
+    """
+    Exact kNN over a contiguous matrix of unit vectors: float32, or int8 /
+    packed sign bits when a quantization codec is given (scores are then
+    approximate).
+    """
+
+    kind = 'brute'
+
+    def __init__(self, dimensions: int, capacity: int = 64, codec=None):
+        self.codec = codec or Float32Codec()
+        self.dimensions = dimensions
+        self.matrix = np.zeros((capacity, self.codec.width(dimensions)), dtype=self.codec.dtype)
+        self.scales = np.ones(capacity, dtype=np.float32)
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[dict] = []
+        self.positions: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def upsert(self, id: str, text: str, metadata: dict, vector: np.ndarray):
+        position = self.positions.get(id)
+        if position is None:
+            position = len(self.ids)
+            if position == len(self.matrix):
+                grown = np.zeros((len(self.matrix) * 2, self.matrix.shape[1]), dtype=self.matrix.dtype)
+                grown[:position] = self.matrix
+                self.matrix = grown
+                self.scales = np.concatenate([self.scales, np.ones(position, dtype=np.float32)])
+            self.positions[id] = position
+            self.ids.append(id)
+            self.texts.append(text)
+            self.metadatas.append(metadata)
+        else:
+            self.texts[position] = text
+            self.metadatas[position] = metadata
+        codes, scales = self.codec.encode(vector[None, :])
+        self.matrix[position] = codes[0]
+        self.scales[position] = scales[0]
+
+    def remove(self, id: str):
+        position = self.positions.pop(id, None)
+        if position is None:
+            return
+        # Move the last record into the hole so rows stay contiguous
+        last = len(self.ids) - 1
+        if position != last:
+            self.matrix[position] = self.matrix[last]
+            self.scales[position] = self.scales[last]
+            self.ids[position] = self.ids[last]
+            self.texts[position] = self.texts[last]
+            self.metadatas[position] = self.metadatas[last]
+            self.positions[self.ids[position]] = position
+        self.ids.pop()
+        self.texts.pop()
+        self.metadatas.pop()
+
+    def vectors(self) -> np.ndarray:
+        """Stored rows as float32 unit-scale vectors (lossy when quantized)"""
+        count = len(self.ids)
+        return self.codec.decode(self.matrix[:count], self.scales[:count], self.dimensions)
+
+    def nbytes(self) -> int:
+        return self.matrix.nbytes + (self.scales.nbytes if self.codec.name == 'int8' else 0)
+
+    def records(self) -> Iterable[tuple]:
+        for position, id in enumerate(self.ids):
+            yield id, self.texts[position], self.metadatas[position], None
+
+    def search(self, query: np.ndarray, k: int, filter: Optional[dict]) -> List[Hit]:
+        count = len(self.ids)
+        if not count:
+            return []
+        scores = self.codec.scores(self.matrix[:count], self.scales[:count], query)
+        if not filter:
+            top = np.argpartition(-scores, k - 1)[:k] if k < count else np.arange(count)
+            order = top[np.argsort(-scores[top], kind='stable')]
+            return [(self.ids[i], self.texts[i], self.metadatas[i], float(scores[i])) for i in order]
+
+        # Check the filter in score order and stop once k records match
+        hits = []
+        for i in np.argsort(-scores, kind='stable'):
+            if matches_filter(self.metadatas[i], filter):
+                hits.append((self.ids[i], self.texts[i], self.metadatas[i], float(scores[i])))
+                if len(hits) == k:
+                    break
+        return hits
+
+
+class HNSWPartition:
+    """Approximate kNN with an hnswlib graph, for partitions too large to scan per query"""
+
+    kind = 'hnsw'
+
+    def __init__(self, dimensions: int, capacity: int = 4096, m: int = 16, ef_construction: int = 200,
+                 ef: int = 64):
+        import hnswlib
+
+        self.index = hnswlib.Index(space='ip', dim=dimensions)
+        self.index.init_index(max_elements=capacity, ef_construction=ef_construction, M=m,
+                              allow_replace_deleted=True)
+        self.index.set_ef(ef)
+        self.index.set_num_threads(1)
+        self.labels: Dict[str, int] = {}
+        self.entries: Dict[int, tuple] = {}
+        self._next_label = 0
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    @classmethod
+    def from_partition(cls, partition: BruteForcePartition, **kwargs) -> 'HNSWPartition':
+        count = len(partition)
+        hnsw = cls(partition.dimensions, capacity=max(count * 2, 1024), **kwargs)
+        hnsw.index.add_items(partition.vectors(), np.arange(count))
+        for label, (id, text, metadata, _) in enumerate(partition.records()):
+            hnsw.labels[id] = label
+            hnsw.entries[label] = (id, text, metadata)
+        hnsw._next_label = count
+        return hnsw
+
+    def upsert(self, id: str, text: str, metadata: dict, vector: np.ndarray):
+        label = self.labels.get(id)
+        if label is not None:
+            # Re-adding an existing label replaces its vector
+            self.index.add_items(vector[None, :], [label])
+        else:
+            if self.index.get_current_count() >= self.index.get_max_elements():
+                self.index.resize_index(self.index.get_max_elements() * 2)
+            label = self._next_label
+            self._next_label += 1
+            self.index.add_items(vector[None, :], [label], replace_deleted=True)
+            self.labels[id] = label
+        self.entries[label] = (id, text, metadata)
+
+    def remove(self, id: str):
+        label = self.labels.pop(id, None)
+        if label is not None:
+            self.index.mark_deleted(label)
+            del self.entries[label]
+
+    def search(self, query: np.ndarray, k: int, filter: Optional[dict]) -> List[Hit]:
+        if not self.labels:
+            return []
+        entries = self.entries
+        count = len(self.labels)
+        # Over-fetch and filter afterwards; hnswlib's per-node Python filter callback is slower
+        fetch = min(count, k * 10 if filter else k)
+        try:
+            labels, distances = self.index.knn_query(query, k=fetch)
+            # Inner-product distance is 1 - cosine similarity for unit vectors
+            hits = [
+                (*entries[int(label)], float(1.0 - distance))
+                for label, distance in zip(labels[0], distances[0])
+                if not filter or matches_filter(entries[int(label)][2], filter)
+            ]
+            if len(hits) >= k or fetch == count:
+                return hits[:k]
+        except RuntimeError:
+            pass
+
+        # The filter is too selective for the graph walk: score the matching records exactly
+        matching = [label for label, entry in entries.items() if not filter or matches_filter(entry[2], filter)]
+        if not matching:
+            return []
+        scores = self.index.get_items(matching, return_type='numpy') @ query
+        order = np.argsort(-scores, kind='stable')[:k]
+        return [(*entries[matching[i]], float(scores[i])) for i in order]
+
+
+class LocalVectorIndex:
+    """
+    In-process vector index partitioned by (workspace_id, channel_id).
+
+    Partitions start as brute-force NumPy matrices and switch to HNSW once
+    they pass `hnsw_threshold` records (when hnswlib is installed). A query
+    is only answered locally when the channel or workspace it is confined to
+    was loaded in full from the cold tier within the last `ttl` seconds;
+    otherwise `search()` returns None and the caller goes to the cold tier.
+    Writes made through this process are applied immediately. Least recently
+    used partitions are evicted past `max_vectors`.
+
+    With `quantization` set to 'int8' or 'binary', brute-force partitions
+    store compressed rows (see retrieval.quantization) and are not upgraded
+    to HNSW, which needs the float32 vectors.
+    """
+
+    def __init__(self, hnsw_threshold: int = 2000, max_vectors: int = 200_000, ttl: float = 60.0,
+                 quantization: Optional[str] = None):
+        self.hnsw_threshold = hnsw_threshold
+        self.max_vectors = max_vectors
+        self.ttl = ttl
+        self.codec = get_codec(quantization)
+        self.dimensions: Optional[int] = None
+        self._partitions: 'OrderedDict[tuple, object]' = OrderedDict()
+        self._locations: Dict[str, tuple] = {}
+        self._written: Dict[str, float] = {}
+        self._channels: Dict[str, set] = defaultdict(set)
+        self._workspaces: Dict[str, set] = defaultdict(set)
+        self._loaded: Dict[tuple, float] = {}
+        self._hnsw_available: Optional[bool] = None
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._locations)
+
+    def _partition(self, key: tuple):
+        partition = self._partitions.get(key)
+        if partition is None:
+            partition = self._partitions[key] = BruteForcePartition(self.dimensions, codec=self.codec)
+            workspace_id, channel_id = key
+            self._channels[channel_id].add(key)
+            self._workspaces[workspace_id].add(key)
+        self._partitions.move_to_end(key)
+        return partition
+
+    def _maybe_upgrade(self, key: tuple, partition):
+        if partition.kind != 'brute' or len(partition) <= self.hnsw_threshold or self.codec.name != 'none':
+            return
+        if self._hnsw_available is None:
+            try:
+                import hnswlib  # noqa: F401
+                self._hnsw_available = True
+            except ImportError:
+                logger.warning("hnswlib is not installed; large partitions stay on brute-force search")
+                self._hnsw_available = False
+        if self._hnsw_available:
+            self._partitions[key] = HNSWPartition.from_partition(partition)
+
+    def _upsert(self, id: str, text: str, metadata: dict, vector: np.ndarray):
+        key = (metadata.get('workspace_id'), metadata.get('channel_id'))
+        previous = self._locations.get(id)
+        if previous is not None and previous != key and previous in self._partitions:
+            self._partitions[previous].remove(id)
+        partition = self._partition(key)
+        partition.upsert(id, text, metadata, vector)
+        self._locations[id] = key
+        self._maybe_upgrade(key, partition)
+
+    def upsert(self, ids: List[str], texts: List[str], metadatas: List[dict], vectors):
+        """Apply writes made through this process"""
+        if not ids:
+            return
+        vectors = normalize(vectors)
+        now = time.monotonic()
+        with self._lock:
+            if self.dimensions is None:
+                self.dimensions = vectors.shape[1]
+            for id, text, metadata, vector in zip(ids, texts, metadatas, vectors):
+                self._upsert(id, text, dict(metadata or {}), vector)
+                self._written[id] = now
+            self._evict()
+
+    def _remove(self, id: str):
+        key = self._locations.pop(id, None)
+        self._written.pop(id, None)
+        if key is not None and key in self._partitions:
+            self._partitions[key].remove(id)
+
+    def delete(self, ids: Optional[List[str]] = None, filter: Optional[dict] = None):
+        with self._lock:
+            for id in ids or []:
+                self._remove(id)
+            if filter:
+                scope = scope_of(filter)
+                for key in self._keys(scope) if scope else list(self._partitions):
+                    partition = self._partitions.get(key)
+                    if partition is None:
+                        continue
+                    doomed = [hit[0] for hit in self._records(partition) if matches_filter(hit[2], filter)]
+                    for id in doomed:
+                        self._remove(id)
+
+    def clear(self):
+        with self._lock:
+            self._partitions.clear()
+            self._locations.clear()
+            self._written.clear()
+            self._channels.clear()
+            self._workspaces.clear()
+            self._loaded.clear()
+
+    @staticmethod
+    def _records(partition) -> Iterable[tuple]:
+        # Only ids and metadata are needed; vectors are not decoded
+        if partition.kind == 'brute':
+            return list(partition.records())
+        return [(id, text, metadata, None) for id, text, metadata in partition.entries.values()]
+
+    def _keys(self, scope: tuple) -> List[tuple]:
+        kind, value = scope
+        return list(self._channels.get(value, ()) if kind == 'channel' else self._workspaces.get(value, ()))
+
+    def is_loaded(self, scope: tuple) -> bool:
+        with self._lock:
+            loaded_at = self._loaded.get(scope)
+            if loaded_at is not None and time.monotonic() - loaded_at < self.ttl:
+                return True
+            if scope[0] == 'channel':
+                # A channel is also covered by a fresh load of its whole workspace
+                return any(self.is_loaded(('workspace', workspace_id))
+                           for workspace_id, _ in self._channels.get(scope[1], ()) if workspace_id is not None)
+            return False
+
+    def load(self, scope: tuple, records: List[tuple], started: float):
+        """
+        Replace `scope` with a complete snapshot of (id, text, metadata, vector)
+        records fetched from the cold tier starting at monotonic time `started`.
+        Local writes newer than the snapshot are kept.
+        """
+        vectors = normalize([record[3] for record in records]) if records else None
+        with self._lock:
+            if vectors is not None and self.dimensions is None:
+                self.dimensions = vectors.shape[1]
+            snapshot = {record[0] for record in records}
+            for key in self._keys(scope):
+                partition = self._partitions.get(key)
+                if partition is None:
+                    continue
+                for id, *_ in self._records(partition):
+                    if id not in snapshot and self._written.get(id, 0.0) < started:
+                        self._remove(id)
+            for (id, text, metadata, _), vector in zip(records, vectors if vectors is not None else []):
+                if self._written.get(id, 0.0) < started:
+                    self._upsert(id, text, dict(metadata), vector)
+            self._loaded[scope] = time.monotonic()
+            self._evict()
+
+    def _evict(self):
+        while len(self._locations) > self.max_vectors and len(self._partitions) > 1:
+            key, partition = self._partitions.popitem(last=False)
+            workspace_id, channel_id = key
+            for id, *_ in self._records(partition):
+                self._locations.pop(id, None)
+                self._written.pop(id, None)
+            self._channels[channel_id].discard(key)
+            self._workspaces[workspace_id].discard(key)
+            self._loaded.pop(('channel', channel_id), None)
+            self._loaded.pop(('workspace', workspace_id), None)
+
+    def search(self, vector, k: int, filter: Optional[dict]) -> Optional[List[Hit]]:
+        """Top-k hits for a channel- or workspace-scoped filter, or None when the cold tier must answer"""
+        scope = scope_of(filter)
+        if scope is None or k <= 0 or not self.is_loaded(scope):
+            return None
+        query = normalize(vector)[0]
+        workspace_id = equality_value(filter, 'workspace_id')
+        # Clauses the partition key already guarantees need not be checked per record
+        residual = {
+            key: condition for key, condition in filter.items()
+            if key not in ('channel_id', 'workspace_id') or equality_value(filter, key) is None
+        }
+        with self._lock:
+            if self.dimensions is not None and query.shape[0] != self.dimensions:
+                return None
+            hits = []
+            for key in self._keys(scope):
+                if workspace_id is not None and key[0] != workspace_id:
+                    continue
+                self._partitions.move_to_end(key)
+                hits.extend(self._partitions[key].search(query, k, residual))
+        return heapq.nlargest(k, hits, key=lambda hit: hit[3])
+
+    def stats(self) -> dict:
+        with self._lock:
+            kinds = defaultdict(int)
+            brute_bytes = 0
+            for partition in self._partitions.values():
+                kinds[partition.kind] += 1
+                if partition.kind == 'brute':
+                    brute_bytes += partition.nbytes()
+            return {'vectors': len(self._locations), 'partitions': dict(kinds), 'loaded_scopes': len(self._loaded),
+                    'quantization': self.codec.name, 'brute_force_bytes': brute_bytes}
@@ -0,0 +1,84 @@
+"""
+Record-level index access: listing, fetching, writing and deleting vectors
+by id, and querying them by metadata filter, for the hot tier's scope loads
+and for maintenance scripts (backfills, migrations).
+
+PineconeRecords adapts a Pinecone Index through its public API; the
+in-memory stand-in (fakes.vectorstore.InMemoryVectorStore) has the same
+methods. Get either for an index with fakes.factory.make_record_store.
+Records are {'values', 'metadata'} dicts with the text inside the metadata
+under TEXT_KEY, as PineconeVectorStore stores them.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Metadata field PineconeVectorStore keeps the document text in
+TEXT_KEY = 'text'
+# Largest top_k Pinecone accepts when a query includes values or metadata
+MAX_QUERY_TOP_K = 1000
+
+
+class PineconeRecords:
+    """Record-level access to a pinecone.Index"""
+
+    def __init__(self, index):
+        self.index = index
+        self._probe = None
+
+    def list_namespaces(self) -> List[str]:
+        return list(self.index.describe_index_stats()['namespaces'])
+
+    def list_ids(self, namespace: Optional[str] = None, limit: int = 100,
+                 prefix: Optional[str] = None) -> Iterable[List[str]]:
+        """Pages of record ids, optionally only those starting with `prefix`; Index.list is serverless-only"""
+        if prefix:
+            return self.index.list(prefix=prefix, namespace=namespace or '', limit=limit)
+        return self.index.list(namespace=namespace or '', limit=limit)
+
+    def fetch_vectors(self, ids: List[str], namespace: Optional[str] = None) -> Dict[str, dict]:
+        vectors = self.index.fetch(ids=ids, namespace=namespace or '').vectors
+        return {
+            id: {'values': list(vector.values), 'metadata': dict(vector.metadata or {})}
+            for id, vector in vectors.items()
+        }
+
+    def query_records(self, filter: Optional[dict], top_k: int, namespace: Optional[str] = None) -> List[dict]:
+        """
+        Up to `top_k` {'id', 'values', 'metadata'} records matching a metadata
+        filter, with one Index.query. The query vector only orders the
+        matches, so any fixed non-zero vector of the index's dimension does.
+        """
+        if self._probe is None:
+            self._probe = [1.0] + [0.0] * (self.index.describe_index_stats()['dimension'] - 1)
+        response = self.index.query(vector=self._probe, filter=filter, top_k=top_k, namespace=namespace or '',
+                                    include_values=True, include_metadata=True)
+        return [
+            {'id': match.id, 'values': list(match.values), 'metadata': dict(match.metadata or {})}
+            for match in response.matches
+        ]
+
+    def upsert_vectors(self, vectors: List[dict], namespace: Optional[str] = None):
+        self.index.upsert(vectors=vectors, namespace=namespace or '')
+
+    def delete(self, ids: List[str], namespace: Optional[str] = None):
+        self.index.delete(ids=ids, namespace=namespace or '')
+
+    def update_metadata(self, id: str, metadata: dict, namespace: Optional[str] = None):
+        self.index.update(id=id, set_metadata=metadata, namespace=namespace or '')
+
+
+def query_scope(records, filter: dict, limit: int, namespace: Optional[str] = None) -> Tuple[List[tuple], bool]:
+    """
+    The (id, text, metadata, vector) records of `namespace` that match
+    `filter`, from one query for `limit` + 1 records. Returns (records,
+    complete); complete is False, with no records, when more than `limit`
+    match.
+    """
+    matches = records.query_records(filter, limit + 1, namespace=namespace)
+    if len(matches) > limit:
+        return [], False
+    found = []
+    for match in matches:
+        metadata = dict(match['metadata'])
+        text = metadata.pop(TEXT_KEY, '')
+        found.append((match['id'], text, metadata, match['values']))
+    return found, True
@@ -0,0 +1,130 @@
+import logging
+import os
+from collections import defaultdict
+from typing import Any, Iterable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from .filters import equality_value
+
+logger = logging.getLogger('vector_namespaces')
+
+NAMESPACE_PREFIX = 'ws-'
+
+
+def workspace_namespace(workspace_id: Optional[str]) -> Optional[str]:
+    """Pinecone namespace holding a workspace's vectors; None (the default namespace) without a workspace"""
+    return f'{NAMESPACE_PREFIX}{workspace_id}' if workspace_id else None
+
+
+def _namespace_kwargs(namespace: Optional[str]) -> dict:
+    return {'namespace': namespace} if namespace is not None else {}
+
+
+class WorkspaceNamespacedStore(VectorStore):
+    """
+    Routes a vector store's reads and writes to one namespace per workspace.
+
+    Writes are grouped by their metadata's workspace_id; queries and
+    deletes use the namespace of the filter's workspace_id, so a query only
+    scans its own tenant's vectors. Only a call that names a namespace
+    explicitly goes through unchanged: anything else without a workspace_id
+    raises ValueError instead of falling back to the default namespace,
+    which loadEmbeddings/migrateNamespaces.py empties. Deleting a workspace
+    drops its namespace.
+    """
+
+    def __init__(self, store: VectorStore):
+        self.store = store
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.store.embeddings
+
+    def namespace_for(self, filter: Optional[dict]) -> str:
+        workspace_id = equality_value(filter, 'workspace_id')
+        if not workspace_id:
+            raise ValueError(f"Workspace-namespaced vector store needs a workspace_id filter, got {filter!r}")
+        return workspace_namespace(workspace_id)
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None,
+                  **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        if 'namespace' in kwargs:
+            return self.store.add_texts(texts, metadatas=metadatas, ids=ids, **kwargs)
+        if not all(metadata.get('workspace_id') for metadata in metadatas):
+            raise ValueError("Workspace-namespaced vector store needs a workspace_id in every document's metadata")
+
+        groups = defaultdict(list)
+        for position, metadata in enumerate(metadatas):
+            groups[workspace_namespace(metadata.get('workspace_id'))].append(position)
+        written = [None] * len(texts)
+        for namespace, positions in groups.items():
+            group_ids = self.store.add_texts(
+                [texts[i] for i in positions],
+                metadatas=[metadatas[i] for i in positions],
+                ids=[ids[i] for i in positions] if ids else None,
+                **_namespace_kwargs(namespace),
+                **kwargs
+            )
+            for position, id in zip(positions, group_ids):
+                written[position] = id
+        return written
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4, filter: Optional[dict] = None,
+                                               namespace: Optional[str] = None,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        namespace = namespace if namespace is not None else self.namespace_for(filter)
+        return self.store.similarity_search_by_vector_with_score(embedding, k=k, filter=filter,
+                                                                 **_namespace_kwargs(namespace))
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[dict] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(
+            self.embeddings.embed_query(query), k=k, filter=filter, **kwargs
+        )
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None,
+                          **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter, **kwargs)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[dict] = None,
+                                    **kwargs: Any) -> List[Document]:
+        return [
+            doc for doc, _ in
+            self.similarity_search_by_vector_with_score(embedding, k=k, filter=filter, **kwargs)
+        ]
+
+    def _select_relevance_score_fn(self):
+        return self.store._select_relevance_score_fn()
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> None:
+        if kwargs.get('namespace') is None:
+            filter = kwargs.get('filter')
+            kwargs['namespace'] = self.namespace_for(filter)
+            if ids is not None:
+                # The filter only picked the namespace; Pinecone deletes by ids or by filter
+                kwargs.pop('filter')
+            elif filter == {'workspace_id': filter.get('workspace_id')}:
+                # The whole namespace is the workspace
+                kwargs.pop('filter')
+                kwargs['delete_all'] = True
+        self.store.delete(ids=ids, **kwargs)
+
+    def drop_workspace(self, workspace_id: str):
+        """Delete every vector of a workspace by dropping its namespace"""
+        logger.info(f"Dropping namespace {workspace_namespace(workspace_id)}")
+        self.store.delete(delete_all=True, namespace=workspace_namespace(workspace_id))
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None, index_name: Optional[str] = None,
+                   **kwargs: Any) -> 'WorkspaceNamespacedStore':
+        """Namespaced routing over make_index_vectorstore(index_name), loaded with `texts`"""
+        from fakes.factory import make_index_vectorstore
+        store = cls(make_index_vectorstore(index_name or os.getenv('PINECONE_INDEX'), embedding, **kwargs))
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
@@ -0,0 +1,106 @@
+from typing import Optional
+
+import numpy as np
+
+# Set bits per byte value, for Hamming distances over packed sign bits
+_POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint16)
+
+
+def shorten(vectors, dimensions: Optional[int]) -> np.ndarray:
+    """
+    First `dimensions` components of each vector, renormalized to unit length.
+    text-embedding-3 vectors shortened this way match what the API returns for
+    the same `dimensions` parameter.
+    """
+    matrix = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    if dimensions and dimensions < matrix.shape[1]:
+        matrix = matrix[:, :dimensions]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class Float32Codec:
+    """Vectors stored as they are"""
+
+    name = 'none'
+    dtype = np.float32
+
+    def width(self, dimensions: int) -> int:
+        return dimensions
+
+    def encode(self, vectors: np.ndarray):
+        return np.asarray(vectors, dtype=np.float32), np.ones(len(vectors), dtype=np.float32)
+
+    def decode(self, rows: np.ndarray, scales: np.ndarray, dimensions: int) -> np.ndarray:
+        return rows
+
+    def scores(self, rows: np.ndarray, scales: np.ndarray, query: np.ndarray) -> np.ndarray:
+        return rows @ query
+
+
+class Int8Codec:
+    """
+    Symmetric per-vector int8 quantization: a quarter of the memory, scores
+    within about 1% of the float32 cosine.
+    """
+
+    name = 'int8'
+    dtype = np.int8
+
+    def width(self, dimensions: int) -> int:
+        return dimensions
+
+    def encode(self, vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def decode(self, rows: np.ndarray, scales: np.ndarray, dimensions: int) -> np.ndarray:
+        return rows.astype(np.float32) * scales[:, None]
+
+    def scores(self, rows: np.ndarray, scales: np.ndarray, query: np.ndarray) -> np.ndarray:
+        return (rows.astype(np.float32) @ query) * scales
+
+
+class BinaryCodec:
+    """
+    One sign bit per dimension (1/32 of the memory). Scores are
+    1 - 2 * hamming / dimensions, an approximation that preserves ranking
+    less well than int8.
+    """
+
+    name = 'binary'
+    dtype = np.uint8
+
+    def width(self, dimensions: int) -> int:
+        return (dimensions + 7) // 8
+
+    def encode(self, vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return np.packbits(vectors > 0, axis=1), np.full(len(vectors), vectors.shape[1], dtype=np.float32)
+
+    def decode(self, rows: np.ndarray, scales: np.ndarray, dimensions: int) -> np.ndarray:
+        signs = np.unpackbits(rows, axis=1, count=dimensions).astype(np.float32) * 2 - 1
+        return signs / np.sqrt(dimensions)
+
+    def scores(self, rows: np.ndarray, scales: np.ndarray, query: np.ndarray) -> np.ndarray:
+        bits = np.packbits(query > 0)
+        hamming = _POPCOUNT[np.bitwise_xor(rows, bits)].sum(axis=1)
+        return 1.0 - 2.0 * hamming / scales
+
+
+CODECS = {codec.name: codec for codec in (Float32Codec(), Int8Codec(), BinaryCodec())}
+
+
+def get_codec(name: Optional[str]):
+    try:
+        return CODECS[(name or 'none').lower()]
+    except KeyError:
+        raise ValueError(f"Unknown quantization {name!r}; expected one of {', '.join(CODECS)}")
+
+
+def bytes_per_vector(dimensions: int, quantization: Optional[str]) -> int:
+    """Storage for one vector, counting the per-vector scale of int8"""
+    codec = get_codec(quantization)
+    extra = 4 if codec.name == 'int8' else 0
+    return codec.width(dimensions) * np.dtype(codec.dtype).itemsize + extra
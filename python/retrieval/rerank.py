@@ -0,0 +1,77 @@
+import asyncio
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from .chunking import collapse_chunks
+from .timestamps import message_time
+
+# How much each signal contributes to a candidate's score; relevance and recency are scaled to [0, 1]
+RELEVANCE_WEIGHT = 1.0
+RECENCY_WEIGHT = 0.5
+AFFINITY_WEIGHT = 0.3
+# Subtracted once per already-selected message from the same sender (MMR over senders)
+DIVERSITY_PENALTY = 0.3
+HALF_LIFE = 6 * 3600.0
+# Candidates fetched per context slot before re-ranking
+OVERFETCH = 4
+
+
+async def fetch_candidates(retriever, query: str, k: int, filter: Optional[dict] = None) -> List[Tuple[Document, float]]:
+    """(document, relevance) pairs from a HybridRetriever or a plain vector store retriever"""
+    if hasattr(retriever, 'asearch_with_scores'):
+        return await retriever.asearch_with_scores(query, k=k, filter=filter)
+    candidates = await retriever.vectorstore.asimilarity_search_with_relevance_scores(query, k=k, filter=filter)
+    # Collapsing may fetch a long message's other chunks from the index
+    return await asyncio.to_thread(collapse_chunks, candidates, getattr(retriever.vectorstore, 'fetch_documents', None))
+
+
+def rerank(candidates: List[Tuple[Document, float]], k: int, now: Optional[float] = None,
+           thread_id: Optional[str] = None, channel_id: Optional[str] = None,
+           half_life: float = HALF_LIFE, relevance_weight: float = RELEVANCE_WEIGHT,
+           recency_weight: float = RECENCY_WEIGHT, affinity_weight: float = AFFINITY_WEIGHT,
+           diversity_penalty: float = DIVERSITY_PENALTY) -> List[Document]:
+    """
+    Pick `k` of the over-fetched `candidates` by relevance, exponential time
+    decay, and affinity to the current thread/channel, greedily penalizing
+    senders that are already represented. The penalty only changes the
+    order when the candidates span several senders; callers pass
+    diversity_penalty=0 for pools filtered to one sender. Returned in
+    selection order.
+    """
+    if not candidates:
+        return []
+    now = time.time() if now is None else now
+    documents = [doc for doc, _ in candidates]
+
+    relevance = np.array([score for _, score in candidates], dtype=np.float64)
+    spread = relevance.max() - relevance.min()
+    relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones_like(relevance)
+
+    times = np.array([message_time(doc.metadata) for doc in documents], dtype=np.float64)
+    age = np.maximum(now - times, 0.0)
+    # Messages without a known time get no recency credit
+    recency = np.where(times > 0, np.exp2(-age / half_life), 0.0)
+
+    affinity = np.zeros(len(documents))
+    if thread_id is not None:
+        affinity += np.array([doc.metadata.get('thread_id') == thread_id for doc in documents], dtype=np.float64)
+    if channel_id is not None:
+        affinity += 0.5 * np.array([doc.metadata.get('channel_id') == channel_id for doc in documents],
+                                   dtype=np.float64)
+
+    base = relevance_weight * relevance + recency_weight * recency + affinity_weight * affinity
+
+    _, senders = np.unique([str(doc.metadata.get('sender_id')) for doc in documents], return_inverse=True)
+    picked_per_sender = np.zeros(senders.max() + 1)
+    available = np.ones(len(documents), dtype=bool)
+    selected = []
+    for _ in range(min(k, len(documents))):
+        scores = np.where(available, base - diversity_penalty * picked_per_sender[senders], -np.inf)
+        best = int(np.argmax(scores))
+        selected.append(documents[best])
+        available[best] = False
+        picked_per_sender[senders[best]] += 1
+    return selected
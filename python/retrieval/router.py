@@ -0,0 +1,248 @@
+import logging
+import re
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger('query_router')
+
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+_CAMEL = re.compile(r'(?<=[a-z0-9])(?=[A-Z])')
+_TAG = re.compile(r'([@#])([\w-]+)')
+_CHANNEL_CUE = re.compile(r'\bchannels?\b|#', re.IGNORECASE)
+# Phrasings that name a speaker; an unmatched name here is worth asking the LLM about
+_PERSON_CUE = re.compile(
+    r"\b(?:did|does|has|would|will|could)\s+@?[\w-]+\s+(?:ever\s+)?(?:say|said|think|mention|talk|post|write|feel|argue)\b"
+    r"|\b[\w-]+\s+(?:said|says|thinks|mentioned|posted|wrote|argued)\b"
+    r"|\baccording\s+to\b|\b[\w-]+'s\s+(?:opinion|view|take|messages?|posts?)\b",
+    re.IGNORECASE
+)
+
+
+def normalize(text: str) -> str:
+    """Lowercase words separated by single spaces; punctuation and hyphens become spaces"""
+    return _NON_WORD.sub(' ', text.lower()).strip()
+
+
+def name_variants(name: str) -> List[str]:
+    """Normalized spellings of a display name: 'SwissMissBliss' also matches 'swiss miss bliss'"""
+    variants = {normalize(name), normalize(_CAMEL.sub(' ', name))}
+    return [variant for variant in variants if len(variant) >= 3]
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton over normalized text. Patterns only match whole
+    words, so 'al' never matches inside 'urban'. Every pattern carries a
+    payload that is returned with its matches.
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[int, object]]] = [[]]
+        self._built = True
+
+    def add(self, pattern: str, payload: object):
+        # Padding with spaces makes word boundaries part of the pattern
+        pattern = f' {pattern} '
+        state = 0
+        for char in pattern:
+            if char not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][char] = len(self._goto) - 1
+            state = self._goto[state][char]
+        self._output[state].append((len(pattern), payload))
+        self._built = False
+
+    def build(self):
+        pending = deque()
+        for state in self._goto[0].values():
+            self._fail[state] = 0
+            pending.append(state)
+        while pending:
+            state = pending.popleft()
+            for char, child in self._goto[state].items():
+                pending.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+        self._built = True
+
+    def find(self, text: str) -> List[Tuple[int, int, object]]:
+        """(start, end, payload) for every pattern occurrence in normalized `text`"""
+        if not self._built:
+            self.build()
+        text = f' {text} '
+        matches = []
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for length, payload in self._output[state]:
+                matches.append((position - length + 1, position + 1, payload))
+        return matches
+
+
+def longest_matches(matches: List[Tuple[int, int, object]]) -> List[Tuple[int, int, object]]:
+    """Drop matches that overlap a longer one, e.g. 'bliss' inside 'swiss miss bliss'"""
+    chosen = []
+    for start, end, payload in sorted(matches, key=lambda match: match[0] - match[1]):
+        # Matches share their padding spaces, so touching ends are not overlaps
+        if all(end - 1 <= other_start or start >= other_end - 1 for other_start, other_end, _ in chosen):
+            chosen.append((start, end, payload))
+    return sorted(chosen, key=lambda match: match[0])
+
+
+class QueryRouter:
+    """
+    Decides how to scope a retrieval query without an LLM round trip.
+
+    Persona names and channel names/ids are compiled into one Aho-Corasick
+    automaton; a query that mentions any of them is routed locally to a
+    person and/or channel filter. Channel names only count next to a '#'
+    or the word "channel", since names like "general" are ordinary words.
+    Queries with no match are themes unless they look like they name a
+    speaker or channel the dictionary does not know; only those go to
+    `classifier`, whose answers are cached.
+
+    Routes are dicts: {'type': 'person' | 'channel' | 'theme', 'value',
+    'filter', 'source': 'rules' | 'llm' | 'cache'}.
+    """
+
+    def __init__(self, personas: Optional[List[dict]] = None, channels: Optional[List[dict]] = None,
+                 classifier: Optional[Callable[[str], str]] = None, cache_size: int = 1024):
+        self.classifier = classifier
+        self.cache_size = cache_size
+        self.people: Dict[str, dict] = {}
+        self.channels: Dict[str, dict] = {}
+        self._matcher = AhoCorasick()
+        self._cache: 'OrderedDict[str, dict]' = OrderedDict()
+        self._lock = threading.Lock()
+        for persona in personas or []:
+            self.add_person(persona['name'], persona.get('$id'))
+        for channel in channels or []:
+            self.add_channel(channel['$id'], channel.get('name'))
+
+    def add_person(self, name: str, id: Optional[str] = None):
+        entry = {'kind': 'person', 'name': name, 'id': id}
+        for variant in name_variants(name):
+            self.people[variant] = entry
+            self._matcher.add(variant, entry)
+
+    def add_channel(self, id: str, name: Optional[str] = None):
+        entry = {'kind': 'channel', 'name': name, 'id': id}
+        self.channels[normalize(id)] = entry
+        self._matcher.add(normalize(id), dict(entry, by_id=True))
+        for variant in name_variants(name or ''):
+            self.channels[variant] = entry
+            self._matcher.add(variant, entry)
+
+    def match(self, query: str) -> Tuple[List[dict], List[dict]]:
+        """Known (people, channels) mentioned in `query`"""
+        channel_cue = bool(_CHANNEL_CUE.search(query))
+        people, channels = [], []
+        for _, _, entry in longest_matches(self._matcher.find(normalize(query))):
+            if entry['kind'] == 'person':
+                if entry not in people:
+                    people.append(entry)
+            elif entry.get('by_id') or channel_cue:
+                channel = self.channels[normalize(entry['id'])]
+                if channel not in channels:
+                    channels.append(channel)
+        return people, channels
+
+    def route(self, query: str) -> dict:
+        people, channels = self.match(query)
+        if people or channels:
+            return self._route(people, channels, 'rules')
+        if self.classifier is None or not self._ambiguous(query):
+            return {'type': 'theme', 'value': None, 'filter': None, 'source': 'rules'}
+        return self._classify(query)
+
+    def _ambiguous(self, query: str) -> bool:
+        return bool(_PERSON_CUE.search(query) or _TAG.search(query) or _CHANNEL_CUE.search(query))
+
+    def _classify(self, query: str) -> dict:
+        key = normalize(query)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return dict(cached, source='cache')
+        try:
+            route = self.parse_classification(self.classifier(query))
+        except Exception as e:
+            logger.warning(f"Query classification failed, searching without filters: {e}")
+            return {'type': 'theme', 'value': None, 'filter': None, 'source': 'rules'}
+        with self._lock:
+            self._cache[key] = route
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return dict(route)
+
+    def parse_classification(self, label: str) -> dict:
+        """Turn an LLM label like 'person:john' or 'channel:123' into a route"""
+        kind, _, value = label.strip().strip('\'"').partition(':')
+        kind, value = kind.strip().lower(), value.strip().lstrip('@#')
+        if kind == 'person' and value:
+            person = self.people.get(normalize(value))
+            if person:
+                return self._route([person], [], 'llm')
+            # Unknown speaker: no exact sender_name to filter on, the lexical side indexes names
+            return {'type': 'person', 'value': value, 'filter': None, 'source': 'llm'}
+        if kind == 'channel' and value:
+            channel = self.channels.get(normalize(value))
+            if channel:
+                return self._route([], [channel], 'llm')
+            return {'type': 'channel', 'value': value, 'filter': None, 'source': 'llm'}
+        return {'type': 'theme', 'value': value or None, 'filter': None, 'source': 'llm'}
+
+    @staticmethod
+    def _route(people: List[dict], channels: List[dict], source: str) -> dict:
+        filter = {}
+        names = [person['name'] for person in people]
+        if len(names) == 1:
+            filter['sender_name'] = names[0]
+        elif names:
+            filter['sender_name'] = {'$in': names}
+        channel_ids = [channel['id'] for channel in channels]
+        if len(channel_ids) == 1:
+            filter['channel_id'] = channel_ids[0]
+        elif channel_ids:
+            filter['channel_id'] = {'$in': channel_ids}
+        return {
+            'type': 'person' if people else 'channel',
+            'value': names[0] if len(names) == 1 else names or (channel_ids[0] if len(channel_ids) == 1 else channel_ids),
+            'filter': filter,
+            'source': source
+        }
+
+
+def _list_all(database, collection_id: str, queries: list) -> List[dict]:
+    from appwrite.query import Query
+    documents = []
+    while True:
+        page = queries + [Query.limit(100)]
+        if documents:
+            page.append(Query.cursor_after(documents[-1]['$id']))
+        batch = database.list_documents(database_id='main', collection_id=collection_id, queries=page)['documents']
+        documents.extend(batch)
+        if len(batch) < 100:
+            return documents
+
+
+def router_from_appwrite(database, workspace_id: Optional[str] = None,
+                         classifier: Optional[Callable[[str], str]] = None) -> QueryRouter:
+    """QueryRouter over the ai_personas and channels collections, optionally for one workspace"""
+    from appwrite.query import Query
+    queries = [Query.equal('workspace_id', workspace_id)] if workspace_id else []
+    personas = _list_all(database, 'ai_personas', queries + [Query.select(['$id', 'name'])])
+    channels = _list_all(database, 'channels', queries + [Query.select(['$id', 'name'])])
+    logger.info(f"Query router loaded {len(personas)} personas and {len(channels)} channels")
+    return QueryRouter(personas, channels, classifier=classifier)
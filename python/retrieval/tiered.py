@@ -0,0 +1,236 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from .filters import equality_value
+from .local_index import LocalVectorIndex, scope_of
+from .maintenance import MAX_QUERY_TOP_K, TEXT_KEY, query_scope
+
+logger = logging.getLogger('tiered_vectorstore')
+
+
+class EmbeddingMemo(Embeddings):
+    """
+    Remembers the vectors of recently embedded documents so a write that is
+    mirrored to two tiers is only embedded once.
+    """
+
+    def __init__(self, embedding: Embeddings, size: int = 256):
+        self.embedding = embedding
+        self.size = size
+        self._recent: 'OrderedDict[str, List[float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            cached = [self._recent.get(text) for text in texts]
+        missing = [text for text, vector in zip(texts, cached) if vector is None]
+        if missing:
+            computed = dict(zip(missing, self.embedding.embed_documents(missing)))
+            with self._lock:
+                for text, vector in computed.items():
+                    self._recent[text] = vector
+                    self._recent.move_to_end(text)
+                while len(self._recent) > self.size:
+                    self._recent.popitem(last=False)
+            cached = [vector if vector is not None else computed[text] for text, vector in zip(texts, cached)]
+        return cached
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embedding.embed_query(text)
+
+
+class TieredVectorStore(VectorStore):
+    """
+    Local hot tier in front of a remote (cold) vector store.
+
+    Writes go to both tiers. Queries whose filter pins a channel_id or
+    workspace_id are answered from the LocalVectorIndex once that scope has
+    been loaded; anything else, and any scope still loading, is answered by
+    the cold tier. Scopes are loaded in the background after their first
+    cold query and reloaded after the index's TTL, so records written by
+    other processes show up within that window. Scopes are read through
+    `records` (retrieval.maintenance) with one filtered query; without it
+    scopes are never loaded. Scopes with more than `hydrate_limit` records
+    stay on the cold tier; the limit is capped below Pinecone's top_k limit. An optional lexical index
+    (retrieval.lexical) receives the same writes and deletes.
+    """
+
+    def __init__(self, cold: VectorStore, embedding: Embeddings, local: Optional[LocalVectorIndex] = None,
+                 hydrate_limit: int = 999, workers: int = 2, lexical=None, records=None):
+        self.cold = cold
+        self._embedding = embedding
+        self.local = local if local is not None else LocalVectorIndex()
+        self.lexical = lexical
+        self.records = records
+        # One record more than the limit is queried to detect oversized scopes
+        self.hydrate_limit = min(hydrate_limit, MAX_QUERY_TOP_K - 1)
+        self.stats: Counter = Counter()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='vector-hydrate')
+        self._hydrating = set()
+        self._oversized = {}
+        self._lock = threading.Lock()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None,
+                  **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        vectors = self._embedding.embed_documents(texts)
+        # PineconeVectorStore adds the text to the metadata dicts it is given
+        ids = self.cold.add_texts(texts, metadatas=[dict(metadata) for metadata in metadatas], ids=ids, **kwargs)
+        if 'namespace' not in kwargs:
+            self.local.upsert(ids, texts, metadatas, vectors)
+            if self.lexical is not None:
+                self.lexical.add(ids, texts, metadatas)
+        return ids
+
+    def add_documents(self, documents: List[Document], **kwargs: Any) -> List[str]:
+        if 'ids' not in kwargs and any(doc.id for doc in documents):
+            kwargs['ids'] = [doc.id or str(uuid.uuid4()) for doc in documents]
+        return self.add_texts([doc.page_content for doc in documents], [doc.metadata for doc in documents], **kwargs)
+
+    def _hydrate(self, scope: tuple, workspace_id: Optional[str] = None):
+        try:
+            filter = {'channel_id' if scope[0] == 'channel' else 'workspace_id': scope[1]}
+            if workspace_id is not None:
+                # Lets a namespaced cold tier look in the workspace's namespace
+                filter['workspace_id'] = workspace_id
+            started = time.monotonic()
+            records, complete = query_scope(self.records, filter, self.hydrate_limit, self._records_namespace(filter))
+            if not complete:
+                # Too large to load; try again after the TTL in case it shrank
+                with self._lock:
+                    self._oversized[scope] = time.monotonic()
+                self.stats['oversized'] += 1
+                return
+            self.local.load(scope, records, started)
+            self.stats['hydrations'] += 1
+        except Exception as e:
+            logger.warning(f"Could not load {scope[0]} {scope[1]} into the local index: {e}")
+        finally:
+            with self._lock:
+                self._hydrating.discard(scope)
+
+    def _records_namespace(self, filter: dict) -> Optional[str]:
+        namespace_for = getattr(self.cold, 'namespace_for', None)
+        return namespace_for(filter) if namespace_for else None
+
+    def fetch_documents(self, ids: List[str], workspace_id: Optional[str] = None) -> List[Document]:
+        """Stored documents by id, read from the record store (e.g. a long message's other chunks)"""
+        if self.records is None:
+            return []
+        vectors = self.records.fetch_vectors(ids, namespace=self._records_namespace({'workspace_id': workspace_id}))
+        documents = []
+        for id, vector in vectors.items():
+            metadata = dict(vector['metadata'])
+            documents.append(Document(id=id, page_content=metadata.pop(TEXT_KEY, ''), metadata=metadata))
+        return documents
+
+    def list_ids(self, prefix: str, workspace_id: Optional[str] = None) -> List[str]:
+        """Stored ids starting with `prefix`, e.g. '<parent_id>#' for a message's chunks"""
+        if self.records is None:
+            return []
+        namespace = self._records_namespace({'workspace_id': workspace_id})
+        return [id for page in self.records.list_ids(namespace=namespace, prefix=prefix) for id in page]
+
+    def _schedule_hydration(self, scope: tuple, workspace_id: Optional[str] = None):
+        if self.records is None:
+            return
+        with self._lock:
+            oversized_at = self._oversized.get(scope)
+            if scope in self._hydrating or (oversized_at and time.monotonic() - oversized_at < self.local.ttl):
+                return
+            self._hydrating.add(scope)
+        self._executor.submit(self._hydrate, scope, workspace_id)
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4, filter: Optional[dict] = None,
+                                               namespace: Optional[str] = None,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        if namespace is None:
+            namespace_for = getattr(self.cold, 'namespace_for', None)
+            if namespace_for is not None:
+                # Fails without a workspace_id, as the cold tier would, rather than answering from the cache
+                namespace_for(filter)
+            hits = self.local.search(embedding, k, filter)
+            if hits is not None:
+                self.stats['local'] += 1
+                return [
+                    (Document(id=id, page_content=text, metadata=dict(metadata)), score)
+                    for id, text, metadata, score in hits
+                ]
+            scope = scope_of(filter)
+            if scope is not None:
+                self._schedule_hydration(scope, equality_value(filter, 'workspace_id'))
+        self.stats['cold'] += 1
+        return self.cold.similarity_search_by_vector_with_score(embedding, k=k, filter=filter, namespace=namespace)
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[dict] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(
+            self._embedding.embed_query(query), k=k, filter=filter, **kwargs
+        )
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None,
+                          **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter, **kwargs)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[dict] = None,
+                                    **kwargs: Any) -> List[Document]:
+        return [
+            doc for doc, _ in
+            self.similarity_search_by_vector_with_score(embedding, k=k, filter=filter, **kwargs)
+        ]
+
+    def _select_relevance_score_fn(self):
+        return self.cold._select_relevance_score_fn()
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> None:
+        self.cold.delete(ids=ids, **kwargs)
+        if kwargs.get('namespace') is not None:
+            return
+        if kwargs.get('delete_all'):
+            self.local.clear()
+            if self.lexical is not None:
+                self.lexical.clear()
+        else:
+            # With ids, a filter only picks the cold tier's namespace
+            filter = kwargs.get('filter') if ids is None else None
+            self.local.delete(ids=ids, filter=filter)
+            if self.lexical is not None:
+                self.lexical.delete(ids=ids, filter=filter)
+
+    def drop_workspace(self, workspace_id: str):
+        """Delete every vector of a workspace from both tiers and the lexical index"""
+        if hasattr(self.cold, 'drop_workspace'):
+            self.cold.drop_workspace(workspace_id)
+        else:
+            self.cold.delete(filter={'workspace_id': workspace_id})
+        self.local.delete(filter={'workspace_id': workspace_id})
+        if self.lexical is not None:
+            self.lexical.delete(filter={'workspace_id': workspace_id})
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None, index_name: Optional[str] = None,
+                   **kwargs: Any) -> 'TieredVectorStore':
+        """A new hot tier over make_cold_vectorstore(index_name), loaded with `texts`"""
+        from fakes.factory import make_cold_vectorstore, make_record_store
+        index_name = index_name or os.getenv('PINECONE_INDEX')
+        store = cls(make_cold_vectorstore(index_name, embedding), embedding,
+                    records=make_record_store(index_name, embedding), **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
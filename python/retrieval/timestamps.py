@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Union
+
+# Epoch seconds; Pinecone range operators ($gt, $gte, $lt, $lte) only work on numbers
+TS_KEY = 'ts'
+
+Instant = Union[datetime, str, int, float]
+
+
+def to_epoch(value: Optional[Instant]) -> Optional[float]:
+    """Epoch seconds from a datetime, an ISO string (Appwrite's '...Z' included) or a number"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    # Naive datetimes are local time, as produced by datetime.now()
+    return value.timestamp()
+
+
+def timestamp_metadata(when: Optional[Instant] = None) -> dict:
+    """Vector metadata for a message time: the ISO string shown in prompts plus numeric `ts` for filtering"""
+    if when is None or when == '':
+        when = datetime.now(timezone.utc)
+    elif not isinstance(when, datetime):
+        when = datetime.fromtimestamp(to_epoch(when), timezone.utc)
+    return {'timestamp': when.isoformat(), TS_KEY: when.timestamp()}
+
+
+def time_window(since: Optional[Instant] = None, until: Optional[Instant] = None,
+                last: Optional[Union[timedelta, float]] = None) -> Optional[dict]:
+    """
+    Range condition on `ts` for messages at or after `since` and before
+    `until`. `last` (a timedelta or seconds) is shorthand for since = now - last.
+    """
+    if last is not None:
+        seconds = last.total_seconds() if isinstance(last, timedelta) else float(last)
+        since = datetime.now(timezone.utc).timestamp() - seconds
+    condition = {}
+    if since is not None:
+        condition['$gte'] = to_epoch(since)
+    if until is not None:
+        condition['$lt'] = to_epoch(until)
+    return condition or None
+
+
+def with_time_window(filter: Optional[dict], since: Optional[Instant] = None, until: Optional[Instant] = None,
+                     last: Optional[Union[timedelta, float]] = None) -> Optional[dict]:
+    """`filter` narrowed to a time window; returns `filter` unchanged when no bound is given"""
+    condition = time_window(since, until, last)
+    if condition is None:
+        return filter
+    if not filter:
+        return {TS_KEY: condition}
+    if TS_KEY in filter:
+        return {'$and': [filter, {TS_KEY: condition}]}
+    return {**filter, TS_KEY: condition}
+
+
+def message_time(metadata: dict) -> float:
+    """Sort key for retrieved messages: `ts`, else the parsed ISO timestamp, else 0"""
+    ts = metadata.get(TS_KEY)
+    if isinstance(ts, (int, float)):
+        return float(ts)
+    try:
+        return to_epoch(metadata.get('timestamp')) or 0.0
+    except ValueError:
+        return 0.0
@@ -1,10 +1,11 @@
-from langchain_openai import OpenAIEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_pinecone import PineconeVectorStore
 import os
 from dotenv import load_dotenv
 import logging
 
+from fakes.factory import make_embeddings, make_vectorstore
+from retrieval.chunking import chunk_message
+from retrieval.timestamps import timestamp_metadata
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -25,7 +26,8 @@ def embed_message(message):
     Embeds a chat message into the vector database
     
     Args:
-        message (dict): Message object containing content, channel_id, sender_id and workspace_id
+        message (dict): Message object containing content, channel_id, sender_id and workspace_id,
+            and optionally edited_at or $createdAt for the timestamp metadata and $id for the vector id
     """
     logger.info(f"Processing message from sender {message['sender_id']} in channel {message['channel_id']}")
     
@@ -35,26 +37,70 @@ def embed_message(message):
         "metadata": {
             "channel_id": message["channel_id"],
             "workspace_id": message["workspace_id"], 
-            "sender_id": message["sender_id"]
+            "sender_id": message["sender_id"],
+            **timestamp_metadata(message.get("edited_at") or message.get("$createdAt"))
         }
     }
     logger.debug(f"Created document with metadata: {document['metadata']}")
 
     # Initialize embeddings model
     logger.debug("Initializing OpenAI embeddings model")
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+    embeddings = make_embeddings(model="text-embedding-3-large")
 
-    # Split content if needed
-    logger.debug("Splitting content into chunks")
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-    documents = text_splitter.create_documents([document["page_content"]], metadatas=[document["metadata"]])
-    logger.debug(f"Split into {len(documents)} chunks")
+    # Short messages are embedded whole; long ones are split into chunks that share a parent_id
+    texts, metadatas, ids = chunk_message(document["page_content"], document["metadata"], message.get("$id"))
+    logger.debug(f"Embedding {len(texts)} chunks")
 
-    # Store in Pinecone
+    # Store in Pinecone; the workspace_id metadata routes the chunks to the workspace's namespace
     logger.info("Storing embeddings in Pinecone")
     try:
-        PineconeVectorStore.from_documents(documents=documents, embedding=embeddings, index_name=PINECONE_INDEX)
+        vectorstore = make_vectorstore(PINECONE_INDEX, embeddings)
+        vectorstore.add_texts(texts, metadatas=metadatas, ids=ids)
         logger.info("Successfully stored embeddings in Pinecone")
+        if message.get("$id"):
+            delete_stale_chunks(vectorstore, message["$id"], message["workspace_id"], ids)
     except Exception as e:
         logger.error(f"Failed to store embeddings in Pinecone: {str(e)}")
         raise
+
+def delete_stale_chunks(vectorstore, message_id, workspace_id, ids):
+    """
+    Deletes vectors left from an earlier embedding of a re-embedded message:
+    chunks past its new chunk count, its chunks once it fits in one vector,
+    or its whole-message vector once it is chunked
+
+    Args:
+        vectorstore: Store the message was written to; needs list_ids (TieredVectorStore)
+        message_id (str): The message's $id, which its vector ids start with
+        workspace_id (str): Workspace of the message
+        ids (list): Vector ids just written for the message
+    """
+    if not hasattr(vectorstore, 'list_ids'):
+        return
+    try:
+        stale = [
+            id for id in vectorstore.list_ids(message_id, workspace_id)
+            if (id == message_id or id.startswith(f"{message_id}#")) and id not in ids
+        ]
+        if stale:
+            vectorstore.delete(ids=stale, filter={"workspace_id": workspace_id})
+            logger.info(f"Deleted {len(stale)} stale vectors of message {message_id}")
+    except Exception as e:
+        logger.warning(f"Could not check message {message_id} for stale chunks: {e}")
+
+def delete_workspace_embeddings(workspace_id):
+    """
+    Deletes every embedded message of a workspace
+
+    Args:
+        workspace_id (str): Workspace whose vectors are removed; with per-workspace
+            namespaces this drops the namespace in one call
+    """
+    logger.info(f"Deleting embeddings for workspace {workspace_id}")
+    embeddings = make_embeddings(model="text-embedding-3-large")
+    vectorstore = make_vectorstore(PINECONE_INDEX, embeddings)
+    if hasattr(vectorstore, 'drop_workspace'):
+        vectorstore.drop_workspace(workspace_id)
+    else:
+        vectorstore.delete(filter={"workspace_id": workspace_id})
+    logger.info(f"Deleted embeddings for workspace {workspace_id}")
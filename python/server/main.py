@@ -1,13 +1,25 @@
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import hmac
 import json
+import os
 import sys
+import time
 from pathlib import Path
 
+# Add the parent directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
 
-from embeddings import embed_message
+from embeddings import embed_message, delete_workspace_embeddings
+from monitoring.performance_logger import performance_metrics
+from monitoring.exposition import CONTENT_TYPE, render_openmetrics
+
+# Workspace deletion needs this shared secret in the ADMIN_TOKEN_HEADER header; without it the endpoint is off
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN') or None
+ADMIN_TOKEN_HEADER = 'X-Admin-Token'
 
 class RequestHandler(BaseHTTPRequestHandler):
     def do_POST(self):
+        performance_metrics.record_arrival()
         # Get content length and read body
         content_length = int(self.headers.get('Content-Length', 0))
         if content_length > 0:
@@ -17,7 +29,13 @@ class RequestHandler(BaseHTTPRequestHandler):
                 message = json.loads(body)
                 
                 # Call embed_message with the received message
-                embed_message(message)
+                embed_start = time.time()
+                with performance_metrics.registry.track_in_flight('embeddings_in_flight'):
+                    embed_message(message)
+                embed_time = time.time() - embed_start
+                performance_metrics.add_request_time(embed_time)
+                performance_metrics.add_operation_time('vector_store', embed_time,
+                                                       workspace_id=message.get('workspace_id'))
 
                 # Send success response
                 self.send_response(200)
@@ -35,6 +53,7 @@ class RequestHandler(BaseHTTPRequestHandler):
                 self.wfile.write(json.dumps(response).encode())
             except Exception as e:
                 # Handle other errors
+                performance_metrics.log_error(type(e).__name__)
                 self.send_response(500)
                 self.send_header('Content-Type', 'application/json') 
                 self.end_headers()
@@ -42,19 +61,62 @@ class RequestHandler(BaseHTTPRequestHandler):
                 self.wfile.write(json.dumps(response).encode())
     
     def do_GET(self):
-        # Return method not allowed for GET
+        if self.path == '/metrics':
+            body = render_openmetrics(performance_metrics).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        # Return method not allowed for other GETs
+        self.send_response(405)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        response = {'status': 'error', 'message': 'Method not allowed'}
+        self.wfile.write(json.dumps(response).encode())
+
+    def do_PUT(self):
         self.send_response(405)
         self.send_header('Content-Type', 'application/json')
         self.end_headers()
         response = {'status': 'error', 'message': 'Method not allowed'}
         self.wfile.write(json.dumps(response).encode())
 
-    do_PUT = do_GET
-    do_DELETE = do_GET
+    def is_admin(self):
+        token = self.headers.get(ADMIN_TOKEN_HEADER)
+        return ADMIN_TOKEN is not None and token is not None and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+    def do_DELETE(self):
+        # DELETE /workspaces/<workspace_id> removes all of a workspace's embeddings
+        parts = self.path.strip('/').split('/')
+        if len(parts) != 2 or parts[0] != 'workspaces':
+            return self.do_PUT()
+        if not self.is_admin():
+            self.send_response(403)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            response = {'status': 'error', 'message': 'Forbidden'}
+            self.wfile.write(json.dumps(response).encode())
+            return
+        try:
+            delete_workspace_embeddings(parts[1])
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            response = {'status': 'ok', 'message': f'Deleted embeddings for workspace {parts[1]}'}
+        except Exception as e:
+            performance_metrics.log_error(type(e).__name__)
+            self.send_response(500)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            response = {'status': 'error', 'message': str(e)}
+        self.wfile.write(json.dumps(response).encode())
 
 def run_server(port=8000):
     server_address = ('', port)
-    httpd = HTTPServer(server_address, RequestHandler)
+    httpd = ThreadingHTTPServer(server_address, RequestHandler)
     print(f"Server running on port {port}")
     httpd.serve_forever()
 
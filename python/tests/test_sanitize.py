@@ -0,0 +1,33 @@
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the parent directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+pytest.importorskip('bs4')
+
+from benchmarks.sanitize import check_parity, load_inline_sanitizer, random_html
+from messages.sanitize import sanitize_html_content
+
+CASES = 2000
+
+
+@pytest.fixture(scope='module')
+def generated():
+    rng = random.Random(42)
+    return [random_html(rng) for _ in range(CASES)]
+
+
+@pytest.mark.parametrize('sanitize', [sanitize_html_content, load_inline_sanitizer()],
+                         ids=['messages.sanitize', 'appwrite function copy'])
+def test_matches_beautifulsoup_reference(generated, sanitize):
+    mismatches, _ = check_parity(generated, sanitize)
+    assert not mismatches, '\n'.join(mismatches[:5])
+
+
+def test_appwrite_function_copy_matches_shared_module(generated):
+    inline = load_inline_sanitizer()
+    assert [inline(content) for content in generated] == [sanitize_html_content(content) for content in generated]
@@ -1,15 +1,26 @@
 import boto3
 import json
 import base64
-from typing import List
+import argparse
+import asyncio
+import glob
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Optional
 from dotenv import load_dotenv
 import os
 import random
 import time
 
+from adaptive_limiter import AdaptiveConcurrencyLimiter, call_with_limiter
+from image_cache import ImageCache, image_cache
+
 # Load environment variables from .env file
 load_dotenv()
 
+MODEL_ID = "amazon.titan-image-generator-v2:0"
+DEFAULT_CONCURRENCY = int(os.getenv('TITAN_CONCURRENCY', '4'))
+
 # List of objects that could make fun profile pictures
 OBJECTS = [
     "smiling coffee cup",
@@ -53,7 +64,8 @@ def generate_images(
     width: int = 1024,
     height: int = 1024,
     cfg_scale: int = 8,
-    quality: str = "standard"
+    quality: str = "standard",
+    client=None
 ) -> List[bytes]:
     """
     Generate images using Amazon Titan Image Generator.
@@ -66,11 +78,13 @@ def generate_images(
         height (int): Image height
         cfg_scale (int): How closely the model follows the prompt
         quality (str): Image quality setting ("standard" or "premium")
+        client: bedrock-runtime client to reuse (a new one is created if omitted)
         
     Returns:
         List[bytes]: List of generated images as bytes
     """
-    client = initialize_bedrock_client()
+    if client is None:
+        client = initialize_bedrock_client()
     
     request_body = {
         "textToImageParams": {
@@ -92,7 +106,7 @@ def generate_images(
     
     # Make the API call
     response = client.invoke_model(
-        modelId="amazon.titan-image-generator-v2:0",
+        modelId=MODEL_ID,
         contentType="application/json",
         accept="application/json",
         body=body
@@ -118,6 +132,132 @@ def generate_profile_prompt(object_name: str) -> str:
     )
     return style_prompt
 
+def object_for_index(index: int, seed_start: int = 1000) -> str:
+    """Pick the object for a profile index deterministically so reruns produce the same files."""
+    return random.Random(seed_start + index).choice(OBJECTS)
+
+def existing_profile(out_dir: str, index: int) -> Optional[str]:
+    """Return the path of an already generated profile for this index, if any."""
+    matches = glob.glob(os.path.join(out_dir, f"profile_{index:03d}_*.png"))
+    return matches[0] if matches else None
+
+async def generate_profile(
+    index: int,
+    seed_start: int,
+    out_dir: str,
+    client,
+    limiter: AdaptiveConcurrencyLimiter,
+    executor: ThreadPoolExecutor,
+    cache: Optional[ImageCache] = image_cache
+) -> Optional[str]:
+    """Generate one profile picture and write it to disk as soon as it arrives."""
+    object_name = object_for_index(index, seed_start)
+    prompt = generate_profile_prompt(object_name)
+    seed = seed_start + index
+    filename = os.path.join(out_dir, f"profile_{index:03d}_{object_name.replace(' ', '_')}.png")
+    loop = asyncio.get_running_loop()
+
+    # Reuse a previously generated image for the same prompt and seed
+    image_bytes = None
+    if cache is not None:
+        image_bytes = await loop.run_in_executor(
+            executor,
+            partial(cache.get, MODEL_ID, prompt, "1024x1024", seed, cfg_scale=8, quality="standard")
+        )
+    if image_bytes is None:
+        async def invoke():
+            return await loop.run_in_executor(executor, partial(
+                generate_images,
+                prompt=prompt,
+                num_images=1,
+                seed=seed,
+                width=1024,
+                height=1024,
+                cfg_scale=8,
+                quality="standard",
+                client=client
+            ))
+
+        # Throttling exceptions shrink the shared concurrency window and back off
+        generated_images = await call_with_limiter(limiter, invoke, max_attempts=6)
+        image_bytes = generated_images[0]
+        if cache is not None:
+            await loop.run_in_executor(
+                executor,
+                partial(cache.put, MODEL_ID, prompt, "1024x1024", seed, image_bytes, cfg_scale=8, quality="standard")
+            )
+
+    def write_file():
+        tmp_path = f"{filename}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(image_bytes)
+        os.replace(tmp_path, filename)
+
+    await loop.run_in_executor(executor, write_file)
+    print(f"Generated: {filename}")
+    return filename
+
+async def generate_profiles_async(
+    total_images: int = 100,
+    start_index: int = 0,
+    seed_start: int = 1000,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    out_dir: str = "profile_images",
+    client=None,
+    cache: Optional[ImageCache] = image_cache
+) -> dict:
+    """
+    Generate profile pictures concurrently.
+    
+    Args:
+        total_images: Number of profile indices to cover
+        start_index: First index for file naming
+        seed_start: Base seed; index i uses seed_start + i
+        concurrency: Ceiling on in-flight invoke_model calls
+        out_dir: Directory the PNG files are written to
+        client: bedrock-runtime client (or a stub); created from the environment if omitted
+        cache: Image cache consulted before calling Bedrock; None disables caching
+        
+    Returns:
+        dict: Summary with generated/skipped/failed counts and elapsed time
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    client = client or initialize_bedrock_client()
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=concurrency, max_limit=concurrency, name='bedrock')
+    executor = ThreadPoolExecutor(max_workers=concurrency + 2, thread_name_prefix='titan')
+
+    indices = range(start_index, start_index + total_images)
+    pending = [index for index in indices if not existing_profile(out_dir, index)]
+    skipped = total_images - len(pending)
+    if skipped:
+        print(f"Skipping {skipped} profiles that already exist")
+
+    async def run(index: int):
+        try:
+            return await generate_profile(index, seed_start, out_dir, client, limiter, executor, cache)
+        except Exception as e:
+            print(f"Error generating profile {index}: {str(e)}")
+            return None
+
+    start = time.perf_counter()
+    try:
+        results = await asyncio.gather(*(run(index) for index in pending))
+    finally:
+        executor.shutdown(wait=False)
+    elapsed = time.perf_counter() - start
+
+    generated = sum(1 for result in results if result)
+    summary = {
+        'generated': generated,
+        'skipped': skipped,
+        'failed': len(pending) - generated,
+        'seconds': elapsed,
+        'images_per_second': generated / elapsed if elapsed > 0 else 0.0,
+        'final_concurrency': limiter.limit
+    }
+    print(f"Done: {summary}")
+    return summary
+
 def generate_batch_profiles(
     batch_size: int = 5,
     start_index: int = 0,
@@ -131,53 +271,33 @@ def generate_batch_profiles(
         start_index: Starting index for file naming
         seed_start: Starting seed for consistent but varied generation
     """
-    for i in range(batch_size):
-        # Select a random object
-        object_name = random.choice(OBJECTS)
-        prompt = generate_profile_prompt(object_name)
-        
-        try:
-            # Generate a single image with a specific seed
-            generated_images = generate_images(
-                prompt=prompt,
-                num_images=1,
-                seed=seed_start + i,
-                width=1024,
-                height=1024,
-                cfg_scale=8,
-                quality="standard"
-            )
-            
-            # Save the generated image
-            image_bytes = generated_images[0]
-            filename = f"profile_{start_index + i:03d}_{object_name.replace(' ', '_')}.png"
-            
-            with open(filename, "wb") as f:
-                f.write(image_bytes)
-            print(f"Generated: {filename}")
-            
-            # Add a small delay to avoid rate limits
-            time.sleep(1)
-            
-        except Exception as e:
-            print(f"Error generating {object_name}: {str(e)}")
-            time.sleep(5)  # Longer delay on error
+    asyncio.run(generate_profiles_async(
+        total_images=batch_size,
+        start_index=start_index,
+        seed_start=seed_start - start_index,
+        out_dir="."
+    ))
 
 if __name__ == "__main__":
-    # Create output directory if it doesn't exist
-    os.makedirs("profile_images", exist_ok=True)
-    os.chdir("profile_images")
-    
-    # Generate 100 images in batches of 5
-    total_images = 100
-    batch_size = 5
-    
-    for batch in range(0, total_images, batch_size):
-        print(f"\nGenerating batch {batch//batch_size + 1}/{total_images//batch_size}")
-        generate_batch_profiles(
-            batch_size=batch_size,
-            start_index=batch,
-            seed_start=1000 + batch
-        )
-        # Add a delay between batches
-        time.sleep(5)
+    parser = argparse.ArgumentParser(description="Generate profile pictures with Amazon Titan")
+    parser.add_argument('--total', type=int, default=100, help="Number of images to generate")
+    parser.add_argument('--start-index', type=int, default=0)
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="Max in-flight requests")
+    parser.add_argument('--out', default="profile_images")
+    parser.add_argument('--stub', action='store_true', help="Use the offline bedrock-runtime stub for benchmarking")
+    args = parser.parse_args()
+
+    client, cache = None, image_cache
+    if args.stub:
+        from fakes.bedrock import StubBedrockRuntime
+        # Keep stub images out of the real image cache
+        client, cache = StubBedrockRuntime(), None
+
+    asyncio.run(generate_profiles_async(
+        total_images=args.total,
+        start_index=args.start_index,
+        concurrency=args.concurrency,
+        out_dir=args.out,
+        client=client,
+        cache=cache
+    ))